@@ -3,11 +3,23 @@ import time
 import datetime
 import threading
 import csv
-import traceback
+
+# シミュレーターで実行する場合は DTA_SIMULATOR=<時間の倍率> を設定する
+# （gpiodを置き換えるため、機器モジュールのimportより前に開始する）
+# 待ち時間・昇降温・記録する時間はTIME_SCALE倍で進める（時刻はtime.time()のまま、経過時間を倍率で換算する）
+simulated_rig = None
+TIME_SCALE = 1.0
+if os.environ.get("DTA_SIMULATOR"):
+    from DTAmodule.simulator.rig import SimulatedRig
+    TIME_SCALE = float(os.environ["DTA_SIMULATOR"])
+    simulated_rig = SimulatedRig(speed=TIME_SCALE).start()
+
 from natsort import natsorted
 from DTAmodule.keithley_control import Keithley2000Temperature, getVoltage2182A
-from DTAmodule.chino_control import ChinoController
+from DTAmodule.chino_control import (ChinoController, build_ramp_segments, program_run_ends,
+                                     load_program_items)
 from DTAmodule.pressure_control import PressureControl
+from DTAmodule.pressure_regulator import PressureRegulator
 from DTAmodule.visualize import DTAVisualizer
 from DTAmodule.experiment_manager import ExperimentManager, ExperimentMetadata
 from DTAmodule.plotter import MenuDrivenPlotter
@@ -17,9 +29,24 @@ from collections import deque
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from DTAmodule.emergency_handler import emergency_shutdown, MAX_TEMPERATURE, MAX_PRESSURE
+from DTAmodule.emergency_handler import (emergency_shutdown, resolve_temperature_limit,
+                                         TemperatureInterlock, MAX_TEMPERATURE, MAX_PRESSURE)
 from DTAmodule.experiment_conditions import ExperimentConditions
+from DTAmodule.acquisition import ConcurrentSampler
+from DTAmodule.device_discovery import DeviceDiscovery, initialize_devices
+from DTAmodule.supervisor import DeviceSupervisor, sample_status
+from DTAmodule.results_writer import ResultsWriter
+from DTAmodule.journal import Journal, recover_results, resume_state as journal_resume_state
+from DTAmodule.column_store import ColumnWriter
+from DTAmodule.results_index import ResultsIndexWriter
+from DTAmodule.results_loader import RESULT_COLUMNS
 from DTAmodule import vttotemp
+from DTAmodule import calibration
+from DTAmodule import keithley_control
+from DTAmodule.trace import tracer
+
+# トレースのレベル（DTA_TRACE=debug で全記録をDTA_TRACE_FILEに書き出す）
+tracer.configure()
 
 #鍵 
 # key_name = '/home/pi/Desktop/json_file/olha/my-project-333708-dad962c8e2e4.json'
@@ -29,8 +56,25 @@ from DTAmodule import vttotemp
 # credentials = ServiceAccountCredentials.from_json_keyfile_name(key_name, scope)
 # gc = gspread.authorize(credentials)
 
+# 各機器のシリアルポート
+PORTS = {
+    'chino': '/dev/ttyUSB1',
+    'k2000_temperature': '/dev/ttyUSB2',
+    'k2000_pressure': '/dev/ttyUSB0',
+    'k2182a': '/dev/ttyUSB3'
+}
+if simulated_rig is not None:
+    PORTS.update(simulated_rig.ports)
+else:
+    # USBの再列挙でポート番号が変わるため、接続されている機器を探索する
+    PORTS.update(DeviceDiscovery().discover(PORTS))
+keithley_control.k2182a.port = PORTS['k2182a']
+
 # グローバルインスタンスの作成
-k2000_temperature = Keithley2000Temperature(port='/dev/ttyUSB2')
+k2000_temperature = Keithley2000Temperature(port=PORTS['k2000_temperature'])
+
+# 測定器の接続と初期化を並列に行う
+initialize_devices([k2000_temperature, keithley_control.k2182a])
 
 def getTemperature():
     """温度センサーの電圧を取得
@@ -40,11 +84,9 @@ def getTemperature():
         None: 測定に失敗した場合
     """
     try:
+        # 切断時の再接続は測定ループを止めないようDeviceSupervisorが行う
         if not k2000_temperature.connected:
-            if not k2000_temperature.connect():
-                return None
-            if not k2000_temperature.initialize():
-                return None
+            return None
         
         return k2000_temperature.get_voltage()
     except Exception as e:
@@ -61,15 +103,51 @@ ROOM_TEMPERATURE = 298.15  # K (25℃)
 # SPREADSHEET_BUFFER_SIZE = 100  # バッファサイズ
 # SPREADSHEET_UPDATE_INTERVAL = 300  # 更新間隔（秒）
 
+# 昇降温をChinoのプログラム運転で行う場合はTrue（ホストは PV/SV の監視のみ行う）
+# 使用機器の通信仕様書のプログラム運転の項目番号を ~/.dta/chino_program.json に記載すること
+RAMP_OFFLOAD = False
+
+# 結果ファイルの書き込み（別スレッドでRESULTS_FLUSH_ROWS行またはRESULTS_FLUSH_INTERVAL秒ごとにまとめて書き込む）
+RESULTS_FLUSH_ROWS = 20
+RESULTS_FLUSH_INTERVAL = 5.0  # 秒
+RESULTS_FSYNC = True  # 実験条件の区切りと終了時にディスクへの書き込みを待つ
+RESULT_FORMAT = "{:.3f},{:.3f},{:.10f},{:.10f},{:.10f},{:.10f},{},{},{:.3f},{}\n"
+RESULTS_CHECKPOINT_ROWS = 100  # 再開用のチェックポイントを記録する間隔（行数）
+# 結果ファイルと同じ行を列形式（結果ファイル名 + '.columns'のディレクトリ）にも保存する
+# （列と型はRESULT_COLUMNS。グラフ作成などでテキストを解析せずに読める）
+
+# 熱電対電圧から温度への変換方法（'polynomial'または'table'）
+TEMP_CONVERSION = 'table'
+
+# 装置の識別名（DTA_RIGで指定。校正曲線と圧力制御の学習モデルの割り当てに使う）
+RIG_ID = os.environ.get("DTA_RIG", "default")
+
+# 熱電対の校正曲線（µV → K）
+thermocouple = calibration.get_curve('thermocouple', RIG_ID)
+
+# 温度の上限を熱電対電圧（µV）で直接指定する場合に設定する
+# （Noneの場合はMAX_TEMPERATUREを校正曲線で変換する。上限が校正範囲の外にある場合は開始しない）
+TEMPERATURE_LIMIT_MICROVOLTS = None
+
+# 温度の上限は電圧の閾値にしておき、測定値をそのまま比較する（機器を操作する前に確認する）
+try:
+    MAX_TEMPERATURE_MICROVOLTS = resolve_temperature_limit(RIG_ID, TEMPERATURE_LIMIT_MICROVOLTS)
+except calibration.CalibrationError as e:
+    tracer.error("{}。MAX_TEMPERATUREを校正範囲内にするか、TEMPERATURE_LIMIT_MICROVOLTSを指定してください".format(e))
+    raise SystemExit(1)
+# K2000の欠測中はChinoのPVをMAX_TEMPERATUREと比較し、欠測がMAX_SENSOR_MISSING秒を超えたら停止する
+temperature_interlock = TemperatureInterlock(MAX_TEMPERATURE_MICROVOLTS)
+
 # グラフ更新設定
 GRAPH_UPDATE_INTERVAL = 1000  # ミリ秒
 MAX_DATA_POINTS = 1000  # 表示するデータポイントの最大数
 
-# 現在の状態を表示
+# 現在の状態を表示（圧力制御は実験条件の設定後に初期化する）
+pressure_control = None
 print("\n=== 現在の状態 ===")
 try:
     # Chinoの温度を取得
-    chino = ChinoController()
+    chino = ChinoController(port=PORTS['chino'])
     chino.connect()
     chino_temp = chino.get_temperature()
     print("Chino設定温度: {:.2f} K".format(chino_temp))
@@ -80,8 +158,8 @@ try:
     # Keithley 2000の電圧を取得して温度に変換
     temp_data = getTemperature()
     if temp_data is not None:
-        pv2000 = float(temp_data[0])*1000000  # 電圧値を取得してマイクロボルトに変換
-        k2000_temp = vttotemp.VtToTemp(pv2000)
+        pv2000 = float(temp_data)*1000000  # 電圧値（V）をマイクロボルトに変換
+        k2000_temp = thermocouple(pv2000)
         print("Keithley 2000温度: {:.2f} K".format(k2000_temp))
     else:
         print("Keithley 2000温度取得エラー: データが取得できません")
@@ -106,28 +184,19 @@ print("================\n")
 # 実験条件の取得
 experiment_conditions = ExperimentConditions()
 filenameExpCond, sampleName = experiment_conditions.get_experiment_conditions()
-filenameResults = filenameExpCond.replace('ExpCond.csv', 'Results.csv')
-filenameError = filenameExpCond.replace('ExpCond.csv', 'Error.csv')
-
-# 実験条件の解析と設定値の計算
-Tsv, Tf, rate, wait, dt, pressure, pressure_tolerance, timeExp = experiment_conditions.parse_experiment_conditions(filenameExpCond)
+# 結果とエラーのファイル名は実験条件ファイル（ExpCond_<ID>.csv）の番号に合わせる（保存先はDTA_RESULT_DIR）
+filenameResults = os.path.basename(filenameExpCond).replace('ExpCond', 'Results')
+filenameError = os.path.basename(filenameExpCond).replace('ExpCond', 'Error')
 
 # メインプログラムの開始部分を修正
 Q2 = input("Have you already measured? y/n:")
 if Q2 == "y":
-    filenameExpCond, filenameResults, filenameError = experiment_conditions.continue_experiment()
-    if filenameExpCond is None:
+    # 続ける実験の番号のファイルを使う（'n'と答えた場合は今回の条件で新しく測定する）
+    continued = experiment_conditions.continue_experiment()
+    if continued[0] is None:
         Q2 = "n"
-
-elif Q2 == 'n':
-    sample = input("サンプル名を入力してください: ")
-    filenameExpCond = sample + "ExpCond.csv"
-    filenameResults = sample + "Results.csv"
-    filenameError = sample + "Error.csv"
-    f = open(str(filenameExpCond), mode='a')
-    f.close()
-    f = open(str(filenameError), mode='a')
-    f.close()
+    else:
+        filenameExpCond, filenameResults, filenameError = continued
 
 print(os.getcwd())
 
@@ -141,34 +210,108 @@ with open(filenameExpCond,'r') as file:
 for i in range(1,len(line)):
         print('exp. '+str(i) +' : ')
         print(line[i])
+
+# 実験条件の解析と設定値の計算（添字は実験条件ファイルの行番号）
+Tsv, Tf, rate, wait, dt, pressure, pressure_tolerance, timeExp = experiment_conditions.parse_experiment_conditions(filenameExpCond)
     
-os.chdir("/home/yasumotosuzuka/Desktop/Experiment_result")
+os.chdir(os.environ.get("DTA_RESULT_DIR", "/home/yasumotosuzuka/Desktop/Experiment_result"))
 print(os.path.exists(filenameResults))
 print(os.listdir())
+f = open(str(filenameError), mode='a')
+f.close()
 if not os.path.exists(filenameResults):
-    thread1.start()
     f = open(str(filenameResults), mode='a')
-    f.write("set Temp. / K,time / s,dt of Kei2000/ microvolts,dt of Kei2182A/ microvolts,dt of Kei2000/K,dt of Kei2182A/K,Heat or cool,Run,Date,Time of Day,Sample Name\n")
+    # 列名はデータの値の順（RESULT_FORMAT）と合わせる
+    f.write(",".join(name for name, _ in RESULT_COLUMNS) + "\n")
     f.close()
 
-#change temp. to first Tsv
-chino = ChinoController()
-chino.connect()
-chino.set_temperature(Tsv[1])
-Tsvtemp=Tsv[1]
-wait1st=float(input("How long will you wait before 1st measurement? [sec]: "))
-print("The measurement started at "+ str(datetime.datetime.now()))
-td = datetime.timedelta(minutes=timeExp)
-print("The measurement will finish at "+str(datetime.datetime.now()+td))
-time.sleep(wait1st)
+# 前回の測定が途中で止まった場合は、ジャーナル（結果ファイルと同じ場所）から再開できる
+filenameJournal = filenameResults + ".journal"
+try:
+    result_columns = ColumnWriter(filenameResults + ".columns", RESULT_COLUMNS)
+except Exception as e:
+    tracer.warning("列形式のデータを使用できません（結果ファイルのみ記録します）: {}".format(e))
+    result_columns = None
+# Run, Heat/Cool, 時間ごとの位置の索引（load_runで該当する範囲だけを読むために使う）
+results_index = ResultsIndexWriter(filenameResults + ".index", [name for name, _ in RESULT_COLUMNS])
+resume_state = None
+if os.path.exists(filenameJournal):
+    # 再開するかを確認するまではファイルを変更しない
+    resume_state = journal_resume_state(filenameJournal)
+    if resume_state is not None and resume_state['k'] >= len(line):
+        # 全ての条件を測定済み
+        resume_state = None
+    if resume_state is not None:
+        Q4 = input("前回の測定を Run {} (Tsv = {:.2f} K) から再開しますか？ y/n:".format(
+            resume_state['k'], resume_state['Tsvtemp']))
+        if Q4 == "y":
+            resume_state = recover_results(filenameJournal, filenameResults, RESULT_FORMAT,
+                                           result_columns, results_index)
+        else:
+            resume_state = None
 
-t0 = time.time()
-t3 = t0
+if simulated_rig is not None:
+    chino_program_items = simulated_rig.chino_program_items
+else:
+    chino_program_items = load_program_items()
+chino = ChinoController(port=PORTS['chino'], program_items=chino_program_items)
+chino.connect()
+if RAMP_OFFLOAD and not chino.program_supported:
+    tracer.warning("プログラム運転の項目番号が設定されていないため、設定値を順に送ります")
+    RAMP_OFFLOAD = False
+if resume_state is None:
+    #change temp. to first Tsv
+    chino.set_temperature(Tsv[1])
+    Tsvtemp=Tsv[1]
+    wait1st=float(input("How long will you wait before 1st measurement? [sec]: "))
+    print("The measurement started at "+ str(datetime.datetime.now()))
+    td = datetime.timedelta(minutes=timeExp / TIME_SCALE)
+    print("The measurement will finish at "+str(datetime.datetime.now()+td))
+    time.sleep(wait1st / TIME_SCALE)
+
+    t0 = time.time()
+    t4 = None
+    first_run = 1
+else:
+    # 止まった時点の設定温度から昇降温を続ける（時間は最初の開始時刻からの経過時間のまま）
+    Tsvtemp = resume_state['Tsvtemp']
+    t0 = resume_state['t0']
+    t4 = resume_state['t4']
+    first_run = resume_state['k']
+    wait1st = 0
+    chino.set_temperature(Tsvtemp)
+    print("The measurement resumed at "+ str(datetime.datetime.now()))
+t3 = time.time()
+
+def loop_state(k):
+    """再開に必要なループの状態"""
+    return {'k': k, 'Tsvtemp': float(Tsvtemp), 't0': t0, 't4': t4}
+
+# 昇降温プログラムを制御器に転送して開始（再開時は現在の設定温度から残りの条件を実行する）
+# 測定の区切り（Run, Heat/Cool）はプログラム開始からの経過時間で決める
+if RAMP_OFFLOAD:
+    rows = range(first_run, len(line))
+    starts = [Tsvtemp] + [Tsv[k] for k in rows[1:]]
+    remaining_wait = 0.0
+    if resume_state is not None and t4 is not None and first_run > 1:
+        remaining_wait = max(0.0, t4 + wait[first_run - 1] / TIME_SCALE - time.time()) * TIME_SCALE
+    segments = build_ramp_segments(starts, [Tf[k] for k in rows],
+                                   [rate[k] for k in rows], [wait[k] for k in rows],
+                                   first_run=first_run, initial_wait=remaining_wait)
+    run_ends = program_run_ends(segments)
+    chino.download_program(Tsvtemp, segments)
+    chino.start_program()
+    program_t0 = time.time()
+    print("昇降温プログラムを開始しました（{}セグメント）".format(len(segments)))
 
 # 圧力制御の初期化
 pressure_control = None
+pressure_regulator = None
 try:
-    pressure_control = PressureControl()
+    pressure_control = PressureControl(port=PORTS['k2000_pressure'], rig_id=RIG_ID)
+    # 圧力は別スレッドで目標値に保持する
+    pressure_regulator = PressureRegulator(pressure_control)
+    pressure_regulator.start()
 except Exception as e:
     print("圧力制御の初期化に失敗しました: {}".format(e))
 
@@ -178,120 +321,192 @@ visualizer = DTAVisualizer()
 # プロッターの初期化
 plotter = MenuDrivenPlotter()
 
+# 各機器の監視（読み取りに続けて失敗した機器はバックグラウンドで再接続する）
+supervisors = {
+    'chino': DeviceSupervisor('chino', chino.read_status if RAMP_OFFLOAD else chino.get_temperature,
+                              chino.reconnect),
+    'k2000': DeviceSupervisor('k2000', getTemperature, k2000_temperature.reconnect),
+    'k2182a': DeviceSupervisor('k2182a', keithley_control.k2182a.get_voltage,
+                               keithley_control.k2182a.reconnect)
+}
+if pressure_control is not None:
+    supervisors['pressure'] = DeviceSupervisor('pressure', pressure_control.get_pressure,
+                                               pressure_control.reconnect)
+
+# 各機器の同時サンプリング（機器ごとに別のシリアルポート）
+sampler = ConcurrentSampler({name: supervisor.read for name, supervisor in supervisors.items()})
+
+def to_microvolts(value):
+    """電圧値（V）をマイクロボルトに変換（欠測はNaN）"""
+    return float(value) * 1000000 if value is not None else float('nan')
+
+# 測定中の温度変換（'polynomial': 多項式, 'table': 補間表（誤差0.1mK以下））
+# 補間表は付属の熱電対の曲線でのみ使える。他の曲線を割り当てた場合は多項式で計算する
+if TEMP_CONVERSION == 'table' and thermocouple is vttotemp.CURVE:
+    vt_to_temp = vttotemp.VtToTempFast
+else:
+    vt_to_temp = thermocouple
+
+def microvolts_to_temp(value):
+    """熱電対電圧（µV）を温度に変換（欠測・範囲外はNaN）"""
+    return vt_to_temp(value)
+
+def chino_pv(value):
+    """Chinoの読み取り値（PV、またはプログラム運転時はread_statusの結果）からPV（K）を取り出す"""
+    if value is None:
+        return None
+    return value['pv'] if isinstance(value, dict) else float(value)
+
+def save_results_header(filename, experiment_data):
+    """実験結果ファイルのヘッダーを保存
+    
+    Args:
+        filename (str): ファイル名
+        experiment_data (dict): 実験データ
+    """
+    with open(filename, 'w') as f:
+        # メタデータの保存
+        f.write("ID,{}\n".format(experiment_data.get('id', '')))
+        f.write("Sample Name,{}\n".format(experiment_data.get('sample_name', '')))
+        f.write("Lot,{}\n".format(experiment_data.get('lot', '')))
+        f.write("Experimenter,{}\n".format(experiment_data.get('experimenter', '')))
+        f.write("Date,{}\n".format(datetime.datetime.now().strftime("%Y/%m/%d")))
+        # 使用した校正曲線（後から別の曲線で再計算する場合に参照する）
+        f.write("Calibration,{}\n".format(";".join(
+            "{}={}".format(role, key) for role, key in calibration.registry.assignments(RIG_ID).items())))
+        
+        # データヘッダーの保存
+        f.write(",".join(name for name, _ in RESULT_COLUMNS) + "\n")
+
+# 結果ファイルの書き込みスレッド（測定ループはディスクを待たない）
+results_writer = ResultsWriter(filenameResults, RESULT_FORMAT, flush_rows=RESULTS_FLUSH_ROWS,
+                               flush_interval=RESULTS_FLUSH_INTERVAL, fsync=RESULTS_FSYNC,
+                               journal=Journal(filenameJournal, truncate=resume_state is None),
+                               checkpoint_rows=RESULTS_CHECKPOINT_ROWS, columns=result_columns,
+                               index=results_index)
+results_writer.checkpoint(loop_state(first_run))
+
 # 各実験条件での測定実行
-for k in range(1,len(line)):
+for k in range(first_run, len(line)):
     # Heat or Coolの判定
     hoc = "Heat" if rate[k] > 0 else "Cool"
     
-    print("Run the measurement number " + str(k) +" ! Tsv= "+str(Tsv[k])+" K" )
-    print("Mode: " + hoc)  # モードを表示
+    tracer.info("Run the measurement number " + str(k) +" ! Tsv= "+str(Tsv[k])+" K" )
+    tracer.info("Mode: " + hoc)  # モードを表示
     if k ==1:
-        print("Wait for " + str(wait1st) +" sec.")
+        tracer.info("Wait for " + str(wait1st) +" sec.")
     else:
-        print("Wait for " + str(wait[k-1]) +" sec.")
-    print("Heating/Cooling rate: " + str(rate[k]) + " K/min")
-    print("Time interval: " + str(dt[k]) + " min")
-    
-    print("Run", "Date and Time", "Tsv / K", "pv2000", "pv2182A", "Tpv2000", "Tpv2182A")
-
-    # 結果ファイルを開く
-    with open(filenameResults, 'a') as f:
-        while True:
-            time.sleep(.5)
-            a = chino.get_temperature()  
-            time.sleep(1)
-            t1 = time.time()
-            t2 = t1-t3
-            t3 = t1
-            
-            if k==1:
+        tracer.info("Wait for " + str(wait[k-1]) +" sec.")
+    tracer.info("Heating/Cooling rate: " + str(rate[k]) + " K/min")
+    tracer.info("Setpoint rate: " + str(dt[k]) + " K/s")
+
+    # 目標圧力の設定（許容パーセントを不感帯とする）
+    if pressure_regulator is not None:
+        pressure_regulator.set_target(pressure[k], deadband=pressure[k] * (pressure_tolerance[k] / 100.0))
+
+    while True:
+        time.sleep(1.5 / TIME_SCALE)
+        t1 = time.time()
+        t2 = (t1-t3) * TIME_SCALE
+        t3 = t1
+        
+        if not RAMP_OFFLOAD:
+            if k==1 or t1 > t4+wait[k-1]/TIME_SCALE:
                 Tsvtemp = Tsvtemp + dt[k]*t2
-                chino.set_temperature(Tsvtemp)
-            else:
-                if t1 > t4+wait[k-1]:
-                    Tsvtemp = Tsvtemp + dt[k]*t2
+                # 再接続中は書き込まない（次回以降にまとめて反映される）
+                if supervisors['chino'].online:
                     chino.set_temperature(Tsvtemp)
+        
+        # 全機器を同時に読み取る（欠測はNaNとして記録し、状態を残す）
+        sample = sampler.sample()
+        t1 = sample['timestamp']
+        status = sample_status(sample, supervisors)
+        tracer.debug("サンプリング", run=k, values=sample['values'], durations=sample['durations'],
+                     errors=sample['errors'], elapsed=sample['elapsed'], status=status,
+                     queue_depth=results_writer.depth)
+        pv2000 = to_microvolts(sample['values']['k2000'])
+        pv2182A = to_microvolts(sample['values']['k2182a'])
+        if RAMP_OFFLOAD and sample['values']['chino'] is not None:
+            # 制御器が実行中の設定値を記録
+            Tsvtemp = sample['values']['chino']['sv']
+        
+        # 温度チェック
+        current_temp = microvolts_to_temp(pv2000)
+        if pressure_regulator is not None and not np.isnan(current_temp):
+            pressure_regulator.update_temperature(current_temp)
+        # K2000が欠測（NaN）の間は比較が常に偽になるため、ChinoのPVと欠測時間で監視する
+        reason = temperature_interlock.check(pv2000, chino_pv(sample['values']['chino']), t1)
+        if reason is not None:
+            emergency_shutdown(pressure_control, reason, chino=chino)
+        
+        # 圧力の測定（制御はpressure_regulatorのスレッドで行う）
+        current_pressure = sample['values'].get('pressure')
+        if current_pressure is not None and current_pressure > MAX_PRESSURE:
+            # 圧力チェック
+            emergency_shutdown(pressure_control,
+                             "圧力が制限値 ({:.1f}MPa) を超えました: {:.1f}MPa".format(
+                                 MAX_PRESSURE, current_pressure),
+                             chino=chino)
+        
+        # 結果の記録
+        try:
+            # 初回のみヘッダーを保存
+            if not os.path.exists(filenameResults):
+                save_results_header(filenameResults, {
+                    'id': experiment_manager.get_current_experiment_id(),
+                    'sample_name': sampleName,
+                    'lot': input("ロット番号を入力してください: "),
+                    'experimenter': input("実験者名を入力してください: ")
+                })
             
-            t1 = time.time()
-            pv2000 = float(getTemperature())*1000000
-            pv2182A = float(getVoltage2182A())*1000000
-            vttotemp.VtToTemp(pv2000)
-            a = vttotemp.VtToTemp(pv2000)
-            vttotemp.VtToTemp(pv2182A)
-            
-            # 温度チェック
-            current_temp = vttotemp.VtToTemp(pv2000)
-            if current_temp > MAX_TEMPERATURE:
-                emergency_shutdown(pressure_control, 
-                                 "温度が制限値 ({:.1f}K) を超えました: {:.1f}K".format(
-                                     MAX_TEMPERATURE, current_temp))
-            
-            # 圧力の測定と制御
-            current_pressure = None
-            if pressure_control is not None:
-                current_pressure = pressure_control.get_pressure()
-                if current_pressure is not None:
-                    # 圧力チェック
-                    if current_pressure > MAX_PRESSURE:
-                        emergency_shutdown(pressure_control,
-                                         "圧力が制限値 ({:.1f}MPa) を超えました: {:.1f}MPa".format(
-                                             MAX_PRESSURE, current_pressure))
-                    
-                    # 目標圧力との差が許容パーセントを超える場合は調整
-                    tolerance = pressure[k] * (pressure_tolerance[k] / 100.0)
-                    if abs(current_pressure - pressure[k]) > tolerance:
-                        pressure_control.set_target_pressure(pressure[k], tolerance=tolerance)
+            # データの記録（整形と書き込みは書き込みスレッドで行う）
+            results_writer.write((
+                float(Tsvtemp), float((t1-t0) * TIME_SCALE), pv2000, pv2182A, 
+                current_temp, microvolts_to_temp(pv2182A),
+                hoc, k, current_pressure if current_pressure is not None else float('nan'),
+                status
+            ), state=loop_state(k))
             
-            # 結果の記録
-            try:
-                # 初回のみヘッダーを保存
-                if not os.path.exists(filenameResults):
-                    save_results_header(filenameResults, {
-                        'id': experiment_manager.get_current_experiment_id(),
-                        'sample_name': sampleName,
-                        'lot': input("ロット番号を入力してください: "),
-                        'experimenter': input("実験者名を入力してください: ")
-                    })
-                
-                # データの記録
-                result = "{:.3f},{:.3f},{:.10f},{:.10f},{:.10f},{:.10f},{},{},{:.3f}\n".format(
-                    float(Tsvtemp), float(t1-t0), pv2000, pv2182A, 
-                    vttotemp.VtToTemp(pv2000), vttotemp.VtToTemp(pv2182A),
-                    hoc, k, current_pressure if current_pressure is not None else 0.0
-                )
-                f.write(result)
-                f.flush()  # バッファをフラッシュして即座に書き込み
-                
-                # データの収集
-                plotter.update_data(
-                    float(t1-t0),
-                    float(Tsvtemp),
-                    vttotemp.VtToTemp(pv2000),
-                    vttotemp.VtToTemp(pv2182A),
-                    current_pressure if current_pressure is not None else 0.0
-                )
-                
-            except Exception as e:
-                print("データ記録エラー: {}".format(e))
+            # データの収集
+            plotter.update_data(
+                float((t1-t0) * TIME_SCALE),
+                float(Tsvtemp),
+                current_temp,
+                microvolts_to_temp(pv2182A),
+                current_pressure if current_pressure is not None else float('nan')
+            )
             
-            # 終了条件
-            if (rate[k] > 0 and float(Tsvtemp) >= float(Tf[k])):
-                print(k)
-                print(rate[k])
-                print("Run " + str(k) + " was finished")                           
-                print("wait for" + str(wait[k]) + " sec.")
-                t4 = time.time()
-                break
-                            
-            elif (rate[k] < 0 and float(Tsvtemp) <= float(Tf[k])):
-                print(k)
-                print(Tsv[k])
-                print(Tf[k])
-                print("Run " + str(k) + " was finished")
-                print("wait for" + str(wait[k]) + " sec.")     
+        except Exception as e:
+            tracer.error("データ記録エラー: {}".format(e))
+        
+        # 終了条件
+        if RAMP_OFFLOAD:
+            # SVはTfに達した後も待機のセグメントでTfに留まるため、プログラムの経過時間で判定する
+            program_time = (t1 - program_t0) * TIME_SCALE
+            if program_time >= run_ends[k]:
+                tracer.info("Run " + str(k) + " was finished", run=k, program_time=program_time)
+                tracer.info("wait for" + str(wait[k]) + " sec.")
                 t4 = time.time()
                 break
 
+        elif (rate[k] > 0 and float(Tsvtemp) >= float(Tf[k])):
+            tracer.info("Run " + str(k) + " was finished", run=k, rate=rate[k])
+            tracer.info("wait for" + str(wait[k]) + " sec.")
+            t4 = time.time()
+            break
+                        
+        elif (rate[k] < 0 and float(Tsvtemp) <= float(Tf[k])):
+            tracer.info("Run " + str(k) + " was finished", run=k, Tsv=Tsv[k], Tf=Tf[k])
+            tracer.info("wait for" + str(wait[k]) + " sec.")
+            t4 = time.time()
+            break
+
+    # 実験条件の区切りで書き込みを確定する（再開時は次の条件から始める）
+    results_writer.checkpoint(loop_state(k + 1))
+    results_writer.sync()
+
+results_writer.close()
+
 # 測定終了後にグラフを生成
 print("Generating plots...")
 try:
@@ -307,234 +522,17 @@ except Exception as e:
 
 print("finished")
 
+sampler.close()
+for supervisor in supervisors.values():
+    supervisor.stop()
+
 # プログラム終了時に圧力制御のリソースを解放
+if pressure_regulator is not None:
+    pressure_regulator.stop()
 if pressure_control is not None:
     pressure_control.close()
+if simulated_rig is not None:
+    simulated_rig.stop()
 
 # グラフの表示
 plotter.show()
-
-def save_results_header(filename, experiment_data):
-    """実験結果ファイルのヘッダーを保存
-    
-    Args:
-        filename (str): ファイル名
-        experiment_data (dict): 実験データ
-    """
-    with open(filename, 'w') as f:
-        # メタデータの保存
-        f.write("ID,{}\n".format(experiment_data.get('id', '')))
-        f.write("Sample Name,{}\n".format(experiment_data.get('sample_name', '')))
-        f.write("Lot,{}\n".format(experiment_data.get('lot', '')))
-        f.write("Experimenter,{}\n".format(experiment_data.get('experimenter', '')))
-        f.write("Date,{}\n".format(datetime.datetime.now().strftime("%Y/%m/%d")))
-        
-        # データヘッダーの保存
-        f.write("set Temp. / K,time / s,dt of Kei2000/ microvolts,dt of Kei2182A/ microvolts,dt of Kei2000/K,dt of Kei2182A/K,Heat or cool,Run,Pressure / MPa\n")
-
-def check_current_status():
-    """現在の温度と圧力を確認"""
-    print("\n=== 現在の状態 ===")
-    try:
-        # Chinoの温度を取得
-        chino = ChinoController()
-        chino.connect()
-        chino_temp = chino.get_temperature()
-        print("Chino設定温度: {:.2f} K".format(chino_temp))
-    except Exception as e:
-        print("Chino温度取得エラー: {}".format(e))
-
-    try:
-        # Keithley 2000の電圧を取得して温度に変換
-        temp_data = getTemperature()
-        if temp_data is not None:
-            pv2000 = float(temp_data[0])*1000000  # 電圧値を取得してマイクロボルトに変換
-            k2000_temp = vttotemp.VtToTemp(pv2000)
-            print("Keithley 2000温度: {:.2f} K".format(k2000_temp))
-        else:
-            print("Keithley 2000温度取得エラー: データが取得できません")
-    except Exception as e:
-        print("Keithley 2000温度取得エラー: {}".format(e))
-
-    try:
-        # 圧力を取得
-        pressure_control = PressureControl()
-        current_pressure = pressure_control.get_pressure()
-        if current_pressure is not None:
-            print("現在の圧力: {:.2f} MPa".format(current_pressure))
-        else:
-            print("圧力取得エラー: 値が取得できません")
-        pressure_control.close()
-    except Exception as e:
-        print("圧力取得エラー: {}".format(e))
-
-    print("================\n")
-
-def load_experiment_conditions():
-    """実験条件を入力またはファイルから読み込む"""
-    print("\n=== 実験条件の入力 ===")
-    print("1. 手動入力")
-    print("2. ファイルから読み込み")
-    choice = input("選択してください (1/2): ")
-    
-    if choice == "2":
-        # ファイルから読み込み
-        try:
-            filename = input("実験条件ファイルのパスを入力してください: ")
-            with open(filename, 'r') as f:
-                reader = csv.DictReader(f)
-                conditions = next(reader)
-                return {
-                    'sample_name': conditions['Sample Name'],
-                    'experimenter': conditions['Experimenter'],
-                    'start_temperature': float(conditions['Start Temperature']),
-                    'end_temperature': float(conditions['End Temperature']),
-                    'heating_rate': float(conditions['Heating Rate']),
-                    'wait_time': float(conditions['Wait Time']),
-                    'pressure': float(conditions['Pressure']),
-                    'pressure_tolerance': float(conditions['Pressure Tolerance'])
-                }
-        except Exception as e:
-            print("ファイル読み込みエラー: {}".format(e))
-            print("手動入力に切り替えます。")
-    
-    # 手動入力
-    return {
-        'sample_name': input("サンプル名を入力してください: "),
-        'experimenter': input("実験者名を入力してください: "),
-        'start_temperature': float(input("開始温度 (K) を入力してください: ")),
-        'end_temperature': float(input("終了温度 (K) を入力してください: ")),
-        'heating_rate': float(input("昇温速度 (K/min) を入力してください: ")),
-        'wait_time': float(input("待機時間 (min) を入力してください: ")),
-        'pressure': float(input("目標圧力 (MPa) を入力してください: ")),
-        'pressure_tolerance': float(input("圧力許容範囲 (%) を入力してください: "))
-    }
-
-def main():
-    try:
-        # 現在の状態を確認
-        check_current_status()
-        
-        # 実験条件の設定
-        experiment_data = load_experiment_conditions()
-
-        # 実験条件の確認
-        print("\n=== 実験条件 ===")
-        print("サンプル名: {}".format(experiment_data['sample_name']))
-        print("実験者: {}".format(experiment_data['experimenter']))
-        print("開始温度: {:.2f} K".format(experiment_data['start_temperature']))
-        print("終了温度: {:.2f} K".format(experiment_data['end_temperature']))
-        print("昇温速度: {:.2f} K/min".format(experiment_data['heating_rate']))
-        print("待機時間: {:.2f} min".format(experiment_data['wait_time']))
-        print("目標圧力: {:.2f} MPa".format(experiment_data['pressure']))
-        print("圧力許容範囲: {:.2f} %".format(experiment_data['pressure_tolerance']))
-        print("================\n")
-
-        # 実験開始の確認
-        confirm = input("実験を開始しますか？ (y/n): ")
-        if confirm.lower() != 'y':
-            print("実験を中止します。")
-            return
-
-        # 実験マネージャーの初期化
-        experiment_manager = ExperimentManager()
-        
-        # 実験IDの取得と実験条件ファイルの作成
-        experiment_id = experiment_manager.add_experiment_history(experiment_data)
-        exp_cond_file = experiment_manager.create_experiment_condition_file(experiment_data)
-        results_file = experiment_manager.get_results_file_path(experiment_id)
-        error_file = experiment_manager.get_error_file_path(experiment_id)
-
-        # 実験条件の設定
-        conditions = ExperimentConditions(
-            start_temp=experiment_data['start_temperature'],
-            end_temp=experiment_data['end_temperature'],
-            heating_rate=experiment_data['heating_rate'],
-            wait_time=experiment_data['wait_time'],
-            pressure=experiment_data['pressure'],
-            pressure_tolerance=experiment_data['pressure_tolerance']
-        )
-
-        # デバイスの初期化
-        chino = ChinoController()
-        chino.connect()
-        pressure_control = PressureControl()
-        
-        # 測定データの初期化
-        time_data = []
-        temp_data = []
-        press_data = []
-        volt_data = []
-        error_log = []
-        
-        # 測定開始
-        start_time = time.time()
-        current_temp = experiment_data['start_temperature']
-        target_temp = experiment_data['end_temperature']
-        heating_rate = experiment_data['heating_rate']
-        
-        while current_temp < target_temp:
-            try:
-                # 温度の更新
-                current_temp += heating_rate * (time.time() - start_time) / 60.0
-                chino.set_temperature(current_temp)
-                
-                # データの収集
-                current_time = time.time() - start_time
-                current_pressure = pressure_control.get_pressure()
-                current_voltage = getTemperature()
-                
-                # データの保存
-                time_data.append(current_time)
-                temp_data.append(current_temp)
-                press_data.append(current_pressure)
-                volt_data.append(current_voltage)
-                
-                # 結果の保存
-                with open(results_file, 'a', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow([current_time, current_temp, current_pressure, current_voltage])
-                
-                time.sleep(1)  # 1秒待機
-                
-            except Exception as e:
-                error_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                error_log.append([error_time, "Measurement Error", str(e)])
-                print(f"測定エラー: {e}")
-                continue
-        
-        # エラー情報の保存
-        with open(error_file, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['Time', 'Error Type', 'Message'])
-            for error in error_log:
-                writer.writerow(error)
-        
-        # デバイスの終了処理
-        chino.disconnect()
-        pressure_control.close()
-        
-        print("測定が完了しました。")
-        
-    except Exception as e:
-        print(f"エラーが発生しました: {e}")
-        traceback.print_exc()
-        
-        # エラーログの保存
-        if 'error_file' in locals():
-            with open(error_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['Time', 'Error Type', 'Message'])
-                writer.writerow([datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 
-                               "Fatal Error", str(e)])
-        
-        # デバイスの終了処理
-        if 'chino' in locals():
-            chino.disconnect()
-        if 'pressure_control' in locals():
-            pressure_control.close()
-        
-        raise  # エラーを再送出
-
-if __name__ == "__main__":
-    main()
@@ -0,0 +1,84 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+class ConcurrentSampler:
+    """複数機器の同時サンプリングクラス
+
+    各機器はそれぞれ別のシリアルポートに接続されているため、読み取りを
+    スレッドで同時に開始する。1回のサンプリング時間は各機器の合計ではなく、
+    最も遅い機器の応答時間になる。
+    """
+    def __init__(self, readers, timeout=5.0):
+        """
+        Args:
+            readers (dict): 機器名 → 読み取り関数（引数なし）。Noneの機器は無視する
+            timeout (float): 1回のサンプリングの期限（秒）
+        """
+        self.readers = {name: reader for name, reader in readers.items() if reader is not None}
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(self.readers)),
+                                           thread_name_prefix="sampler")
+        self.pending = {}  # 前回期限内に終わらなかった読み取り
+
+    def _timed_call(self, reader):
+        """読み取り関数を実行し、(値, 所要時間)を返す"""
+        start = time.monotonic()
+        value = reader()
+        return value, time.monotonic() - start
+
+    def sample(self, timeout=None):
+        """全機器の読み取りを同時に実行
+
+        期限内に終わらなかった機器や例外が発生した機器の値はNoneになる。
+        前回の読み取りがまだ終わっていない機器は、新たな読み取りを行わない。
+
+        Args:
+            timeout (float, optional): 期限（秒）。省略時は既定値
+
+        Returns:
+            dict: timestamp（開始時刻, time.time()）、elapsed（所要時間, 秒）、
+                values（機器名 → 値）、durations（機器名 → 所要時間）、
+                errors（機器名 → エラー内容）
+        """
+        if timeout is None:
+            timeout = self.timeout
+        timestamp = time.time()
+        start = time.monotonic()
+
+        futures = {}
+        errors = {}
+        pending = {}
+        for name, reader in self.readers.items():
+            previous = self.pending.get(name)
+            if previous is not None and not previous.done():
+                errors[name] = "前回の読み取りが完了していません"
+                pending[name] = previous
+                continue
+            futures[name] = self.executor.submit(self._timed_call, reader)
+
+        wait(futures.values(), timeout=timeout)
+
+        values = {name: None for name in self.readers}
+        durations = {}
+        self.pending = pending
+        for name, future in futures.items():
+            if not future.done():
+                errors[name] = "タイムアウト"
+                self.pending[name] = future
+                continue
+            try:
+                values[name], durations[name] = future.result()
+            except Exception as e:
+                errors[name] = str(e)
+
+        return {
+            'timestamp': timestamp,
+            'elapsed': time.monotonic() - start,
+            'values': values,
+            'durations': durations,
+            'errors': errors
+        }
+
+    def close(self):
+        """スレッドプールを終了"""
+        self.executor.shutdown(wait=False)
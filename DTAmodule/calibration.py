@@ -0,0 +1,315 @@
+import bisect
+import glob
+import json
+import os
+import numpy as np
+from DTAmodule.trace import tracer
+
+# 装置に付属する校正曲線と装置ごとの割り当て
+BUILTIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibrations")
+# 装置ごとに追加・変更する校正曲線と割り当て（同じ装置名の割り当ては付属のものより優先する）
+USER_DIR = os.path.join(os.path.expanduser("~"), ".dta", "calibrations")
+
+class CalibrationError(Exception):
+    """校正曲線の読み込みや割り当ての例外"""
+    pass
+
+class PiecewisePolynomial:
+    """区間ごとの多項式による校正曲線
+
+    読み込み時に係数を配列（一括変換用）とリスト（1点用）にしておく。
+    境界上の値は上側の区間に含める。domainの範囲外とNaNはNaNになる。
+    """
+    def __init__(self, name, version, coefficients, breakpoints=(), domain=None,
+                 input_unit="", output_unit="", description=""):
+        """
+        Args:
+            name (str): 曲線の名前
+            version (int): 版（同じ名前で係数を変える場合は版を上げる）
+            coefficients (list): 区間ごとの係数（定数項から昇順）
+            breakpoints (list): 区間の境界（昇順、区間数 - 1個）
+            domain (list, optional): 入力の範囲 [下限, 上限]。省略時は制限なし
+            input_unit (str): 入力の単位
+            output_unit (str): 出力の単位
+            description (str): 説明
+        """
+        self.name = name
+        self.version = int(version)
+        self.coefficients = np.atleast_2d(np.asarray(coefficients, dtype=np.float64))
+        self.breakpoints = np.asarray(breakpoints, dtype=np.float64)
+        if domain is None:
+            domain = (-np.inf, np.inf)
+        self.domain = (float(domain[0]), float(domain[1]))
+        self.input_unit = input_unit
+        self.output_unit = output_unit
+        self.description = description
+        if len(self.coefficients) != len(self.breakpoints) + 1:
+            raise CalibrationError("{}: 区間の数と境界の数が合いません".format(self.key))
+        if np.any(np.diff(self.breakpoints) <= 0):
+            raise CalibrationError("{}: 境界が昇順ではありません".format(self.key))
+
+        # 区間の端と、各区間の両端での出力（逆変換の区間選択に使う）
+        self.edges = np.concatenate([[self.domain[0]], self.breakpoints, [self.domain[1]]])
+        self.ranges = np.array([self._range(k) for k in range(len(self.coefficients))])
+
+        # 1点用（NumPyのスカラー演算を避ける）
+        self._breakpoints = self.breakpoints.tolist()
+        self._coefficients = [row[::-1] for row in self.coefficients.tolist()]
+        self._inverse_nodes = None
+
+    @property
+    def key(self):
+        """'名前@版'の形式の識別名"""
+        return "{}@{}".format(self.name, self.version)
+
+    @property
+    def degree(self):
+        return self.coefficients.shape[1] - 1
+
+    def _horner(self, c, v):
+        """係数の配列c（各要素は区間の係数）でHorner法を計算"""
+        result = c[..., -1]
+        for j in range(self.degree - 1, -1, -1):
+            result = result*v + c[..., j]
+        return result
+
+    def _range(self, k):
+        """区間kの両端での出力（範囲が無限の1次式は符号で決める）"""
+        c = self.coefficients[k]
+        ends = []
+        for v in (self.edges[k], self.edges[k + 1]):
+            if np.isfinite(v):
+                ends.append(float(self._horner(c, v)))
+            else:
+                ends.append(float(np.sign(v) * np.sign(c[-1]) * np.inf))
+        return ends
+
+    def segments(self, x):
+        """入力値の区間番号（境界上の値は上側の区間）
+
+        Args:
+            x (array_like): 入力値
+
+        Returns:
+            numpy.ndarray: 区間番号
+        """
+        return np.searchsorted(self.breakpoints, x, side='right')
+
+    def evaluate(self, x):
+        """配列を一括変換
+
+        Args:
+            x (array_like): 入力値
+
+        Returns:
+            numpy.ndarray: 出力値。範囲外とNaNはNaN。スカラーを渡した場合は0次元配列
+        """
+        v = np.asarray(x, dtype=np.float64)
+        y = self._horner(self.coefficients[self.segments(v)], v)
+        return np.where((v >= self.domain[0]) & (v <= self.domain[1]), y, np.nan)
+
+    def __call__(self, x):
+        """1点を変換
+
+        Args:
+            x (float): 入力値
+
+        Returns:
+            float: 出力値。範囲外とNaNはNaN
+        """
+        if not self.domain[0] <= x <= self.domain[1]:
+            return float('nan')
+        y = 0.0
+        for c in self._coefficients[bisect.bisect_right(self._breakpoints, x)]:
+            y = y*x + c
+        return y
+
+    def inverse(self, y, iterations=3):
+        """出力値から入力値を一括で求める（各区間で単調増加の曲線のみ）
+
+        区間の境界で多項式に段差があり、同じ出力になる入力が2つある場合は
+        低い方の入力を返す（上限の判定を入力側の閾値で行うと安全側になる）。
+        1次式はそのまま解き、2次以上は区間ごとの表で初期値を求めてNewton法で補正する。
+
+        Args:
+            y (array_like): 出力値
+            iterations (int): Newton法の反復回数
+
+        Returns:
+            numpy.ndarray: 入力値。範囲外とNaNはNaN
+        """
+        y = np.asarray(y, dtype=np.float64)
+        count = len(self.coefficients)
+        segment = np.full(y.shape, -1)
+        # 低い入力の区間を優先するため逆順に上書きする
+        for k in range(count - 1, -1, -1):
+            lo, hi = self.ranges[k]
+            segment[(y >= lo) & (y <= hi)] = k
+        valid = segment >= 0
+        segment = np.where(valid, segment, 0)
+        c = self.coefficients[segment]
+        if self.degree == 1:
+            return np.where(valid, (y - c[..., 0]) / c[..., 1], np.nan)
+
+        if self._inverse_nodes is None:
+            self._inverse_nodes = []
+            for k in range(count):
+                v = np.linspace(self.edges[k], self.edges[k + 1], 65)
+                self._inverse_nodes.append((self._horner(self.coefficients[k], v), v))
+        v = np.full(y.shape, np.nan)
+        for k in range(count):
+            inside = valid & (segment == k)
+            outputs, inputs = self._inverse_nodes[k]
+            v[inside] = np.interp(y[inside], outputs, inputs)
+        derivative = c[..., 1:] * np.arange(1, self.degree + 1)
+        lo = self.edges[segment]
+        hi = self.edges[segment + 1]
+        for _ in range(iterations):
+            f = self._horner(c, v) - y
+            df = derivative[..., -1]
+            for j in range(self.degree - 2, -1, -1):
+                df = df*v + derivative[..., j]
+            v = np.clip(v - f/df, lo, hi)
+        return np.where(valid, v, np.nan)
+
+def compile_curve(spec):
+    """校正データ（辞書）から校正曲線を作成
+
+    kindは'piecewise_polynomial'（coefficients, breakpoints）または
+    'linear'（出力 = (入力 - offset) * scale / span + intercept）。
+
+    Args:
+        spec (dict): 校正データ
+
+    Returns:
+        PiecewisePolynomial: 校正曲線
+
+    Raises:
+        CalibrationError: 未対応の形式や必要な項目がない場合
+    """
+    try:
+        kind = spec.get('kind', 'piecewise_polynomial')
+        common = {
+            'name': spec['name'],
+            'version': spec['version'],
+            'domain': spec.get('domain'),
+            'input_unit': spec.get('input_unit', ""),
+            'output_unit': spec.get('output_unit', ""),
+            'description': spec.get('description', "")
+        }
+        if kind == 'piecewise_polynomial':
+            return PiecewisePolynomial(coefficients=spec['coefficients'],
+                                       breakpoints=spec.get('breakpoints', []), **common)
+        if kind == 'linear':
+            gain = float(spec['scale']) / float(spec.get('span', 1.0))
+            intercept = float(spec.get('intercept', 0.0)) - float(spec.get('offset', 0.0)) * gain
+            return PiecewisePolynomial(coefficients=[[intercept, gain]], **common)
+    except KeyError as e:
+        raise CalibrationError("校正データに {} がありません".format(e))
+    raise CalibrationError("未対応の校正データの形式です: {}".format(kind))
+
+class CalibrationRegistry:
+    """名前と版で管理する校正曲線と、装置ごとの割り当て
+
+    ディレクトリ内のJSONファイルを読み込む。'rigs'を含むファイルは
+    装置名 → 用途（'thermocouple', 'pressure'など）→ 曲線の割り当て、
+    それ以外は1つの校正曲線として扱う。
+    センサーを交換した場合は新しい曲線（または新しい版）のファイルを追加し、
+    割り当てを変更する。
+    """
+    def __init__(self, directories=()):
+        """
+        Args:
+            directories (list): 読み込むディレクトリ（後のものほど優先）
+        """
+        self.curves = {}  # (名前, 版) → PiecewisePolynomial
+        self.rigs = {}    # 装置名 → 用途 → (名前, 版またはNone)
+        for directory in directories:
+            self.load_directory(directory)
+
+    def load_directory(self, directory):
+        """ディレクトリ内の校正データを読み込む（存在しない場合は何もしない）"""
+        for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                if 'rigs' in data:
+                    for rig_id, roles in data['rigs'].items():
+                        for role, assignment in roles.items():
+                            self.assign(rig_id, role, assignment['curve'], assignment.get('version'))
+                else:
+                    self.register(compile_curve(data))
+            except Exception as e:
+                tracer.warning("校正データの読み込みエラー ({}): {}".format(path, e))
+
+    def register(self, curve):
+        """校正曲線を登録
+
+        Raises:
+            CalibrationError: 同じ名前と版で係数の異なる曲線が登録済みの場合
+        """
+        key = (curve.name, curve.version)
+        existing = self.curves.get(key)
+        if existing is not None and not (
+                np.array_equal(existing.coefficients, curve.coefficients)
+                and np.array_equal(existing.breakpoints, curve.breakpoints)
+                and existing.domain == curve.domain):
+            raise CalibrationError("{} は異なる内容で登録済みです。版を上げてください".format(curve.key))
+        self.curves[key] = curve
+
+    def versions(self, name):
+        """登録されている版の一覧（昇順）"""
+        return sorted(version for curve_name, version in self.curves if curve_name == name)
+
+    def get(self, name, version=None):
+        """校正曲線を取得
+
+        Args:
+            name (str): 曲線の名前
+            version (int, optional): 版。省略時は最新の版
+
+        Raises:
+            CalibrationError: 登録されていない場合
+        """
+        if version is None:
+            versions = self.versions(name)
+            if not versions:
+                raise CalibrationError("校正曲線 {} は登録されていません".format(name))
+            version = versions[-1]
+        try:
+            return self.curves[(name, int(version))]
+        except KeyError:
+            raise CalibrationError("校正曲線 {}@{} は登録されていません".format(name, version))
+
+    def assign(self, rig_id, role, name, version=None):
+        """装置の用途に校正曲線を割り当てる（versionを省略すると常に最新の版を使う）"""
+        self.rigs.setdefault(rig_id, {})[role] = (name, version)
+
+    def curve_for(self, role, rig_id="default"):
+        """装置の用途に割り当てた校正曲線を取得
+
+        装置に割り当てがない用途は'default'の割り当てを使う。
+
+        Raises:
+            CalibrationError: 割り当てがない場合
+        """
+        assignment = self.rigs.get(rig_id, {}).get(role) or self.rigs.get("default", {}).get(role)
+        if assignment is None:
+            raise CalibrationError("{}の{}に校正曲線が割り当てられていません".format(rig_id, role))
+        return self.get(*assignment)
+
+    def assignments(self, rig_id="default"):
+        """装置の用途 → 使用する曲線の識別名（結果ファイルへの記録用）"""
+        roles = set(self.rigs.get("default", {})) | set(self.rigs.get(rig_id, {}))
+        return {role: self.curve_for(role, rig_id).key for role in sorted(roles)}
+
+    def recalibrate(self, values, name, version=None):
+        """過去の測定値（入力側の値の配列）を指定した曲線で一括変換"""
+        return self.get(name, version).evaluate(values)
+
+# プロセス全体で共有するレジストリ
+registry = CalibrationRegistry([BUILTIN_DIR, USER_DIR])
+
+def get_curve(role, rig_id="default"):
+    """装置の用途に割り当てた校正曲線を取得（registry.curve_forの省略形）"""
+    return registry.curve_for(role, rig_id)
@@ -1,39 +1,167 @@
+import json
+import os
 import serial
+import threading
 import time
-import struct
+from decimal import Decimal
+from DTAmodule.port_registry import registry
+from DTAmodule.trace import tracer
+
+STX = b'\x02'
+ETX = b'\x03'
+
+# 応答フレーム（" 1, 1,"）のフィールド位置
+PV_FIELD = 4  # 測定値（従来のc[14:23]の位置）
+SV_FIELD = 5  # 設定値
+
+# プログラム運転用の書き込み項目番号（" 2,<項目>,<番号>,<値>," 形式）
+# 番号は機種ごとに通信仕様書で決まっているため既定値は持たない。
+# 使用機器の通信仕様書の番号をPROGRAM_ITEMS_FILEに記載した場合のみプログラム運転を使える
+PROGRAM_ITEMS_FILE = os.path.join(os.path.expanduser("~"), ".dta", "chino_program.json")
+PROGRAM_ITEM_KEYS = (
+    'start_sv',       # プログラム開始温度
+    'segment_sv',     # セグメント終了温度（番号 = セグメント番号）
+    'segment_time',   # セグメント時間（分, 番号 = セグメント番号）
+    'segment_count',  # 使用セグメント数
+    'run'             # 運転指令（1: 開始, 0: 停止）
+)
+PROGRAM_TIME_RESOLUTION = 0.1  # セグメント時間の分解能（分）
+MAX_PROGRAM_SEGMENTS = 99
+
+class ChinoTimeoutError(Exception):
+    """Chinoの応答が期限内に得られなかった場合の例外"""
+    pass
+
+class ChinoFrameError(Exception):
+    """Chinoの応答フレームが不正な場合の例外"""
+    pass
+
+class ChinoProgramError(Exception):
+    """プログラム運転を使えない場合の例外"""
+    pass
+
+def load_program_items(path=PROGRAM_ITEMS_FILE):
+    """プログラム運転の項目番号を読み込む
+    
+    Args:
+        path (str): 項目番号のファイル（{"start_sv": 番号, ...}）
+        
+    Returns:
+        dict: キー（PROGRAM_ITEM_KEYS）→ 項目番号
+        None: ファイルがないか、番号が揃っていない場合
+    """
+    try:
+        with open(path) as f:
+            items = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        tracer.warning("プログラム運転の項目番号の読み込みエラー: {}".format(e))
+        return None
+    missing = [key for key in PROGRAM_ITEM_KEYS if key not in items]
+    if missing:
+        tracer.warning("プログラム運転の項目番号が不足しています（{}）: {}".format(path, ", ".join(missing)))
+        return None
+    return {key: int(items[key]) for key in PROGRAM_ITEM_KEYS}
 
 class ChinoController:
-    def __init__(self, port='/dev/ttyUSB1', baudrate=9600):
+    # read_until 1回あたりの待ち時間（秒）
+    # 受信のたびにポートのタイムアウトを変更すると termios の再設定が走るため固定にする
+    poll_interval = 0.1
+
+    def __init__(self, port='/dev/ttyUSB1', baudrate=9600, timeout=2.0, verify_checksum=True,
+                 sv_resolution=0.1, min_write_interval=1.0, program_items=None):
         """Chino温度制御器の初期化
         
         Args:
             port (str): シリアルポート
             baudrate (int): ボーレート
+            timeout (float): 応答フレームの受信期限（秒）
+            verify_checksum (bool): 応答のチェックサムを検証するか
+            sv_resolution (float): 設定値の分解能（制御器の表示分解能）
+            min_write_interval (float): 設定値を書き込む最小間隔（秒）
+            program_items (dict, optional): プログラム運転の項目番号（load_program_items()）。
+                省略時はプログラム運転を使わない
         """
         self.port = port
         self.baudrate = baudrate
+        self.timeout = timeout
+        self.verify_checksum = verify_checksum
+        self.sv_resolution = sv_resolution
+        self.sv_decimals = max(0, -Decimal(str(sv_resolution)).as_tuple().exponent)
+        self.min_write_interval = min_write_interval
         self.ser = None
+        self.shared_port = None
+        
+        # 最後に書き込んだ設定値
+        self.last_sv = None
+        self.last_sv_time = None
+        self.sv_writes_skipped = 0
+        # 書き込みの間隔が短いために保留した設定値（間隔が空いたらpending_timerで書き込む）
+        self.pending_sv = None
+        self.pending_timer = None
+        self.sv_lock = threading.Lock()
+        
+        self.program_items = program_items
+        # start_program()を送信してからstop_program()が成功するまでTrue
+        self.program_running = False
+    
+    @property
+    def program_supported(self):
+        """プログラム運転の項目番号が設定されている場合True"""
+        return self.program_items is not None
     
     def connect(self):
-        """シリアル接続を確立"""
+        """シリアル接続を確立
+        
+        ポートはレジストリで共有し、既に開いている場合はそれを使う。
+        """
+        if self.shared_port is not None and self.shared_port.is_open:
+            return True
         try:
-            self.ser = serial.Serial(
-                port=self.port,
+            self.shared_port = registry.acquire(
+                self.port, "Chino",
+                timeout=self.poll_interval,
                 baudrate=self.baudrate,
                 bytesize=serial.SEVENBITS,
                 parity=serial.PARITY_EVEN,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=5
+                stopbits=serial.STOPBITS_ONE
             )
+            self.ser = self.shared_port.ser
             return True
         except Exception as e:
-            print("接続エラー: {}".format(e))
+            tracer.warning("接続エラー: {}".format(e))
             return False
     
     def disconnect(self):
-        """シリアル接続を切断"""
-        if self.ser and self.ser.is_open:
-            self.ser.close()
+        """シリアル接続の使用を終了（ポートは再接続に備えて開いたままにする）"""
+        with self.sv_lock:
+            self.pending_sv = None
+            if self.pending_timer is not None:
+                self.pending_timer.cancel()
+                self.pending_timer = None
+        if self.shared_port is not None:
+            registry.release(self.shared_port, "Chino")
+            self.shared_port = None
+            self.ser = None
+    
+    def reconnect(self):
+        """ポートを開き直し、応答を確認
+        
+        Returns:
+            bool: 応答があった場合True
+        """
+        try:
+            if self.shared_port is None:
+                if not self.connect():
+                    return False
+            else:
+                self.shared_port.reopen()
+            self.read_status()
+            return True
+        except Exception as e:
+            tracer.warning("Chino再接続エラー: {}".format(e))
+            return False
     
     def calculate_checksum(self, data):
         """チェックサムを計算
@@ -49,63 +177,111 @@ class ChinoController:
             chkSum += ord(char)
         chkSum += 3  # ETXの値
         
-        # 16進数に変換し、上位バイトと下位バイトを入れ替え
-        hex_sum = hex(chkSum)[2:].upper().zfill(2)
+        # 下位1バイトを16進数に変換し、上位桁と下位桁を入れ替え
+        hex_sum = "{:02X}".format(chkSum & 0xFF)
         return hex_sum[1] + hex_sum[0]
     
-    def send_command(self, command):
-        """コマンドを送信
+    def build_frame(self, command):
+        """送信フレームを作成
         
         Args:
-            command (str): 送信するコマンド
+            command (str): コマンド文字列
+            
+        Returns:
+            bytes: STX + コマンド + ETX + チェックサム + CR LF
         """
-        if not self.ser or not self.ser.is_open:
-            if not self.connect():
-                return None
+        return (STX + command.encode() + ETX
+                + self.calculate_checksum(command).encode() + b'\r\n')
+    
+    def read_frame(self, timeout=None):
+        """応答フレームをLFまで一括で読み取る
         
-        try:
-            # STX
-            self.ser.write(bytes([0x02]))
-            
-            # コマンド
-            self.ser.write(command.encode())
-            
-            # チェックサム計算
-            chkSum = self.calculate_checksum(command)
-            
-            # ETX
-            self.ser.write(bytes([0x03]))
+        Args:
+            timeout (float, optional): 期限（秒）。省略時は既定値
             
-            # チェックサム送信
-            self.ser.write(chkSum.encode())
+        Returns:
+            str: STXとETXの間のテキスト
             
-            # CR+LF
-            self.ser.write(b'\r\n')
+        Raises:
+            ChinoTimeoutError: 期限内にフレームを受信できなかった場合
+            ChinoFrameError: フレームの形式またはチェックサムが不正な場合
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+        buf = bytearray()
+        while not buf.endswith(b'\n'):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ChinoTimeoutError("Chinoの応答がタイムアウトしました（受信済み: {!r}）".format(bytes(buf)))
+            buf += self.ser.read_until(b'\n')
+        
+        frame = bytes(buf)
+        stx = frame.rfind(STX)
+        etx = frame.rfind(ETX)
+        if stx < 0 or etx < stx:
+            raise ChinoFrameError("フレームの形式が不正です: {!r}".format(frame))
+        text = frame[stx + 1:etx].decode()
+        received = frame[etx + 1:etx + 3].decode()
+        if self.verify_checksum and received != self.calculate_checksum(text):
+            raise ChinoFrameError("チェックサムが一致しません: 受信 {} / 計算 {}".format(
+                received, self.calculate_checksum(text)))
+        return text
+    
+    def transact(self, command, timeout=None):
+        """コマンドを送信し、応答フレームのフィールドを取得
+        
+        Args:
+            command (str): 送信するコマンド
+            timeout (float, optional): 期限（秒）
             
-            # 応答待ち
-            response = ""
-            comma_count = 0
-            while True:
-                if self.ser.in_waiting > 0:
-                    recv_data = self.ser.read()
-                    value = struct.unpack_from("B", recv_data, 0)[0]
-                    char = chr(value)
-                    
-                    if char == ",":
-                        comma_count += 1
-                        if comma_count == 5:  # PV値の位置
-                            pv = response[14:23]
-                            return float(pv)
-                    response += char
-                    
-                    if value == 10:  # LF
-                        break
+        Returns:
+            list: 応答フィールド（前後の空白を除去した文字列）
+        """
+        if self.shared_port is None or not self.shared_port.is_open:
+            if not self.connect():
+                raise ChinoTimeoutError("Chinoに接続できません")
+        with self.shared_port.lock:
+            self.ser.reset_input_buffer()
+            self.ser.write(self.build_frame(command))
+            text = self.read_frame(timeout)
+        tracer.debug("Chino応答", command=command, response=text)
+        return [field.strip() for field in text.split(',')]
+    
+    def send_command(self, command):
+        """コマンドを送信
+        
+        Args:
+            command (str): 送信するコマンド
             
-            return None
+        Returns:
+            list: 応答フィールド
+            None: 通信に失敗した場合
+        """
+        try:
+            return self.transact(command)
         except Exception as e:
-            print("コマンド送信エラー: {}".format(e))
+            tracer.warning("コマンド送信エラー: {}".format(e))
             return None
     
+    def read_status(self):
+        """現在のPV/SVを取得
+        
+        Returns:
+            dict: pv（測定値）, sv（設定値）, fields（応答フィールド全体）
+            
+        Raises:
+            ChinoTimeoutError, ChinoFrameError: 通信に失敗した場合
+        """
+        fields = self.transact(" 1, 1,")
+        if len(fields) <= max(PV_FIELD, SV_FIELD):
+            raise ChinoFrameError("応答のフィールド数が不足しています: {}".format(fields))
+        return {
+            'pv': float(fields[PV_FIELD]),
+            'sv': float(fields[SV_FIELD]),
+            'fields': fields
+        }
+    
     def get_temperature(self):
         """現在の温度を取得
         
@@ -113,116 +289,190 @@ class ChinoController:
             float: 測定された温度値
         """
         try:
-            # STX
-            x = [0x02]
-            self.ser.write(x)
-
-            # コマンド
-            y = " 1, 1,"
-            x = y.encode()
-            self.ser.write(x)
-            
-            # チェックサム計算
-            i = 0
-            chkSum = 0
-            for i in range(len(y)):
-                chkSum = chkSum + ord(y[i])
-
-            # ETX
-            x = [0x03]
-            chkSum = chkSum + 3
-            self.ser.write(x)
-
-            # チェックサム送信
-            a = hex(chkSum)
-            chkSumU = a[-2:-1]
-            chkSumD = a[-1:]
-            chkSumValue = str.upper(chkSumD + chkSumU)
-            x = chkSumValue.encode()
-            self.ser.write(x)
-            
-            # CR+LF
-            x = b'\r\n'
-            self.ser.write(x)
-            
-            # 応答待ち
-            time.sleep(0.1)
-            
-            # 応答を読み取り
-            c = ""
-            camma = 0
-            i = 0
-            while True:
-                if self.ser.in_waiting > 0:
-                    recv_data = self.ser.read()
-                    a = struct.unpack_from("B", recv_data, 0)
-                    b = a[0]
-                    b = chr(b)
-                    if b == ",":
-                        camma += 1
-                        if camma == 5:
-                            pv = c[14:23]
-                            return float(pv)
-                    c += b
-                    i += 1
-            
+            fields = self.transact(" 1, 1,")
+            return float(fields[PV_FIELD])
         except Exception as e:
-            print("温度取得エラー: {}".format(e))
+            tracer.warning("温度取得エラー: {}".format(e))
             return None
     
-    def set_temperature(self, temp):
+    def format_sv(self, temp):
+        """設定値を制御器の分解能に丸めた文字列に変換
+        
+        Args:
+            temp (float): 温度値
+            
+        Returns:
+            str: 丸めた設定値
+        """
+        rounded = round(temp / self.sv_resolution) * self.sv_resolution
+        return "{:.{}f}".format(rounded, self.sv_decimals)
+    
+    def set_temperature(self, temp, force=False):
         """目標温度を設定
         
+        分解能に丸めた値が前回書き込んだ値と同じ場合は書き込みを省略する。
+        前回の書き込みからmin_write_interval秒以内の場合は値を保留し、
+        間隔が空いた時点で（それまでに次の値が来なければ）書き込む。
+        
         Args:
             temp (float): 設定する温度値
+            force (bool): Trueの場合は省略・保留せずに必ず書き込む
+            
+        Returns:
+            bool: 書き込んだ場合True、省略または保留した場合False
+            None: 通信に失敗した場合
         """
+        sv = self.format_sv(temp)
+        with self.sv_lock:
+            now = time.monotonic()
+            if not force:
+                if sv == self.last_sv:
+                    # 保留していた値より新しい値が制御器の値と同じ
+                    self.pending_sv = None
+                    self.sv_writes_skipped += 1
+                    return False
+                if self.last_sv_time is not None and now - self.last_sv_time < self.min_write_interval:
+                    self.pending_sv = sv
+                    self._schedule_pending(self.last_sv_time + self.min_write_interval - now)
+                    self.sv_writes_skipped += 1
+                    return False
+            self.pending_sv = None
+            return self._write_sv(sv)
+    
+    def _write_sv(self, sv):
+        """設定値を書き込む（sv_lockを保持して呼ぶ）"""
         try:
-            # STX
-            x = [0x02]
-            self.ser.write(x)
-
-            # コマンド
-            y = " 2, 4,1," + str(temp) + ","
-            x = y.encode()
-            self.ser.write(x)
-            
-            # チェックサム計算
-            i = 0
-            chkSum = 0
-            for i in range(len(y)):
-                chkSum = chkSum + ord(y[i])
-
-            # ETX
-            x = [0x03]
-            chkSum = chkSum + 3
-            self.ser.write(x)
-
-            # チェックサム送信
-            a = hex(chkSum)
-            chkSumU = a[-2:-1]
-            chkSumD = a[-1:]
-            chkSumValue = str.upper(chkSumD + chkSumU)
-            x = chkSumValue.encode()
-            self.ser.write(x)
-            
-            # CR+LF
-            x = b'\r\n'
-            self.ser.write(x)
-            
-            # 応答待ち
-            time.sleep(0.1)
-            
-            # 応答を読み取り
-            while True:
-                if self.ser.in_waiting > 0:
-                    recv_data = self.ser.read()
-                    a = struct.unpack_from("B", recv_data, 0)
-                    if a[0] == 10:
-                        break
-            
+            self.transact(" 2, 4,1," + sv + ",")
+            self.last_sv = sv
+            self.last_sv_time = time.monotonic()
+            return True
         except Exception as e:
-            print("温度設定エラー: {}".format(e))
+            tracer.warning("温度設定エラー: {}".format(e))
+            self.last_sv = None
             return None
+    
+    def _schedule_pending(self, delay):
+        """保留した設定値をdelay秒後に書き込む（sv_lockを保持して呼ぶ）"""
+        if self.pending_timer is not None:
+            return
+        self.pending_timer = threading.Timer(max(0.0, delay), self._write_pending)
+        self.pending_timer.daemon = True
+        self.pending_timer.start()
+    
+    def _write_pending(self):
+        """保留した設定値を書き込む"""
+        with self.sv_lock:
+            self.pending_timer = None
+            sv = self.pending_sv
+            if sv is None:
+                return
+            now = time.monotonic()
+            if self.last_sv_time is not None and now - self.last_sv_time < self.min_write_interval:
+                # 保留の間に別の値を書き込んだ場合は、そこから間隔を空ける
+                self._schedule_pending(self.last_sv_time + self.min_write_interval - now)
+                return
+            self.pending_sv = None
+            if sv != self.last_sv:
+                self._write_sv(sv)
+
+    def download_program(self, start_temp, segments):
+        """昇降温プログラムを制御器に転送
+        
+        転送後にstart_program()を呼ぶと、制御器自身が昇降温を実行する。
+        
+        Args:
+            start_temp (float): プログラム開始温度
+            segments (list): build_ramp_segments()で作成したセグメントのリスト
+            
+        Raises:
+            ChinoProgramError: プログラム運転の項目番号が設定されていない場合
+        """
+        items = self._require_program_items()
+        if len(segments) > MAX_PROGRAM_SEGMENTS:
+            raise ValueError("セグメント数が上限 ({}) を超えています: {}".format(
+                MAX_PROGRAM_SEGMENTS, len(segments)))
+        self.transact(" 2,{},1,{},".format(items['start_sv'], self.format_sv(start_temp)))
+        for i, segment in enumerate(segments, start=1):
+            self.transact(" 2,{},{},{},".format(items['segment_sv'], i, self.format_sv(segment['target'])))
+            self.transact(" 2,{},{},{:.1f},".format(items['segment_time'], i, segment['minutes']))
+        self.transact(" 2,{},1,{},".format(items['segment_count'], len(segments)))
+    
+    def start_program(self):
+        """プログラム運転を開始"""
+        items = self._require_program_items()
+        # 応答がなくても制御器が受け付けている可能性があるため、送信前に運転中とする
+        self.program_running = True
+        self.transact(" 2,{},1,1,".format(items['run']))
+    
+    def stop_program(self):
+        """プログラム運転を停止（start_program()で開始していない場合は何もしない）"""
+        if not self.program_running:
+            return
+        self.transact(" 2,{},1,0,".format(self.program_items['run']))
+        self.program_running = False
+    
+    def _require_program_items(self):
+        if self.program_items is None:
+            raise ChinoProgramError("プログラム運転の項目番号が設定されていません（通信仕様書の番号を{}に記載してください）".format(
+                PROGRAM_ITEMS_FILE))
+        return self.program_items
+
+def _program_minutes(minutes):
+    """セグメント時間を制御器の分解能に丸める"""
+    return round(minutes / PROGRAM_TIME_RESOLUTION) * PROGRAM_TIME_RESOLUTION
+
+def build_ramp_segments(Tsv, Tf, rate, wait, first_run=1, initial_wait=0.0):
+    """実験条件（Tsv, Tf, rate, wait）を昇降温プログラムのセグメントに変換
+    
+    各測定について、開始温度への移動（前の終了温度と異なる場合）、
+    rate（K/min）での昇降温、終了温度での待機（wait秒）のセグメントを作る。
+    設定値を順に送る場合と同じく、待機は次の測定の最初に行い（runは次の測定の番号）、
+    最後の測定の後には待機しない。時間は制御器の分解能（PROGRAM_TIME_RESOLUTION）に丸める。
+    
+    Args:
+        Tsv (list): 開始温度（K）
+        Tf (list): 終了温度（K）
+        rate (list): 昇降温速度（K/min）
+        wait (list): 終了後の待機時間（秒）
+        first_run (int): 最初の測定の番号（再開時は再開する番号）
+        initial_wait (float): 最初の測定の前の待機時間（秒, 再開時の残り時間）
+        
+    Returns:
+        list: セグメント（target: 終了温度, minutes: 所要時間（分）, run: 測定の番号）のリスト
+    """
+    segments = []
+    current = Tsv[0]
+    if initial_wait > 0:
+        segments.append({'target': current, 'minutes': _program_minutes(initial_wait / 60.0),
+                         'run': first_run})
+    for i, (start, end, r, w) in enumerate(zip(Tsv, Tf, rate, wait)):
+        run = first_run + i
+        if start != current:
+            segments.append({'target': start, 'minutes': 0.0, 'run': run})
+        if r == 0:
+            raise ValueError("昇降温速度が0です")
+        segments.append({'target': end, 'minutes': _program_minutes(abs(end - start) / abs(r)),
+                         'run': run})
+        if w > 0 and i + 1 < len(Tf):
+            segments.append({'target': end, 'minutes': _program_minutes(w / 60.0), 'run': run + 1})
+        current = end
+    return segments
+
+def program_run_ends(segments):
+    """各測定が終わるプログラム開始からの時間
+    
+    Args:
+        segments (list): build_ramp_segments()で作成したセグメントのリスト
+        
+    Returns:
+        dict: 測定の番号 → 最後のセグメントが終わる時間（秒）
+    """
+    ends = {}
+    elapsed = 0.0
+    for segment in segments:
+        elapsed += segment['minutes'] * 60.0
+        ends[segment['run']] = elapsed
+    return ends
 
 # グローバルインスタンス
 chino = ChinoController()
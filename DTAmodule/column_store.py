@@ -0,0 +1,224 @@
+import json
+import os
+import zlib
+import numpy as np
+
+MANIFEST_FILE = "manifest.json"
+
+# 文字列の列（Heat/Cool, 状態など）は種類が少ないため、番号で保存して一覧をmanifestに置く
+CATEGORY = 'category'
+CATEGORY_DTYPE = np.dtype('<i4')
+
+class ColumnStoreError(Exception):
+    """列形式のデータの読み書きの例外"""
+    pass
+
+def _column_dtype(column):
+    return CATEGORY_DTYPE if column['dtype'] == CATEGORY else np.dtype(column['dtype'])
+
+def _read_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+def _write_manifest(path, manifest):
+    tmp = os.path.join(path, MANIFEST_FILE + ".tmp")
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, os.path.join(path, MANIFEST_FILE))
+
+class ColumnWriter:
+    """測定データを列ごとのバイナリファイルに追記するクラス
+
+    ディレクトリに列ごとのファイル（リトルエンディアンの値を並べただけのもの）と
+    manifest.json（列名, 型, 行数）を置く。追記中でもColumnReaderで読める。
+    """
+    def __init__(self, path, columns, chunk_rows=65536):
+        """
+        Args:
+            path (str): 保存先のディレクトリ（既にある場合は列が同じなら追記する）
+            columns (list): (列名, 型)のリスト。型はNumPyの型名か'category'（文字列）
+            chunk_rows (int): compress()で圧縮する単位（行数）
+
+        Raises:
+            ColumnStoreError: 既存のデータと列が異なる場合
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            self.manifest = _read_manifest(path)
+            existing = [(c['name'], c['dtype']) for c in self.manifest['columns']]
+            requested = [(name, dtype if dtype == CATEGORY else np.dtype(dtype).str)
+                         for name, dtype in columns]
+            if existing != requested:
+                raise ColumnStoreError("{} の列が異なります".format(path))
+            if any(c.get('compression') for c in self.manifest['columns']):
+                raise ColumnStoreError("{} は圧縮済みのため追記できません".format(path))
+        else:
+            self.manifest = {
+                'version': 1,
+                'rows': 0,
+                'chunk_rows': chunk_rows,
+                'columns': [
+                    {'name': name, 'dtype': dtype if dtype == CATEGORY else np.dtype(dtype).str,
+                     'file': "c{:02d}.bin".format(i)}
+                    for i, (name, dtype) in enumerate(columns)]
+            }
+            for column in self.manifest['columns']:
+                if column['dtype'] == CATEGORY:
+                    column['categories'] = []
+        self.codes = [{value: i for i, value in enumerate(column.get('categories', []))}
+                      for column in self.manifest['columns']]
+        self.files = [open(os.path.join(path, column['file']), 'ab')
+                      for column in self.manifest['columns']]
+        # manifestより後に書いた値（書き込み中に止まった場合）は捨てる
+        self.truncate(self.manifest['rows'])
+
+    @property
+    def rows(self):
+        return self.manifest['rows']
+
+    def append(self, rows):
+        """行を追記
+
+        一部の列だけ書けた場合は書く前の状態に戻す。
+
+        Args:
+            rows (list): 各行の値のタプル（列の順）
+        """
+        if not rows:
+            return
+        before = self.rows
+        try:
+            for i, column in enumerate(self.manifest['columns']):
+                values = [row[i] for row in rows]
+                if column['dtype'] == CATEGORY:
+                    values = [self._code(i, value) for value in values]
+                data = np.asarray(values, dtype=_column_dtype(column))
+                self.files[i].write(data.tobytes())
+            for f in self.files:
+                f.flush()
+            self.manifest['rows'] = before + len(rows)
+            _write_manifest(self.path, self.manifest)
+        except Exception:
+            self.truncate(before)
+            raise
+
+    def _code(self, i, value):
+        """文字列の値の番号（新しい値は一覧に加える）"""
+        value = str(value)
+        code = self.codes[i].get(value)
+        if code is None:
+            categories = self.manifest['columns'][i]['categories']
+            code = len(categories)
+            categories.append(value)
+            self.codes[i][value] = code
+        return code
+
+    def truncate(self, rows):
+        """rows行より後の値を捨てる"""
+        for f, column in zip(self.files, self.manifest['columns']):
+            f.flush()
+            f.truncate(rows * _column_dtype(column).itemsize)
+        self.manifest['rows'] = rows
+        _write_manifest(self.path, self.manifest)
+
+    def fsync(self):
+        """列のファイルをディスクに書き込む"""
+        for f in self.files:
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+    def compress(self, level=6):
+        """全ての列をchunk_rows行ごとにzlibで圧縮して閉じる（以降は追記できない）
+
+        読み込みは必要な範囲の塊だけを展開する（np.memmapでは読めなくなる）。
+        """
+        self.close()
+        chunk_rows = self.manifest['chunk_rows']
+        for column in self.manifest['columns']:
+            raw_path = os.path.join(self.path, column['file'])
+            data = np.fromfile(raw_path, dtype=_column_dtype(column), count=self.rows)
+            compressed_file = column['file'].replace('.bin', '.z')
+            chunks = []
+            offset = 0
+            with open(os.path.join(self.path, compressed_file), 'wb') as f:
+                for start in range(0, self.rows, chunk_rows):
+                    block = zlib.compress(data[start:start + chunk_rows].tobytes(), level)
+                    f.write(block)
+                    chunks.append([offset, len(block)])
+                    offset += len(block)
+            column.update({'file': compressed_file, 'compression': 'zlib', 'chunks': chunks})
+            _write_manifest(self.path, self.manifest)
+            os.remove(raw_path)
+
+class ColumnReader:
+    """ColumnWriterで保存したデータを読むクラス
+
+    圧縮していない列はnp.memmapで開くため、行数によらず開く時間は一定で、
+    読んだ範囲だけがファイルから読み込まれる。
+    """
+    def __init__(self, path):
+        """
+        Args:
+            path (str): 保存先のディレクトリ
+        """
+        self.path = path
+        self.manifest = _read_manifest(path)
+        self.columns = [column['name'] for column in self.manifest['columns']]
+        self._columns = {column['name']: column for column in self.manifest['columns']}
+        self.rows = self.manifest['rows']
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def codes(self, name, start=None, stop=None):
+        """列の値をそのまま（文字列の列は番号で）読む
+
+        Args:
+            name (str): 列名
+            start (int, optional): 最初の行
+            stop (int, optional): 最後の行の次
+
+        Returns:
+            numpy.ndarray: 値（圧縮していない列はnp.memmapの一部）
+        """
+        column = self._columns.get(name)
+        if column is None:
+            raise KeyError(name)
+        dtype = _column_dtype(column)
+        start, stop, _ = slice(start, stop).indices(self.rows)
+        if stop <= start:
+            return np.empty(0, dtype=dtype)
+        file_path = os.path.join(self.path, column['file'])
+        if not column.get('compression'):
+            return np.memmap(file_path, dtype=dtype, mode='r', shape=(self.rows,))[start:stop]
+
+        chunk_rows = self.manifest['chunk_rows']
+        first, last = start // chunk_rows, (stop - 1) // chunk_rows
+        blocks = []
+        with open(file_path, 'rb') as f:
+            for offset, length in column['chunks'][first:last + 1]:
+                f.seek(offset)
+                blocks.append(np.frombuffer(zlib.decompress(f.read(length)), dtype=dtype))
+        data = np.concatenate(blocks)
+        return data[start - first*chunk_rows:stop - first*chunk_rows]
+
+    def column(self, name, start=None, stop=None):
+        """列の値を読む（文字列の列は文字列の配列に戻す）"""
+        data = self.codes(name, start, stop)
+        categories = self._columns[name].get('categories')
+        if categories is None:
+            return data
+        return np.asarray(categories + [""], dtype=object)[np.clip(data, -1, len(categories))]
+
+    def read(self, names=None, start=None, stop=None):
+        """複数の列を読む
+
+        Returns:
+            dict: 列名 → 値
+        """
+        return {name: self.column(name, start, stop) for name in (names or self.columns)}
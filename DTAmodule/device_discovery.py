@@ -0,0 +1,255 @@
+import glob
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import serial
+from DTAmodule.scpi_transport import ScpiTransport, ScpiTimeoutError
+from DTAmodule.chino_control import ChinoController, ChinoTimeoutError, ChinoFrameError
+from DTAmodule.trace import tracer
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".dta", "ports.json")
+
+# 機器名 → 機種（*IDN?の2番目のフィールド。Chinoは'CHINO'）
+DEVICE_MODELS = {
+    'chino': 'CHINO',
+    'k2000_temperature': 'MODEL 2000',
+    'k2000_pressure': 'MODEL 2000',
+    'k2182a': 'MODEL 2182A'
+}
+
+def candidate_ports():
+    """探索対象のシリアルポートを列挙
+
+    Returns:
+        list: ポートのパス
+    """
+    ports = set(glob.glob('/dev/ttyUSB*')) | set(glob.glob('/dev/ttyACM*'))
+    try:
+        from serial.tools import list_ports
+        ports.update(info.device for info in list_ports.comports())
+    except Exception:
+        pass
+    return sorted(ports)
+
+def probe_keithley(port, timeout=0.5):
+    """*IDN?でKeithley機器を識別
+
+    Args:
+        port (str): シリアルポート
+        timeout (float): 応答の期限（秒）
+
+    Returns:
+        str: 識別名（"MODEL 2000 1234567"の形式）
+        None: Keithley機器の応答がない場合
+    """
+    with serial.Serial(port, 9600, bytesize=serial.EIGHTBITS, parity=serial.PARITY_NONE,
+                       stopbits=serial.STOPBITS_ONE, timeout=ScpiTransport.poll_interval,
+                       write_timeout=timeout, exclusive=True) as ser:
+        ser.reset_input_buffer()
+        try:
+            response = ScpiTransport(ser, timeout=timeout).query("*IDN?")
+        except ScpiTimeoutError:
+            return None
+    fields = [field.strip() for field in response.split(',')]
+    if len(fields) < 3 or not fields[0].upper().startswith("KEITHLEY"):
+        return None
+    return "{} {}".format(fields[1].upper(), fields[2])
+
+def probe_chino(port, timeout=0.5):
+    """状態読み取りフレームでChinoを識別
+
+    Args:
+        port (str): シリアルポート
+        timeout (float): 応答の期限（秒）
+
+    Returns:
+        str: 'CHINO'
+        None: Chinoの応答がない場合
+    """
+    probe = ChinoController(port=port, timeout=timeout)
+    with serial.Serial(port, 9600, bytesize=serial.SEVENBITS, parity=serial.PARITY_EVEN,
+                       stopbits=serial.STOPBITS_ONE, timeout=probe.poll_interval,
+                       write_timeout=timeout, exclusive=True) as ser:
+        probe.ser = ser
+        ser.reset_input_buffer()
+        ser.write(probe.build_frame(" 1, 1,"))
+        try:
+            probe.read_frame()
+        except (ChinoTimeoutError, ChinoFrameError):
+            return None
+    return 'CHINO'
+
+def identify(port, timeout=0.5):
+    """ポートに接続されている機器を識別
+
+    Args:
+        port (str): シリアルポート
+        timeout (float): 1回の問い合わせの期限（秒）
+
+    Returns:
+        str: 識別名
+        None: 識別できなかった場合（使用中のポートを含む）
+    """
+    for probe in (probe_keithley, probe_chino):
+        try:
+            identity = probe(port, timeout)
+        except Exception:
+            # 使用中のポートや設定できないポートは対象外
+            return None
+        if identity is not None:
+            return identity
+    return None
+
+def model_of(identity):
+    """識別名から機種を取り出す"""
+    return identity if identity == 'CHINO' else identity.rsplit(' ', 1)[0]
+
+class DeviceDiscovery:
+    """機器とシリアルポートの対応を探索するクラス
+
+    前回の結果（識別名 → ポート、機器名 → 識別名）をファイルに保存し、
+    次回は保存したポートだけを確認する。USBの再列挙などで一致しない場合は
+    全ポートを並列に問い合わせる。同じ機種が複数ある場合（K2000の温度用と圧力用）は
+    保存した割り当て、なければ既定のポートにある機器を優先する。
+    """
+    def __init__(self, cache_file=DEFAULT_CACHE_FILE, timeout=0.5, models=None):
+        """
+        Args:
+            cache_file (str): 探索結果の保存先
+            timeout (float): 1回の問い合わせの期限（秒）
+            models (dict, optional): 機器名 → 機種。省略時はDEVICE_MODELS
+        """
+        self.cache_file = cache_file
+        self.timeout = timeout
+        self.models = dict(DEVICE_MODELS if models is None else models)
+        self.identities = {}  # 機器名 → 識別名
+        self.ports = {}       # 識別名 → ポート
+        self.load()
+
+    def load(self):
+        """保存した探索結果を読み込む"""
+        try:
+            with open(self.cache_file) as f:
+                data = json.load(f)
+            self.identities = dict(data.get('identities', {}))
+            self.ports = dict(data.get('ports', {}))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            tracer.warning("ポート情報の読み込みエラー: {}".format(e))
+
+    def save(self):
+        """探索結果を保存"""
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp = self.cache_file + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({'identities': self.identities, 'ports': self.ports}, f, indent=2)
+            os.replace(tmp, self.cache_file)
+        except Exception as e:
+            tracer.warning("ポート情報の保存エラー: {}".format(e))
+
+    def _probe_all(self, ports):
+        """複数のポートを並列に識別
+
+        Returns:
+            dict: ポート → 識別名（識別できなかったポートは含まない）
+        """
+        if not ports:
+            return {}
+        with ThreadPoolExecutor(max_workers=len(ports)) as executor:
+            results = executor.map(lambda port: identify(port, self.timeout), ports)
+            return {port: identity for port, identity in zip(ports, results) if identity is not None}
+
+    def _cached(self):
+        """保存した割り当てをそのまま使えるか確認
+
+        Returns:
+            dict: 機器名 → ポート（確認できなかった場合はNone）
+        """
+        if set(self.identities) != set(self.models):
+            return None
+        expected = {}
+        for name, identity in self.identities.items():
+            port = self.ports.get(identity)
+            if port is None or not os.path.exists(port):
+                return None
+            expected[port] = identity
+        found = self._probe_all(list(expected))
+        if found != expected:
+            return None
+        return {name: self.ports[identity] for name, identity in self.identities.items()}
+
+    def discover(self, default_ports, candidates=None):
+        """機器名 → ポートの対応を求める
+
+        Args:
+            default_ports (dict): 機器名 → 既定のポート（見つからない機器はこのポートを使う）
+            candidates (list, optional): 探索するポート。省略時はcandidate_ports()
+
+        Returns:
+            dict: 機器名 → ポート
+        """
+        start = time.monotonic()
+        result = self._cached()
+        if result is not None:
+            tracer.info("機器のポートを確認しました（{:.2f}秒）".format(time.monotonic() - start))
+            return result
+
+        if candidates is None:
+            candidates = candidate_ports()
+        found = self._probe_all(candidates)
+        for port, identity in found.items():
+            self.ports[identity] = port
+        available = {identity: port for port, identity in found.items()}
+
+        result = {}
+        # 保存した割り当て → 既定のポートにある同機種 → 残りの同機種（識別名順）の順に割り当てる
+        for name, model in self.models.items():
+            identity = self.identities.get(name)
+            if identity in available:
+                result[name] = available.pop(identity)
+        for name, model in self.models.items():
+            if name in result:
+                continue
+            identity = found.get(default_ports.get(name))
+            if identity in available and model_of(identity) == model:
+                result[name] = available.pop(identity)
+                self.identities[name] = identity
+        for name, model in self.models.items():
+            if name in result:
+                continue
+            for identity in sorted(available):
+                if model_of(identity) == model:
+                    result[name] = available.pop(identity)
+                    self.identities[name] = identity
+                    break
+            else:
+                tracer.warning("{}が見つかりません。既定のポート {} を使用します".format(name, default_ports.get(name)))
+                result[name] = default_ports.get(name)
+
+        self.save()
+        tracer.info("機器のポートを探索しました（{:.2f}秒）: {}".format(time.monotonic() - start, result))
+        return result
+
+def initialize_devices(devices):
+    """Keithley機器の接続と初期化を並列に行う
+
+    Args:
+        devices (list): KeithleyBaseのインスタンス
+
+    Returns:
+        dict: 機器 → 初期化に成功したか
+    """
+    def setup(device):
+        try:
+            return device.connect() and device.initialize()
+        except Exception as e:
+            tracer.warning("{}初期化エラー: {}".format(device.name, e))
+            return False
+
+    if not devices:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(devices)) as executor:
+        return dict(zip(devices, executor.map(setup, devices)))
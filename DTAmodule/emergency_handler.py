@@ -1,38 +1,148 @@
 import os
 import datetime
+import math
+import time
 from DTAmodule.chino_control import ChinoController
+from DTAmodule import calibration
+from DTAmodule import results_writer
+from DTAmodule.trace import tracer
 
 # 安全制限値の設定
-MAX_TEMPERATURE = 440.0  # K
+MAX_TEMPERATURE = 400.0  # K（付属の熱電対の校正範囲 約40〜402.7 K の内側にする）
 MAX_PRESSURE = 200.0    # MPa
 ROOM_TEMPERATURE = 298.15  # K (25℃)
+# 熱電対（K2000）の測定値が得られない状態をこの時間（秒）まで許す（再接続を数回試せる長さ）
+MAX_SENSOR_MISSING = 30.0
 
-def emergency_shutdown(pressure_control, error_message):
+def temperature_limit_microvolts(limit=MAX_TEMPERATURE, rig_id="default"):
+    """温度の上限を熱電対電圧（µV）の閾値に変換
+    
+    測定値を温度に変換せずに上限と比較するために使う。
+    上限が熱電対の校正範囲の外にある場合は閾値を決められないため例外にする
+    （範囲の端に置き換えると、上限を黙って変えることになる）。
+    
+    Args:
+        limit (float): 温度の上限（K）
+        rig_id (str): 装置の識別名（熱電対の校正曲線の割り当てに使う）
+        
+    Returns:
+        float: 電圧の閾値（µV）
+        
+    Raises:
+        CalibrationError: 上限が熱電対の校正範囲の外にある場合
+    """
+    curve = calibration.get_curve('thermocouple', rig_id)
+    threshold = float(curve.inverse(limit))
+    if math.isnan(threshold):
+        raise calibration.CalibrationError(
+            "温度の上限 {:.1f} K が熱電対の校正曲線 {} の範囲（{:.1f}〜{:.1f} K）の外にあります".format(
+                limit, curve.key, float(curve.ranges[:, 0].min()), float(curve.ranges[:, 1].max())))
+    return threshold
+
+def resolve_temperature_limit(rig_id="default", limit_microvolts=None, limit=MAX_TEMPERATURE):
+    """測定値と比較する温度の上限（µV）を決める
+    
+    Args:
+        rig_id (str): 装置の識別名
+        limit_microvolts (float, optional): 電圧で直接指定した上限（µV）。
+            Noneの場合はlimitを校正曲線で変換する
+        limit (float): 温度の上限（K）
+        
+    Returns:
+        float: 電圧の閾値（µV）
+        
+    Raises:
+        CalibrationError: limitが熱電対の校正範囲の外にある場合
+    """
+    if limit_microvolts is not None:
+        return float(limit_microvolts)
+    return temperature_limit_microvolts(limit, rig_id)
+
+class TemperatureInterlock:
+    """温度の上限の監視
+    
+    熱電対の電圧を閾値と比較する。熱電対の測定値が得られない間（NaN）は
+    制御器のPVを温度の上限と比較し、測定値が得られない状態がmax_missing秒を超えた場合は
+    監視できないものとして停止の理由を返す。
+    """
+    def __init__(self, limit_microvolts, limit=MAX_TEMPERATURE, max_missing=MAX_SENSOR_MISSING):
+        """
+        Args:
+            limit_microvolts (float): 熱電対電圧の閾値（µV）
+            limit (float): 温度の上限（K, 制御器のPVと比較する）
+            max_missing (float): 熱電対の測定値が得られない状態を許す時間（秒）
+        """
+        self.limit_microvolts = limit_microvolts
+        self.limit = limit
+        self.max_missing = max_missing
+        self.missing_since = None
+    
+    def check(self, microvolts, fallback_temperature=None, now=None):
+        """測定値を確認
+        
+        Args:
+            microvolts (float): 熱電対電圧（µV, 欠測はNaN）
+            fallback_temperature (float, optional): 制御器のPV（K, 取得できない場合はNone）
+            now (float, optional): 現在時刻（time.time()）
+            
+        Returns:
+            str: 緊急停止の理由
+            None: 上限以下の場合
+        """
+        if not math.isnan(microvolts):
+            self.missing_since = None
+            if microvolts > self.limit_microvolts:
+                return "温度が制限値 ({:.1f}µV) を超えました: {:.1f}µV".format(
+                    self.limit_microvolts, microvolts)
+            return None
+        
+        if now is None:
+            now = time.time()
+        if self.missing_since is None:
+            self.missing_since = now
+        if fallback_temperature is not None and fallback_temperature > self.limit:
+            return "熱電対の測定値がなく、制御器のPVが制限値 ({:.1f}K) を超えました: {:.1f}K".format(
+                self.limit, fallback_temperature)
+        if now - self.missing_since > self.max_missing:
+            return "熱電対の測定値が{:.0f}秒間得られないため、温度を監視できません".format(
+                now - self.missing_since)
+        return None
+
+def emergency_shutdown(pressure_control, error_message, chino=None):
     """緊急停止処理
     
     Args:
         pressure_control: 圧力制御オブジェクト
         error_message (str): エラーメッセージ
+        chino (ChinoController, optional): 使用中のChino制御オブジェクト。
+            省略時は既定のポートで作成する
     """
-    print("\n!!! 緊急停止 !!!")
-    print("理由: {}".format(error_message))
+    tracer.error("\n!!! 緊急停止 !!!")
+    tracer.error("理由: {}".format(error_message))
     
     # 温度を室温に設定
     try:
-        chino = ChinoController()
+        if chino is None:
+            chino = ChinoController()
         chino.connect()
-        chino.set_temperature(ROOM_TEMPERATURE)
-        print("温度を室温 ({:.1f}K) に設定しました".format(ROOM_TEMPERATURE))
+        # プログラム運転を開始していた場合のみ停止してから設定値を変更
+        if chino.program_running:
+            try:
+                chino.stop_program()
+            except Exception as e:
+                tracer.error("プログラム運転の停止エラー: {}".format(e))
+        chino.set_temperature(ROOM_TEMPERATURE, force=True)
+        tracer.info("温度を室温 ({:.1f}K) に設定しました".format(ROOM_TEMPERATURE))
     except Exception as e:
-        print("温度設定エラー: {}".format(e))
+        tracer.error("温度設定エラー: {}".format(e))
     
     # 圧力制御の停止
     if pressure_control is not None:
         try:
             pressure_control.close()
-            print("圧力制御を停止しました")
+            tracer.info("圧力制御を停止しました")
         except Exception as e:
-            print("圧力制御停止エラー: {}".format(e))
+            tracer.error("圧力制御停止エラー: {}".format(e))
     
     # エラーログの記録
     try:
@@ -40,7 +150,10 @@ def emergency_shutdown(pressure_control, error_message):
             timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             f.write("[{}] {}\n".format(timestamp, error_message))
     except Exception as e:
-        print("ログ記録エラー: {}".format(e))
+        tracer.error("ログ記録エラー: {}".format(e))
     
-    print("\nシステムを終了します")
+    tracer.info("\nシステムを終了します")
+    # os._exitでは終了時の処理が実行されないため、結果とトレースを書き出しておく
+    results_writer.close_all()
+    tracer.close()
     os._exit(1)  # 強制終了 
\ No newline at end of file
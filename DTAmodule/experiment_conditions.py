@@ -99,6 +99,46 @@ class ExperimentConditions:
         filenameExpCond = self.experiment_manager.create_experiment_condition_file(exp_data)
         return filenameExpCond, exp_data["sample_name"]
     
+    def parse_experiment_conditions(self, filenameExpCond):
+        """実験条件ファイルから各測定の設定値を計算
+        
+        ファイルの1行が1つの測定（Run）。戻り値のリストの添字は行番号と同じで、
+        0番目（列名の行）は使わない。昇降温の向きは開始温度と終了温度から決める。
+        
+        Args:
+            filenameExpCond (str): 実験条件ファイル名
+            
+        Returns:
+            tuple: (Tsv, Tf, rate, wait, dt, pressure, pressure_tolerance, timeExp)
+                開始温度（K）、終了温度（K）、昇降温速度（K/min）、終了後の待機時間（秒）、
+                設定値の変化率（K/s）、目標圧力（MPa）、圧力許容範囲（%）の各リストと
+                全体の所要時間（分）
+                
+        Raises:
+            ValueError: 昇降温速度が0の場合
+        """
+        Tsv, Tf, rate, wait, dt = [None], [None], [None], [None], [None]
+        pressure, pressure_tolerance = [None], [None]
+        timeExp = 0.0
+        with open(filenameExpCond, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                start = float(row['Start Temperature'])
+                end = float(row['End Temperature'])
+                r = abs(float(row['Heating Rate']))
+                if r == 0:
+                    raise ValueError("昇降温速度が0です: {}".format(filenameExpCond))
+                if end < start:
+                    r = -r
+                Tsv.append(start)
+                Tf.append(end)
+                rate.append(r)
+                wait.append(float(row['Wait Time']) * 60.0)
+                dt.append(r / 60.0)
+                pressure.append(float(row['Pressure']))
+                pressure_tolerance.append(float(row['Pressure Tolerance']))
+                timeExp += abs(end - start) / abs(r) + float(row['Wait Time'])
+        return Tsv, Tf, rate, wait, dt, pressure, pressure_tolerance, timeExp
+    
     def continue_experiment(self):
         """既存の実験の続行
         
@@ -116,7 +156,8 @@ class ExperimentConditions:
         
         try:
             exp_num = int(Q3)
-            filenameExpCond = "ExpCond_{}.csv".format(exp_num)
+            filenameExpCond = os.path.join(self.experiment_manager.experiment_dir, str(exp_num),
+                                           "ExpCond_{}.csv".format(exp_num))
             filenameResults = "Results_{}.csv".format(exp_num)
             filenameError = "Error_{}.csv".format(exp_num)
             return filenameExpCond, filenameResults, filenameError
@@ -125,7 +125,7 @@ class ExperimentManager:
             'id': experiment_id,
             'sample_name': experiment_data['sample_name'],
             'experimenter': experiment_data['experimenter'],
-            'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             'start_temperature': experiment_data['start_temperature'],
             'end_temperature': experiment_data['end_temperature'],
             'heating_rate': experiment_data['heating_rate'],
@@ -206,7 +206,7 @@ class ExperimentMetadata:
             'sample_name': data.get('sample_name', ''),
             'lot': data.get('lot', ''),
             'experimenter': data.get('experimenter', ''),
-            'date': datetime.datetime.now().strftime("%Y/%m/%d"),
+            'date': datetime.now().strftime("%Y/%m/%d"),
             'data_file': f"{experiment_id}_Results.csv",
             'conditions': data.get('conditions', {})
         }
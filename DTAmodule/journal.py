@@ -0,0 +1,222 @@
+import json
+import os
+import struct
+import zlib
+from DTAmodule.trace import tracer
+
+# レコードの先頭（データの長さ, CRC32）
+HEADER = struct.Struct('<II')
+
+class Journal:
+    """測定の追記専用ジャーナル
+
+    1レコードは「長さ・CRC32・JSON」の形式で、途中で書き込みが止まった
+    末尾のレコードは読み込み時に検出して切り捨てる。
+    checkpoint()はジャーナルをディスクに書き込んだ後、そのレコードの位置を
+    別ファイル（path + '.ckpt'）に保存する。再開時は最後のチェックポイントから
+    読むため、測定が長くなっても再開にかかる時間は変わらない。
+    """
+    def __init__(self, path, truncate=False):
+        """
+        Args:
+            path (str): ジャーナルのファイル
+            truncate (bool): Trueの場合は既存のジャーナルを消して新しく始める
+        """
+        self.path = path
+        self.index_path = path + ".ckpt"
+        if truncate and os.path.exists(self.index_path):
+            os.remove(self.index_path)
+        self.file = open(path, 'wb' if truncate else 'ab')
+
+    def append(self, record):
+        """レコードを追記（ファイルへの書き込みはflush()まで待たない）
+
+        Returns:
+            int: レコードの位置（バイト）
+        """
+        data = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        offset = self.file.tell()
+        self.file.write(HEADER.pack(len(data), zlib.crc32(data)) + data)
+        return offset
+
+    def flush(self):
+        self.file.flush()
+
+    def checkpoint(self, state, **fields):
+        """ループの状態を記録し、ディスクへの書き込みを待つ
+
+        Args:
+            state (dict): 再開に必要なループの状態
+            **fields: 記録に加える値（結果ファイルの大きさなど）
+        """
+        record = {'type': 'checkpoint', 'state': state}
+        record.update(fields)
+        offset = self.append(record)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        tmp = self.index_path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'offset': offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.index_path)
+
+    def close(self):
+        if not self.file.closed:
+            self.file.flush()
+            self.file.close()
+
+def read_records(f, offset=0):
+    """offsetからレコードを読む（壊れたレコードか末尾で止まる）
+
+    Args:
+        f: バイナリモードで開いたファイル
+        offset (int): 読み始める位置
+
+    Returns:
+        tuple: ([(位置, レコード), ...], 最後の正しいレコードの終わりの位置)
+    """
+    records = []
+    f.seek(offset)
+    while True:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            break
+        length, crc = HEADER.unpack(header)
+        data = f.read(length)
+        if len(data) < length or zlib.crc32(data) != crc:
+            break
+        try:
+            record = json.loads(data.decode('utf-8'))
+        except ValueError:
+            break
+        records.append((offset, record))
+        offset += HEADER.size + length
+    return records, offset
+
+def last_checkpoint_offset(path):
+    """チェックポイントの位置を保存したファイルから最後の位置を読む（ない場合はNone）"""
+    try:
+        with open(path + ".ckpt") as f:
+            return int(json.load(f)['offset'])
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        tracer.warning("チェックポイントの位置の読み込みエラー: {}".format(e))
+        return None
+
+def recover(path, repair=True):
+    """ジャーナルの末尾の壊れたレコードを切り捨て、最後のチェックポイント以降を読む
+
+    チェックポイントの位置が読めない場合や、その位置のレコードが壊れている場合は
+    先頭から読み直す。
+
+    Args:
+        path (str): ジャーナルのファイル
+        repair (bool): Falseの場合は壊れたレコードを切り捨てず、ファイルを変更しない
+
+    Returns:
+        tuple: (最後のチェックポイント（ない場合はNone）, それ以降のレコードのリスト)
+    """
+    with open(path, 'r+b' if repair else 'rb') as f:
+        offset = last_checkpoint_offset(path)
+        records = []
+        if offset is not None:
+            records, end = read_records(f, offset)
+            if not records or records[0][1].get('type') != 'checkpoint':
+                tracer.warning("チェックポイントが見つかりません。ジャーナルを先頭から読みます")
+                records = []
+        if not records:
+            records, end = read_records(f, 0)
+        f.seek(0, os.SEEK_END)
+        if repair and f.tell() > end:
+            tracer.warning("ジャーナルの末尾の壊れたレコード（{}バイト）を切り捨てます".format(f.tell() - end))
+            f.truncate(end)
+
+    checkpoint = None
+    following = []
+    for _, record in records:
+        if record.get('type') == 'checkpoint':
+            checkpoint = record
+            following = []
+        else:
+            following.append(record)
+    return checkpoint, following
+
+def _last_state(checkpoint, rows):
+    """チェックポイントとそれ以降の行から最後に記録したループの状態を求める"""
+    state = checkpoint['state']
+    for record in rows:
+        if record.get('state') is not None:
+            state = record['state']
+    return state
+
+def resume_state(journal_path):
+    """ジャーナルから再開するループの状態を読む（ファイルは変更しない）
+
+    再開するかを確認する前に使い、再開する場合はrecover_results()で修復する。
+
+    Args:
+        journal_path (str): ジャーナルのファイル
+
+    Returns:
+        dict: 最後に記録したループの状態（recover_results()が返すものと同じ）
+        None: 再開できるチェックポイントがない場合
+    """
+    checkpoint, rows = recover(journal_path, repair=False)
+    if checkpoint is None:
+        return None
+    return _last_state(checkpoint, rows)
+
+def recover_results(journal_path, results_path, row_format, columns=None, index=None):
+    """ジャーナルから結果ファイルを修復し、再開するループの状態を返す
+
+    結果ファイルを最後のチェックポイントの時点の大きさに戻し（途中まで書かれた行を含め
+    それ以降を捨てる）、ジャーナルにあるそれ以降の行を書き直す。
+    columnsを指定した場合は列形式のデータも同じように修復し、
+    indexを指定した場合は書き直した行の位置を索引に記録し直す。
+
+    Args:
+        journal_path (str): ジャーナルのファイル
+        results_path (str): 結果ファイル
+        row_format (str): 1行の書式（ResultsWriterと同じもの）
+        columns (ColumnWriter, optional): 結果ファイルと同じ行を記録した列形式のデータ
+        index (ResultsIndexWriter, optional): 結果ファイルの索引
+
+    Returns:
+        dict: 最後に記録したループの状態
+        None: 再開できるチェックポイントがない場合
+    """
+    checkpoint, rows = recover(journal_path)
+    if checkpoint is None:
+        return None
+    if columns is not None and 'column_rows' in checkpoint:
+        if columns.rows < checkpoint['column_rows']:
+            tracer.warning("列形式のデータがチェックポイントより短くなっています（{} < {}行）".format(
+                columns.rows, checkpoint['column_rows']))
+        else:
+            columns.truncate(checkpoint['column_rows'])
+    row = columns.rows if columns is not None else None
+    with open(results_path, 'r+b') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size < checkpoint['results_size']:
+            tracer.warning("結果ファイルがチェックポイントより短くなっています（{} < {}バイト）".format(
+                size, checkpoint['results_size']))
+        else:
+            f.truncate(checkpoint['results_size'])
+        f.seek(0, os.SEEK_END)
+        if index is not None:
+            index.truncate(f.tell())
+        for record in rows:
+            if index is not None:
+                index.add(f.tell(), row, record['values'])
+                if row is not None:
+                    row += 1
+            f.write(row_format.format(*record['values']).encode('utf-8'))
+    if columns is not None and 'column_rows' in checkpoint:
+        columns.append([record['values'] for record in rows])
+    if index is not None:
+        index.flush()
+    tracer.info("ジャーナルから{}行を復元しました".format(len(rows)))
+    return _last_state(checkpoint, rows)
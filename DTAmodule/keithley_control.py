@@ -1,306 +1,455 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import math
+import re
 import serial
 import time
+import numpy as np
+from DTAmodule.scpi_transport import ScpiTransport, ScpiTimeoutError, is_query
+from DTAmodule.port_registry import registry
+from DTAmodule import calibration
+from DTAmodule.trace import tracer
 
-class Keithley2000Pressure:
-    """圧力測定用K2000制御クラス"""
-    def __init__(self, port='/dev/ttyUSB0'):
+# バースト測定結果の型（時刻（秒）, 電圧値（V））
+BURST_DTYPE = np.dtype([('time', 'f8'), ('voltage', 'f8')])
+
+_NUMBER_PATTERN = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+def parse_ascii_readings(raw):
+    """ASCII形式の測定値列を数値配列に変換
+
+    単位などの接尾辞（VDC, SECSなど）は無視する。
+
+    Args:
+        raw (str): カンマ区切りの応答文字列
+
+    Returns:
+        numpy.ndarray: 数値の配列
+    """
+    try:
+        return np.array(raw.split(','), dtype=np.float64)
+    except ValueError:
+        # 単位付きの応答
+        return np.array([float(field) for field in _NUMBER_PATTERN.findall(raw)], dtype=np.float64)
+
+# 省略できるノード（'VOLT'は'VOLT:DC'と同じ機能。2182Aは'VOLT'、2000は'VOLT:DC'と応答する）
+_DEFAULT_NODES = ('DC',)
+
+def short_mnemonic(word):
+    """SCPIのキーワードを短縮形に変換（4文字を超える場合は先頭4文字、4文字目が母音の場合は3文字）"""
+    if len(word) <= 4 or not word.isalpha():
+        return word
+    return word[:3] if word[3] in 'AEIOU' else word[:4]
+
+def normalize_setting(value):
+    """設定値を比較できる形に変換
+
+    ON/OFFは1/0、数値はfloatにする。文字列は引用符を除いた大文字にし、
+    キーワードを短縮形にして末尾の省略できるノードを除く（'VOLTAGE:DC'と"VOLT"は同じ）。
+    """
+    text = value.strip().strip('\'"').upper()
+    if text in ('ON', 'OFF'):
+        return 1.0 if text == 'ON' else 0.0
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    nodes = [short_mnemonic(node) for node in text.split(':')]
+    while len(nodes) > 1 and nodes[-1] in _DEFAULT_NODES:
+        nodes.pop()
+    return ':'.join(nodes)
+
+def query_settings(query, settings):
+    """現在の設定を1回の複合クエリで取得し、目標と異なる設定を求める
+
+    Args:
+        query (callable): クエリを送信して応答文字列（失敗時はNone）を返す関数
+        settings (list): (ヘッダー, 値)のリスト。"ヘッダー 値"で設定、"ヘッダー?"で問い合わせる
+
+    Returns:
+        list: 目標と異なる(ヘッダー, 値)のリスト
+        None: 現在の設定を取得できなかった場合
+    """
+    response = query(";:".join("{}?".format(header) for header, _ in settings))
+    if response is None:
+        return None
+    values = response.split(';')
+    if len(values) != len(settings):
+        return None
+    return [(header, value) for (header, value), actual in zip(settings, values)
+            if normalize_setting(actual) != normalize_setting(value)]
+
+def apply_settings(send_command, settings, reset=False, reset_wait=0.1):
+    """必要な設定だけを送信する
+
+    現在の設定を問い合わせ、異なるものだけを送信する。
+    問い合わせに失敗した場合やreset=Trueの場合は*RSTしてから全て送信する。
+
+    Args:
+        send_command (callable): コマンドを送信する関数（クエリの場合は応答を返す）
+        settings (list): (ヘッダー, 値)のリスト（送信順）
+        reset (bool): Trueの場合は必ず*RSTする
+        reset_wait (float): *RST後の待機時間（秒）
+
+    Returns:
+        list: 送信した(ヘッダー, 値)のリスト
+    """
+    changes = None if reset else query_settings(send_command, settings)
+    if changes is None:
+        send_command("*RST")
+        time.sleep(reset_wait)
+        changes = list(settings)
+    for header, value in changes:
+        send_command("{} {}".format(header, value))
+    return changes
+
+class KeithleyBase:
+    """Keithley機器共通のシリアル通信クラス"""
+    name = "Keithley"
+    max_buffer_points = 1024  # 内部バッファの最大点数
+    binary_formats = {'SREAL': 'f4', 'DREAL': 'f8'}  # FORM:DATAの値 → NumPyの型
+    reset_wait = 0.1  # *RST後の待機時間（秒）
+    # 測定の設定（送信順）。バースト測定の設定も連続測定の状態に戻す
+    settings = [
+        ("FUNC", "'VOLT:DC'"),
+        ("VOLT:DC:NPLC", "1"),
+        ("VOLT:DC:RANG:AUTO", "ON"),
+        ("FORM:DATA", "ASC"),
+        ("FORM:ELEM", "READ"),
+        ("SAMP:COUN", "1"),
+        ("INIT:CONT", "ON")
+    ]
+
+    def __init__(self, port):
         self.port = port
         self.ser = None
+        self.shared_port = None
+        self.lock = None
+        self.transport = None
         self.connected = False
+        self.burst_count = None
+        self.data_format = 'ASCII'
+        self.binary_dtype = None
 
     def connect(self):
-        """シリアルポートに接続"""
+        """シリアルポートに接続
+
+        ポートはレジストリで共有し、既に開いている場合はそれを使う。
+        """
+        if self.connected:
+            return True
         try:
-            self.ser = serial.Serial(
-                port=self.port,
+            self.shared_port = registry.acquire(
+                self.port, self.name,
+                timeout=ScpiTransport.poll_interval,
+                write_timeout=2,
                 baudrate=9600,
                 bytesize=serial.EIGHTBITS,
                 parity=serial.PARITY_NONE,
                 stopbits=serial.STOPBITS_ONE,
-                timeout=2,
-                write_timeout=2,
                 xonxoff=False,
                 rtscts=False,
                 dsrdtr=False
             )
+            self.ser = self.shared_port.ser
+            self.lock = self.shared_port.lock
+            self.transport = ScpiTransport(self.ser, timeout=2.0)
             self.connected = True
             return True
         except Exception as e:
-            print("接続エラー: {}".format(e))
+            tracer.warning("接続エラー: {}".format(e))
             self.connected = False
             return False
 
     def disconnect(self):
-        """シリアルポートを切断"""
-        if self.ser and self.ser.is_open:
-            self.ser.close()
+        """シリアルポートの使用を終了（ポートは再接続に備えて開いたままにする）"""
+        if self.shared_port is not None:
+            registry.release(self.shared_port, self.name)
+            self.shared_port = None
         self.connected = False
 
+    def reconnect(self):
+        """ポートを開き直して再初期化
+
+        initialize()は設定の差分のみ送信するため、測定状態は失われない。
+
+        Returns:
+            bool: 成功した場合True
+        """
+        try:
+            if self.shared_port is None:
+                if not self.connect():
+                    return False
+            else:
+                self.shared_port.reopen()
+                self.connected = True
+            return self.initialize()
+        except Exception as e:
+            tracer.warning("{}再接続エラー: {}".format(self.name, e))
+            return False
+
     def send_command(self, command):
-        """コマンドを送信して応答を取得"""
+        """コマンドを送信して応答を取得
+
+        クエリ（'?'で終わるコマンド）の場合は終端文字まで応答を待つ。
+        それ以外のコマンドは送信のみ行い、Noneを返す。
+        """
         if not self.connected:
             raise Exception("デバイスに接続されていません")
-        
+
         try:
-            # コマンドを送信
-            print("Keithley 2000コマンド送信: {}".format(command))
-            self.ser.write((command + '\n').encode())
-            time.sleep(0.2)  # 応答待ち時間を延長
-            
-            # 応答を読み取り
-            if self.ser.in_waiting > 0:
-                response = self.ser.readline().decode().strip()
-                print("Keithley 2000生の応答: '{}'".format(response))
-                if not response:
-                    print("Keithley 2000空の応答を受信")
+            tracer.debug("コマンド送信", device=self.name, port=self.port, command=command)
+            with self.lock:
+                if not is_query(command):
+                    self.transport.write(command)
                     return None
-                return response
-            else:
-                print("Keithley 2000応答なし（タイムアウト）")
+                response = self.transport.query(command)
+            tracer.debug("応答受信", device=self.name, command=command, response=response,
+                         round_trip=self.transport.last_round_trip)
+            if not response:
+                tracer.warning("{}空の応答を受信".format(self.name))
                 return None
+            return response
+        except ScpiTimeoutError:
+            tracer.warning("{}応答なし（タイムアウト）".format(self.name))
+            return None
         except Exception as e:
-            print("Keithley 2000コマンド送信エラー: {}".format(e))
+            tracer.warning("{}コマンド送信エラー: {}".format(self.name, e))
             return None
 
-    def initialize(self):
-        """圧力測定用の初期化"""
+    def initialize(self, reset=False):
+        """測定の初期化
+
+        現在の設定を問い合わせ、settingsと異なるものだけを送信する。
+        再接続時に*RSTで測定状態を失わないようにするため、
+        *RSTは問い合わせに失敗した場合かreset=Trueの場合のみ行う。
+
+        Args:
+            reset (bool): Trueの場合は必ず*RSTしてから全て設定する
+
+        Returns:
+            bool: 成功した場合True
+        """
         try:
-            # リセット
-            self.send_command("*RST")
-            time.sleep(0.1)
-            
-            # DC電圧測定モードに設定
-            self.send_command("FUNC 'VOLT:DC'")
-            time.sleep(0.1)
-            
-            # ノイズ低減設定
-            self.send_command("VOLT:DC:NPLC 1")
-            time.sleep(0.1)
-            
-            # 測定範囲を自動に設定
-            self.send_command("VOLT:DC:RANG:AUTO ON")
-            time.sleep(0.1)
-            
-            # 連続測定を開始
-            self.send_command("INIT:CONT ON")
-            time.sleep(0.1)
-            
+            changes = apply_settings(self.send_command, self.settings, reset, self.reset_wait)
+            tracer.debug("設定を変更", device=self.name, changes=changes)
+            self.burst_count = None
+            self.data_format = 'ASCII'
+            self.binary_dtype = None
             return True
         except Exception as e:
-            print("初期化エラー: {}".format(e))
+            tracer.warning("初期化エラー: {}".format(e))
             return False
 
-    def get_voltage(self):
-        """電圧を測定"""
+    def set_data_format(self, data_format='ASCII', byte_order='little'):
+        """測定値の転送形式を設定
+
+        Args:
+            data_format (str): 'ASCII'、'SREAL'（4バイト浮動小数点）、'DREAL'（8バイト浮動小数点）
+            byte_order (str): バイナリ形式のバイト順（'little'または'big'）
+        """
+        data_format = data_format.upper()
+        if data_format != 'ASCII' and data_format not in self.binary_formats:
+            raise ValueError("未対応の転送形式です: {}".format(data_format))
+        if byte_order not in ('little', 'big'):
+            raise ValueError("バイト順は'little'または'big'で指定してください: {}".format(byte_order))
+
+        self.send_command("FORM:DATA {}".format(data_format))
+        if data_format == 'ASCII':
+            self.binary_dtype = None
+        else:
+            # SWAPは下位バイトから、NORMは上位バイトから送信される
+            self.send_command("FORM:BORD {}".format('SWAP' if byte_order == 'little' else 'NORM'))
+            prefix = '<' if byte_order == 'little' else '>'
+            self.binary_dtype = np.dtype(prefix + self.binary_formats[data_format])
+        self.data_format = data_format
+
+    def read_values(self, command, count, timeout=None):
+        """測定値を返すクエリを送信し、数値配列として取得
+
+        設定された転送形式（ASCII/バイナリ）に応じて応答を解析する。
+
+        Args:
+            command (str): 送信するクエリ（FETCH?, TRAC:DATA?など）
+            count (int): 応答に含まれる値の個数
+            timeout (float, optional): 期限（秒）
+
+        Returns:
+            numpy.ndarray: 測定値の配列（float64）
+            None: 測定に失敗した場合
+        """
+        if not self.connected:
+            raise Exception("デバイスに接続されていません")
         try:
-            # 最新の測定値を取得
-            voltage = float(self.send_command("FETCH?"))
-            return voltage
-        except Exception as e:
-            print("電圧測定エラー: {}".format(e))
+            with self.lock:
+                if self.binary_dtype is None:
+                    return parse_ascii_readings(self.transport.query(command, timeout))
+                payload = self.transport.query_block(command, self.binary_dtype.itemsize, count, timeout)
+            return np.frombuffer(payload, dtype=self.binary_dtype).astype(np.float64)
+        except ScpiTimeoutError:
+            tracer.warning("{}応答なし（タイムアウト）".format(self.name))
+            return None
+        except ValueError as e:
+            tracer.warning("{}応答の解析エラー: {}".format(self.name, e))
             return None
 
-class Keithley2000Temperature:
-    """電圧測定用K2000制御クラス"""
-    def __init__(self, port='/dev/ttyUSB2'):
-        self.port = port
-        self.ser = None
-        self.connected = False
+    def fetch_reading(self):
+        """最新の測定値を1つ取得
 
-    def connect(self):
-        """シリアルポートに接続"""
-        try:
-            self.ser = serial.Serial(
-                port=self.port,
-                baudrate=9600,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=2,
-                write_timeout=2,
-                xonxoff=False,
-                rtscts=False,
-                dsrdtr=False
-            )
-            self.connected = True
-            return True
-        except Exception as e:
-            print("接続エラー: {}".format(e))
-            self.connected = False
-            return False
+        Returns:
+            float: 電圧値（V）
+            None: 測定に失敗した場合
+        """
+        values = self.read_values("FETCH?", 1)
+        if values is None or values.size == 0:
+            return None
+        return float(values[0])
 
-    def disconnect(self):
-        """シリアルポートを切断"""
-        if self.ser and self.ser.is_open:
-            self.ser.close()
-        self.connected = False
+    def configure_burst(self, count):
+        """内部トレースバッファを使ったバースト測定の設定
 
-    def send_command(self, command):
-        """コマンドを送信して応答を取得"""
+        連続測定を停止し、トリガー回数とバッファサイズをcountに設定する。
+        読み取り値とタイムスタンプをバッファに格納する。
+
+        Args:
+            count (int): 1回のバーストで取得する測定点数
+        """
+        if not 1 <= count <= self.max_buffer_points:
+            raise ValueError("測定点数は1から{}の範囲で指定してください: {}".format(
+                self.max_buffer_points, count))
+        for command in ("INIT:CONT OFF",
+                        "ABOR",
+                        "TRIG:SOUR IMM",
+                        "TRIG:COUN 1",
+                        "SAMP:COUN {}".format(count),
+                        "TRAC:CLE",
+                        "TRAC:POIN {}".format(count),
+                        "TRAC:FEED SENS",
+                        "TRAC:FEED:CONT NEXT",
+                        "FORM:ELEM READ,TST"):
+            self.send_command(command)
+        self.burst_count = count
+
+    def read_burst(self, timeout=None):
+        """バースト測定を実行し、全測定値を1回の転送で取得
+
+        configure_burst()で設定した点数を測定し、TRAC:DATA?で一括取得する。
+
+        Args:
+            timeout (float, optional): 測定完了までの期限（秒）。
+                省略時は測定点数から見積もる
+
+        Returns:
+            numpy.ndarray: BURST_DTYPE型の配列。timeは測定開始時刻（time.time()）に
+                機器のタイムスタンプ（先頭点からの経過秒）を加えた値
+            None: 測定に失敗した場合
+        """
         if not self.connected:
             raise Exception("デバイスに接続されていません")
-        
-        try:
-            # コマンドを送信
-            print("Keithley 2000コマンド送信: {}".format(command))
-            self.ser.write((command + '\n').encode())
-            time.sleep(0.2)  # 応答待ち時間を延長
-            
-            # 応答を読み取り
-            if self.ser.in_waiting > 0:
-                response = self.ser.readline().decode().strip()
-                print("Keithley 2000生の応答: '{}'".format(response))
-                if not response:
-                    print("Keithley 2000空の応答を受信")
+        if self.burst_count is None:
+            raise Exception("バースト測定が設定されていません")
+        if timeout is None:
+            timeout = 2.0 + 0.1 * self.burst_count
+
+        # 測定開始から取得までの間に他のドライバーがポートを使わないようにする
+        with self.lock:
+            try:
+                self.send_command("TRAC:CLE")
+                self.send_command("TRAC:FEED:CONT NEXT")
+                t_start = time.time()
+                self.send_command("INIT")
+                # *OPC?は測定完了後に応答する
+                if self.transport.query("*OPC?", timeout=timeout) != "1":
+                    tracer.warning("{}バースト測定が完了しませんでした".format(self.name))
                     return None
-                return response
-            else:
-                print("Keithley 2000応答なし（タイムアウト）")
+            except ScpiTimeoutError:
+                tracer.warning("{}バースト測定応答なし（タイムアウト）".format(self.name))
                 return None
-        except Exception as e:
-            print("Keithley 2000コマンド送信エラー: {}".format(e))
+
+            values = self.read_values("TRAC:DATA?", 2 * self.burst_count, timeout)
+        if values is None:
+            return None
+        if values.size != 2 * self.burst_count:
+            tracer.warning("{}バースト測定値の個数が不正です: {}".format(self.name, values.size))
             return None
+        readings = values[0::2]
+        stamps = values[1::2]
 
-    def initialize(self):
-        """電圧測定用の初期化"""
-        try:
-            # リセット
-            self.send_command("*RST")
-            time.sleep(0.1)
-            
-            # DC電圧測定モードに設定
-            self.send_command("FUNC 'VOLT:DC'")
-            time.sleep(0.1)
-            
-            # ノイズ低減設定
-            self.send_command("VOLT:DC:NPLC 1")
-            time.sleep(0.1)
-            
-            # 測定範囲を自動に設定
-            self.send_command("VOLT:DC:RANG:AUTO ON")
-            time.sleep(0.1)
-            
-            # 連続測定を開始
-            self.send_command("INIT:CONT ON")
-            time.sleep(0.1)
-            
-            return True
-        except Exception as e:
-            print("初期化エラー: {}".format(e))
-            return False
+        data = np.empty(self.burst_count, dtype=BURST_DTYPE)
+        data['time'] = t_start + (stamps - stamps[0])
+        data['voltage'] = readings
+        return data
+
+    def end_burst(self):
+        """バースト測定を終了し、連続測定に戻す"""
+        self.send_command("TRAC:FEED:CONT NEVER")
+        self.send_command("SAMP:COUN 1")
+        self.send_command("FORM:ELEM READ")
+        self.send_command("INIT:CONT ON")
+        self.burst_count = None
+
+class Keithley2000Pressure(KeithleyBase):
+    """圧力測定用K2000制御クラス"""
+    name = "Keithley 2000"
+
+    def __init__(self, port='/dev/ttyUSB0'):
+        super().__init__(port)
 
     def get_voltage(self):
         """電圧を測定"""
         try:
-            print("Keithley 2000電圧測定コマンド送信")
             # 最新の測定値を取得
-            response = self.send_command("FETCH?")
-            if response is None:
-                print("Keithley 2000電圧測定応答なし")
-                return None
-            print("Keithley 2000電圧測定応答: '{}'".format(response))
-            try:
-                voltage = float(response)
-                print("Keithley 2000電圧値変換成功: {}V".format(voltage))
-                return voltage
-            except ValueError as ve:
-                print("Keithley 2000電圧値変換エラー: '{}' を数値に変換できません".format(response))
-                return None
+            return self.fetch_reading()
         except Exception as e:
-            print("Keithley 2000電圧測定エラー: {}".format(e))
+            tracer.warning("電圧測定エラー: {}".format(e))
             return None
 
-class Keithley2182A:
-    """2182A制御クラス"""
-    def __init__(self, port='/dev/ttyUSB1'):
-        self.port = port
-        self.ser = None
-        self.connected = False
-
-    def connect(self):
-        """シリアルポートに接続"""
-        try:
-            self.ser = serial.Serial(
-                port=self.port,
-                baudrate=9600,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=2,
-                write_timeout=2,
-                xonxoff=False,
-                rtscts=False,
-                dsrdtr=False
-            )
-            self.connected = True
-            return True
-        except Exception as e:
-            print("接続エラー: {}".format(e))
-            self.connected = False
-            return False
+class Keithley2000Temperature(KeithleyBase):
+    """電圧測定用K2000制御クラス"""
+    name = "Keithley 2000"
 
-    def disconnect(self):
-        """シリアルポートを切断"""
-        if self.ser and self.ser.is_open:
-            self.ser.close()
-        self.connected = False
+    def __init__(self, port='/dev/ttyUSB2'):
+        super().__init__(port)
 
-    def send_command(self, command):
-        """コマンドを送信して応答を取得"""
-        if not self.connected:
-            raise Exception("デバイスに接続されていません")
-        
+    def get_voltage(self):
+        """電圧を測定"""
         try:
-            # コマンドを送信
-            self.ser.write((command + '\n').encode())
-            time.sleep(0.1)
-            
-            # 応答を読み取り
-            response = self.ser.readline().decode().strip()
-            return response
+            # 最新の測定値を取得
+            voltage = self.fetch_reading()
+            if voltage is None:
+                tracer.warning("Keithley 2000電圧測定応答なし")
+                return None
+            tracer.debug("電圧測定", device=self.name, voltage=voltage)
+            return voltage
         except Exception as e:
-            print("コマンド送信エラー: {}".format(e))
+            tracer.warning("Keithley 2000電圧測定エラー: {}".format(e))
             return None
 
-    def initialize(self):
-        """初期化"""
-        try:
-            # リセット
-            self.send_command("*RST")
-            time.sleep(0.5)  # リセット後の待機時間を延長
-            
-            # DC電圧測定モードに設定
-            self.send_command("SENS:FUNC 'VOLT:DC'")
-            time.sleep(0.2)
-            
-            # ノイズ低減設定
-            self.send_command("SENS:VOLT:DC:NPLC 1")
-            time.sleep(0.1)
-            
-            # 測定範囲を自動に設定
-            self.send_command("SENS:VOLT:DC:RANG:AUTO ON")
-            time.sleep(0.1)
-            
-            # 連続測定を開始
-            self.send_command("INIT:CONT ON")
-            time.sleep(0.1)
-            
-            return True
-        except Exception as e:
-            print("初期化エラー: {}".format(e))
-            return False
+class Keithley2182A(KeithleyBase):
+    """2182A制御クラス"""
+    name = "2182A"
+    reset_wait = 0.5  # リセット後の待機時間を延長
+    settings = [
+        ("SENS:FUNC", "'VOLT:DC'"),
+        ("SENS:VOLT:DC:NPLC", "1"),
+        ("SENS:VOLT:DC:RANG:AUTO", "ON"),
+        ("FORM:DATA", "ASC"),
+        ("FORM:ELEM", "READ"),
+        ("SAMP:COUN", "1"),
+        ("INIT:CONT", "ON")
+    ]
+
+    def __init__(self, port='/dev/ttyUSB3'):
+        super().__init__(port)
 
     def get_voltage(self):
         """電圧を測定"""
         try:
             # 最新の測定値を取得
-            voltage = float(self.send_command("FETCH?"))
-            return voltage
+            return self.fetch_reading()
         except Exception as e:
-            print("電圧測定エラー: {}".format(e))
+            tracer.warning("電圧測定エラー: {}".format(e))
             return None
 
 # グローバルインスタンス
@@ -308,37 +457,11 @@ k2000_pressure = Keithley2000Pressure()
 k2000_temperature = Keithley2000Temperature()
 k2182a = Keithley2182A()
 
-def VtToTemp(Vt):
-    """電圧から温度への変換
-    
-    Args:
-        Vt (float): 電圧値（V）
-        
-    Returns:
-        float: 温度値（K）
-    """
-    if (Vt>=-9500 and Vt<-8025):
-        return 2215.71556 + 0.7279584164*Vt + 8.6987279178e-5*Vt**2 + 3.628145299e-9*Vt**3
-    elif (Vt>=-8025 and Vt<=-6200):
-        return 351.9516207 + 0.05462261832*Vt + 5.836711682e-6*Vt**2 + 3.652376504e-10*Vt**3
-    elif (Vt>=-6200 and Vt<=-3950):
-        return 277.3823785 + 0.02011218159*Vt + 4.949648236e-7*Vt**2 + 8.859387968e-11*Vt**3
-    elif (Vt>=-3950 and Vt<=-1360):
-        return 273.5617264 + 0.01765379968*Vt + 7.137919542e-9*Vt**2 + 6.116704187e-11*Vt**3
-    elif (Vt>=-1360 and Vt<=1640):
-        return 273.1534526 + 0.01705349031*Vt - 2.797508035e-7*Vt**2 + 1.501272037e-11*Vt**3
-    elif (Vt>=1640 and Vt<=4840):
-        return 273.1973681 + 0.01699032605*Vt - 2.448421881e-7*Vt**2 + 7.25590263e-12*Vt**3
-    elif (Vt>=4840 and Vt<=8400):
-        return 273.5651668 + 0.01676422623*Vt - 1.976262268e-7*Vt**2 + 3.906447737e-12*Vt**3
-    else:
-        raise ValueError("電圧値 {}V は変換範囲外です（-9500V から 8400V の範囲で入力してください）".format(Vt))
-
 def getPressure():
     """圧力センサーの電圧を取得し、圧力に変換
     
     Returns:
-        tuple: (電圧値（V）, 圧力値（Pa）)
+        tuple: (電圧値（V）, 圧力値（MPa）)
         None: 測定に失敗した場合
     """
     try:
@@ -351,11 +474,11 @@ def getPressure():
         if voltage is None:
             return None
             
-        # 圧力に変換（V → Pa）
-        pressure = (voltage - 0.00001) * 133400 / 5.12285 + 0.1
+        # 圧力に変換（V → MPa）
+        pressure = calibration.get_curve('pressure')(voltage)
         return (voltage, pressure)
     except Exception as e:
-        print("圧力測定エラー: {}".format(e))
+        tracer.warning("圧力測定エラー: {}".format(e))
         return None
 
 def getTemperature():
@@ -366,36 +489,31 @@ def getTemperature():
         None: 測定に失敗した場合
     """
     try:
-        print("Keithley 2000温度測定開始")
         if not k2000_temperature.connected:
-            print("Keithley 2000に接続を試みます")
+            tracer.info("Keithley 2000に接続を試みます")
             if not k2000_temperature.connect():
-                print("Keithley 2000接続失敗")
+                tracer.warning("Keithley 2000接続失敗")
                 return None
-            print("Keithley 2000接続成功")
             if not k2000_temperature.initialize():
-                print("Keithley 2000初期化失敗")
+                tracer.warning("Keithley 2000初期化失敗")
                 return None
-            print("Keithley 2000初期化成功")
+            tracer.info("Keithley 2000初期化成功")
         
         # 電圧を取得
-        print("Keithley 2000電圧測定開始")
         voltage = k2000_temperature.get_voltage()
         if voltage is None:
-            print("Keithley 2000電圧取得失敗")
+            tracer.warning("Keithley 2000電圧取得失敗")
             return None
-        print("Keithley 2000電圧値: {}V".format(voltage))
             
-        # 温度に変換（V → K）
-        try:
-            temperature = VtToTemp(voltage)
-            print("Keithley 2000温度変換成功: {}K".format(temperature))
-            return (voltage, temperature)
-        except ValueError as ve:
-            print("Keithley 2000温度変換エラー: {}".format(ve))
+        # 温度に変換（V → µV → K）
+        temperature = calibration.get_curve('thermocouple')(voltage * 1000000)
+        if math.isnan(temperature):
+            tracer.warning("Keithley 2000温度変換エラー: 電圧値 {}V は変換範囲外です".format(voltage))
             return None
+        tracer.debug("温度変換", device="Keithley 2000", voltage=voltage, temperature=temperature)
+        return (voltage, temperature)
     except Exception as e:
-        print("Keithley 2000温度測定エラー: {}".format(e))
+        tracer.warning("Keithley 2000温度測定エラー: {}".format(e))
         return None
 
 def getVoltage2182A():
@@ -411,5 +529,5 @@ def getVoltage2182A():
             k2182a.initialize()
         return k2182a.get_voltage()
     except Exception as e:
-        print("2182A測定エラー: {}".format(e))
+        tracer.warning("2182A測定エラー: {}".format(e))
         return None 
\ No newline at end of file
@@ -63,10 +63,41 @@ class MenuDrivenPlotter:
             else:
                 print("無効な選択です")
     
+    def update_data(self, time, chino_temp, k2000_temp, dta_signal, pressure):
+        """測定値を1点追加
+        
+        Args:
+            time (float): 測定開始からの時間（秒）
+            chino_temp (float): Chinoの設定温度（K）
+            k2000_temp (float): 試料温度（K）
+            dta_signal (float): DTA信号（K）
+            pressure (float): 圧力（MPa）
+        """
+        self.current_data['times'].append(time)
+        self.current_data['chino_temps'].append(chino_temp)
+        self.current_data['k2000_temps'].append(k2000_temp)
+        self.current_data['dta_signals'].append(dta_signal)
+        self.current_data['pressures'].append(pressure)
+    
     def update_plot(self):
         """グラフを更新"""
-        # 既存のupdate_plotメソッドの実装
-        pass
+        data = self.current_data
+        self.ax1.clear()
+        self.ax1.plot(data['times'], data['chino_temps'], label='Chino SV')
+        self.ax1.plot(data['times'], data['k2000_temps'], label='K2000')
+        self.ax1.set_ylabel('Temperature (K)')
+        self.ax1.legend()
+        self.ax2.clear()
+        self.ax2.plot(data['k2000_temps'], data['dta_signals'])
+        self.ax2.set_xlabel('Temperature (K)')
+        self.ax2.set_ylabel('DTA (K)')
+        self.fig.canvas.draw_idle()
+    
+    def show(self):
+        """測定したデータのグラフを表示（ウィンドウを閉じるまで待つ）"""
+        self.update_plot()
+        plt.ioff()
+        plt.show()
     
     def reset_plot(self):
         """グラフをリセット"""
@@ -0,0 +1,142 @@
+import atexit
+import os
+import threading
+import serial
+from DTAmodule.trace import tracer
+
+# ポートを共有できるかの判定に使う設定（タイムアウトは各ドライバーが個別に扱う）
+LINE_SETTINGS = ('baudrate', 'bytesize', 'parity', 'stopbits', 'xonxoff', 'rtscts', 'dsrdtr')
+
+class PortConflictError(Exception):
+    """同じポートを異なる通信設定で開こうとした場合の例外"""
+    pass
+
+class SharedPort:
+    """複数のドライバーで共有するシリアルポート
+
+    serは再接続しても同じオブジェクトのまま開き直すため、
+    ドライバーが保持している参照はそのまま使える。
+    1回の送受信はlockを取得して行うこと。
+    """
+    def __init__(self, path, settings, timeout=2.0, write_timeout=2.0):
+        """
+        Args:
+            path (str): ポートの実パス
+            settings (dict): LINE_SETTINGSの値
+            timeout (float): 読み取りタイムアウト（秒）の初期値
+            write_timeout (float): 書き込みタイムアウト（秒）
+        """
+        self.path = path
+        self.settings = settings
+        self.lock = threading.RLock()
+        self.owners = []
+        self.ser = serial.Serial(timeout=timeout, write_timeout=write_timeout,
+                                 exclusive=True, **settings)
+        self.ser.port = path
+        self.ser.open()
+
+    @property
+    def is_open(self):
+        return self.ser.is_open
+
+    def reopen(self):
+        """ポートを開き直す（通信設定はそのまま）"""
+        with self.lock:
+            if self.ser.is_open:
+                self.ser.close()
+            self.ser.open()
+
+    def close(self):
+        """ポートを閉じる"""
+        with self.lock:
+            if self.ser.is_open:
+                self.ser.close()
+
+class PortRegistry:
+    """プロセス内のシリアルポートを物理ポートごとに1つだけ開いて共有する
+
+    同じポートを同じ通信設定で要求した場合は開いているポートを返し、
+    異なる設定で要求した場合はPortConflictErrorを送出する。
+    使用者がいなくなってもポートは開いたままにし、次の要求で再利用する。
+    """
+    def __init__(self):
+        self.ports = {}  # 実パス → SharedPort
+        self.lock = threading.Lock()
+
+    def acquire(self, port, owner, timeout=2.0, write_timeout=2.0, **settings):
+        """ポートを取得
+
+        Args:
+            port (str): ポートのパス（シンボリックリンクは実パスにまとめる）
+            owner (str): 使用者の名前（競合時のメッセージに使う）
+            timeout (float): 読み取りタイムアウト（秒）
+            write_timeout (float): 書き込みタイムアウト（秒）
+            **settings: serial.Serialの通信設定（baudrate, bytesizeなど）
+
+        Returns:
+            SharedPort: 共有ポート
+
+        Raises:
+            PortConflictError: 通信設定が既に開いているポートと異なる場合
+            serial.SerialException: ポートを開けなかった場合
+        """
+        path = os.path.realpath(port)
+        settings = self._normalize(settings)
+        with self.lock:
+            shared = self.ports.get(path)
+            if shared is not None and shared.settings != settings:
+                raise PortConflictError(
+                    "{} は {} が異なる通信設定で使用中です（{} / 要求 {}）".format(
+                        port, ", ".join(shared.owners) or "他の機器", shared.settings, settings))
+            if shared is None:
+                shared = SharedPort(path, settings, timeout, write_timeout)
+                self.ports[path] = shared
+            elif not shared.is_open:
+                shared.reopen()
+            shared.owners.append(owner)
+            return shared
+
+    def release(self, shared, owner, close=False):
+        """ポートの使用を終了
+
+        Args:
+            shared (SharedPort): acquire()で取得したポート
+            owner (str): 使用者の名前
+            close (bool): Trueの場合は使用者がいなくなったときにポートを閉じる
+        """
+        with self.lock:
+            if owner in shared.owners:
+                shared.owners.remove(owner)
+            if close and not shared.owners:
+                shared.close()
+
+    def close_all(self):
+        """全てのポートを閉じる"""
+        with self.lock:
+            for shared in self.ports.values():
+                try:
+                    shared.close()
+                except Exception as e:
+                    tracer.warning("ポート切断エラー ({}): {}".format(shared.path, e))
+            self.ports = {}
+
+    def _normalize(self, settings):
+        """通信設定をpyserialの既定値で補って比較できる形にする"""
+        defaults = {
+            'baudrate': 9600,
+            'bytesize': serial.EIGHTBITS,
+            'parity': serial.PARITY_NONE,
+            'stopbits': serial.STOPBITS_ONE,
+            'xonxoff': False,
+            'rtscts': False,
+            'dsrdtr': False
+        }
+        unknown = set(settings) - set(LINE_SETTINGS)
+        if unknown:
+            raise ValueError("未対応の通信設定です: {}".format(", ".join(sorted(unknown))))
+        defaults.update(settings)
+        return defaults
+
+# プロセス全体で共有するレジストリ
+registry = PortRegistry()
+atexit.register(registry.close_all)
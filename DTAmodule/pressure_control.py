@@ -1,20 +1,36 @@
 import serial
 import time
 import gpiod
+from DTAmodule.scpi_transport import ScpiTransport, ScpiTimeoutError, is_query
+from DTAmodule.pulse_engine import PulseEngine
+from DTAmodule.pressure_model import ComplianceModel
+from DTAmodule.port_registry import registry
+from DTAmodule.keithley_control import apply_settings
+from DTAmodule.trace import tracer
+from DTAmodule import calibration
 
 class PressureControl:
-    def __init__(self, port="/dev/ttyUSB0", baudrate=9600, timeout=2):
-        # KEITHLEY 2000-2の初期化
-        self.ser = serial.Serial(port, baudrate, timeout=timeout)
-        
+    # KEITHLEY 2000-2の測定設定（送信順）
+    keithley_settings = [
+        ("FUNC", "'VOLT:DC'"),
+        ("VOLT:DC:NPLC", "10"),
+        ("VOLT:DC:RANG:AUTO", "OFF"),
+        ("VOLT:DC:RANG", "0.1"),
+        ("INIT:CONT", "ON")
+    ]
+
+    def __init__(self, port="/dev/ttyUSB0", baudrate=9600, timeout=2, rig_id="default"):
         # GPIO設定
         self.CW_PIN = 18
         self.CCW_PIN = 17
         self.pulse_count = 200
+        self.max_move_pulses = 2000  # 1回の移動の最大パルス数
         self.pulse_width = 0.0005
         self.pulse_delay = 0.0005
+        self.ramp_start_period = 0.004  # 加減速開始時のパルス周期（秒）
+        self.ramp_pulses = 20           # 加減速に使うパルス数
         
-        # GPIOチップの初期化
+        # GPIOチップの初期化（ポートを取得する前に行い、見つからない場合はポートを使わない）
         self.chip_path = None
         for i in range(10):
             try:
@@ -29,34 +45,90 @@ class PressureControl:
             raise Exception("使用可能なGPIOチップが見つかりませんでした")
         
         self.chip = gpiod.Chip(self.chip_path, gpiod.Chip.OPEN_BY_NAME)
-        self.cw_line = self.chip.get_line(self.CW_PIN)
-        self.ccw_line = self.chip.get_line(self.CCW_PIN)
-        
-        # GPIOを出力モードに設定
-        self.cw_line.request(consumer="motor_control", type=gpiod.LINE_REQ_DIR_OUT)
-        self.ccw_line.request(consumer="motor_control", type=gpiod.LINE_REQ_DIR_OUT)
-        
-        # 初期状態は0
-        self.cw_line.set_value(0)
-        self.ccw_line.set_value(0)
-        
-        # KEITHLEY 2000-2の初期設定
-        self._setup_keithley()
+        self.cw_line = None
+        self.ccw_line = None
+        self.shared_port = None
+        self.pulse_engine = None
+        self.model = None
+        try:
+            self.cw_line = self.chip.get_line(self.CW_PIN)
+            self.ccw_line = self.chip.get_line(self.CCW_PIN)
+            
+            # GPIOを出力モードに設定
+            self.cw_line.request(consumer="motor_control", type=gpiod.LINE_REQ_DIR_OUT)
+            self.ccw_line.request(consumer="motor_control", type=gpiod.LINE_REQ_DIR_OUT)
+            
+            # 初期状態は0
+            self.cw_line.set_value(0)
+            self.ccw_line.set_value(0)
+            
+            # KEITHLEY 2000-2の初期化（ポートはレジストリで共有する）
+            self.shared_port = registry.acquire(port, "PressureControl", timeout=ScpiTransport.poll_interval,
+                                                baudrate=baudrate, bytesize=serial.EIGHTBITS,
+                                                parity=serial.PARITY_NONE, stopbits=serial.STOPBITS_ONE)
+            self.ser = self.shared_port.ser
+            self.transport = ScpiTransport(self.ser, timeout=timeout)
+            # 測定ループと圧力制御スレッドの両方から使うため排他する
+            self.serial_lock = self.shared_port.lock
+            
+            # パルス送信スレッド
+            self.pulse_engine = PulseEngine(self.pulse_width, self.pulse_delay)
+            
+            # パルス数と圧力変化の学習モデル（装置ごとに保存）
+            self.model = ComplianceModel(rig_id=rig_id)
+            # 圧力センサーの校正曲線（V → MPa）
+            self.pressure_curve = calibration.get_curve('pressure', rig_id)
+            
+            # KEITHLEY 2000-2の初期設定
+            self._setup_keithley()
+        except Exception:
+            # 取得したGPIOとポートを解放する（ポートを使用中のまま残すと以後の取得に失敗する）
+            self.close()
+            raise
     
-    def _setup_keithley(self):
-        """KEITHLEY 2000-2の初期設定"""
-        self.send_command("*RST")
-        self.send_command("FUNC 'VOLT:DC'")
-        self.send_command("VOLT:DC:NPLC 10")
-        self.send_command("VOLT:DC:RANG 0.1")
-        self.send_command("INIT:CONT ON")
-        time.sleep(0.5)
+    def _setup_keithley(self, reset=False):
+        """KEITHLEY 2000-2の初期設定
+
+        設定が既に一致している場合は送信しない（*RSTも行わない）。
+
+        Args:
+            reset (bool): Trueの場合は必ず*RSTしてから全て設定する
+        """
+        changes = apply_settings(self.send_command, self.keithley_settings, reset, reset_wait=0.5)
+        if changes:
+            time.sleep(0.5)
     
+    def reconnect(self):
+        """KEITHLEY 2000-2のポートを開き直して再初期化
+
+        Returns:
+            bool: 成功した場合True
+        """
+        try:
+            self.shared_port.reopen()
+            self._setup_keithley()
+            return self.get_pressure() is not None
+        except Exception as e:
+            tracer.warning("KEITHLEY 2000-2再接続エラー: {}".format(e))
+            return False
+
     def send_command(self, command):
-        """KEITHLEY 2000-2にコマンドを送信"""
-        self.ser.write((command + "\n").encode())
-        time.sleep(0.1)
-        response = self.ser.readline().decode().strip()
+        """KEITHLEY 2000-2にコマンドを送信
+
+        クエリの場合は応答を終端文字まで待ち、応答文字列を返す。
+        応答がない場合やクエリ以外のコマンドでは空文字列を返す。
+        """
+        with self.serial_lock:
+            if not is_query(command):
+                self.transport.write(command)
+                return ""
+            try:
+                response = self.transport.query(command)
+            except ScpiTimeoutError:
+                tracer.debug("応答なし", device="KEITHLEY 2000-2", command=command)
+                return ""
+        tracer.debug("応答受信", device="KEITHLEY 2000-2", command=command, response=response,
+                     round_trip=self.transport.last_round_trip)
         return response
     
     def get_pressure(self):
@@ -64,58 +136,131 @@ class PressureControl:
         response = self.send_command("FETC?")
         try:
             voltage = float(response)
-            pressure = (voltage - 0.00001) * 133400 / 5.12285 + 0.1
-            return pressure
+            return self.pressure_curve(voltage)
         except ValueError:
             return None
     
-    def send_pulses(self, line, pulses):
-        """モーターにパルスを送信"""
-        for i in range(pulses):
-            line.set_value(1)
-            time.sleep(self.pulse_width)
-            line.set_value(0)
-            time.sleep(self.pulse_delay)
+    def send_pulses(self, line, pulses, wait=True):
+        """モーターにパルスを送信
+        
+        Args:
+            line: 出力するGPIOライン
+            pulses (int): パルス数
+            wait (bool): Trueの場合は送信完了まで待つ
+            
+        Returns:
+            PulseMove: 送信状態（sentが実際に送信したパルス数）
+        """
+        move = self.pulse_engine.move(line, pulses,
+                                      start_period=self.ramp_start_period,
+                                      ramp_pulses=self.ramp_pulses)
+        if wait:
+            move.wait()
+        return move
     
-    def increase_pressure(self):
+    def increase_pressure(self, pulses=None, wait=True):
         """圧力を上げる"""
-        self.send_pulses(self.cw_line, self.pulse_count)
+        if pulses is None:
+            pulses = self.pulse_count
+        return self.send_pulses(self.cw_line, pulses, wait)
     
-    def decrease_pressure(self):
+    def decrease_pressure(self, pulses=None, wait=True):
         """圧力を下げる"""
-        self.send_pulses(self.ccw_line, self.pulse_count)
+        if pulses is None:
+            pulses = self.pulse_count
+        return self.send_pulses(self.ccw_line, pulses, wait)
+    
+    def is_moving(self):
+        """モーターがパルス送信中か"""
+        return self.pulse_engine.is_busy()
+    
+    def adjust_pressure_step(self, target_pressure, current_pressure, tolerance=0.1):
+        """目標圧力に向けて1ステップ分のパルス送信を開始（完了を待たない）
+        
+        送信中の場合は何もしない。
+        
+        Returns:
+            PulseMove: 開始した送信。送信しなかった場合はNone
+        """
+        if self.is_moving() or abs(current_pressure - target_pressure) <= tolerance:
+            return None
+        if current_pressure < target_pressure:
+            return self.increase_pressure(wait=False)
+        return self.decrease_pressure(wait=False)
     
-    def set_target_pressure(self, target_pressure, tolerance=0.1, max_attempts=10):
+    def pulses_for_pressure_change(self, delta_p, pressure, temperature=None):
+        """圧力変化に必要なパルス数を学習モデルから求める
+        
+        Args:
+            delta_p (float): 必要な圧力変化（MPa, 正: 加圧）
+            pressure (float): 現在の圧力（MPa）
+            temperature (float, optional): 現在の温度（K）
+            
+        Returns:
+            int: パルス数（正: 加圧, 負: 減圧, 上限max_move_pulses）
+        """
+        pulses = self.model.pulses_for(delta_p, pressure, temperature)
+        return max(-self.max_move_pulses, min(self.max_move_pulses, pulses))
+    
+    def record_move(self, pulses, pressure_before, pressure_after, temperature=None):
+        """パルス送信前後の圧力変化をモデルに記録"""
+        if pressure_before is None or pressure_after is None:
+            return
+        self.model.add_sample(pulses, pressure_after - pressure_before, pressure_before, temperature)
+    
+    def set_target_pressure(self, target_pressure, tolerance=0.1, max_attempts=10, temperature=None):
         """目標圧力に設定
         
+        移動量は学習モデルから求め、各移動の結果をモデルに記録する。
+        
         Args:
             target_pressure (float): 目標圧力 (MPa)
             tolerance (float): 許容誤差 (MPa)
             max_attempts (int): 最大試行回数
+            temperature (float, optional): 現在の温度（K）
         """
+        current_pressure = None
         for _ in range(max_attempts):
-            current_pressure = self.get_pressure()
+            if current_pressure is None:
+                current_pressure = self.get_pressure()
             if current_pressure is None:
                 continue
             
             if abs(current_pressure - target_pressure) <= tolerance:
                 return True
             
-            if current_pressure < target_pressure:
-                self.increase_pressure()
+            pulses = self.pulses_for_pressure_change(
+                target_pressure - current_pressure, current_pressure, temperature)
+            if pulses > 0:
+                move = self.increase_pressure(pulses)
+            elif pulses < 0:
+                move = self.decrease_pressure(-pulses)
             else:
-                self.decrease_pressure()
+                return True
             
             time.sleep(1)  # 圧力が安定するのを待つ
+            new_pressure = self.get_pressure()
+            self.record_move(move.sent if pulses > 0 else -move.sent,
+                             current_pressure, new_pressure, temperature)
+            current_pressure = new_pressure
         
         return False
     
     def close(self):
-        """リソースを解放"""
-        try:
-            self.cw_line.release()
-            self.ccw_line.release()
-        except:
-            pass
+        """リソースを解放（初期化の途中で失敗した場合は取得済みのものだけ）"""
+        if self.pulse_engine is not None:
+            self.pulse_engine.shutdown()
+        if self.model is not None:
+            # 間隔をあけて保存しているため、残りの学習結果を保存する
+            self.model.flush()
+        for line in (self.cw_line, self.ccw_line):
+            if line is None:
+                continue
+            try:
+                line.release()
+            except:
+                pass
         self.chip.close()
-        self.ser.close() 
\ No newline at end of file
+        if self.shared_port is not None:
+            registry.release(self.shared_port, "PressureControl")
+            self.shared_port = None
\ No newline at end of file
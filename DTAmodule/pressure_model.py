@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
+from DTAmodule.trace import tracer
+
+DEFAULT_MODEL_FILE = os.path.expanduser("~/.dta/pressure_model.json")
+
+class ComplianceModel:
+    """パルス数と圧力変化の関係（MPa/パルス）を学習するモデル
+
+    モーターのパルス数と圧力変化の履歴から、圧力と温度に対する
+    1パルスあたりの圧力変化を方向（加圧/減圧）ごとに最小二乗法で求める。
+    学習結果は装置ごとにJSONファイルへ保存する（save_interval秒ごと、flush()で残りを保存）。
+    """
+    def __init__(self, rig_id="default", path=DEFAULT_MODEL_FILE, default_mpa_per_pulse=0.005,
+                 max_samples=200, min_samples=3, save_interval=60.0):
+        """
+        Args:
+            rig_id (str): 装置の識別名
+            path (str): 保存先のJSONファイル（Noneの場合は保存しない）
+            default_mpa_per_pulse (float): 学習前に使う1パルスあたりの圧力変化（MPa）
+            max_samples (int): 方向ごとに保持する履歴の最大数
+            min_samples (int): 圧力依存を推定するのに必要な履歴数
+            save_interval (float): 保存の最小間隔（秒）
+        """
+        self.rig_id = rig_id
+        self.path = path
+        self.default_mpa_per_pulse = default_mpa_per_pulse
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.save_interval = save_interval
+        self.last_save = None  # 最後に保存した時刻（time.monotonic()）
+        self.dirty = False  # 保存していない履歴がある場合True
+        self.lock = threading.Lock()
+        self.samples = {
+            'up': deque(maxlen=max_samples),
+            'down': deque(maxlen=max_samples)
+        }
+        self.coefficients = {'up': None, 'down': None}
+        self.mean_temperature = {'up': None, 'down': None}
+        self.load()
+
+    def load(self):
+        """保存された履歴を読み込んで再計算"""
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f).get(self.rig_id, {})
+        except (OSError, ValueError) as e:
+            tracer.warning("圧力モデルの読み込みエラー: {}".format(e))
+            return
+        with self.lock:
+            for direction in self.samples:
+                self.samples[direction].extend(tuple(s) for s in data.get(direction, []))
+                self._fit(direction)
+
+    def save(self):
+        """履歴をファイルに保存（他の装置のデータは保持する）
+
+        一時ファイルに書いてから置き換えるため、書き込み中に止まっても以前の内容が残る。
+        """
+        if self.path is None:
+            return
+        try:
+            data = {}
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+            with self.lock:
+                data[self.rig_id] = {d: [list(s) for s in self.samples[d]] for d in self.samples}
+                self.dirty = False
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, 'w') as f:
+                json.dump(data, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except (OSError, ValueError) as e:
+            self.dirty = True
+            tracer.warning("圧力モデルの保存エラー: {}".format(e))
+        self.last_save = time.monotonic()
+
+    def flush(self):
+        """保存していない履歴があれば保存"""
+        if self.dirty:
+            self.save()
+
+    def add_sample(self, pulses, delta_p, pressure, temperature=None):
+        """パルス送信1回分の結果を追加
+
+        Args:
+            pulses (int): 送信したパルス数（正: 加圧, 負: 減圧）
+            delta_p (float): 送信前後の圧力変化（MPa）
+            pressure (float): 送信前の圧力（MPa）
+            temperature (float, optional): 送信時の温度（K）
+        """
+        if pulses == 0:
+            return
+        direction = 'up' if pulses > 0 else 'down'
+        # 向きに沿った1パルスあたりの変化量（正常なら正）
+        response = delta_p / pulses
+        if response <= 0:
+            return
+        with self.lock:
+            self.samples[direction].append(
+                (pressure, np.nan if temperature is None else temperature, abs(pulses), response))
+            self._fit(direction)
+            self.dirty = True
+        if self.last_save is None or time.monotonic() - self.last_save >= self.save_interval:
+            self.save()
+
+    def _fit(self, direction):
+        """応答 = c0 + c1·P (+ c2·T) をパルス数で重み付けして当てはめる"""
+        samples = self.samples[direction]
+        if not samples:
+            self.coefficients[direction] = None
+            return
+        data = np.array(samples, dtype=np.float64)
+        pressure, temperature, weight, response = data.T
+        use_temperature = not np.isnan(temperature).any() and len(data) >= self.min_samples + 2
+        if len(data) < self.min_samples or np.ptp(pressure) == 0:
+            self.coefficients[direction] = (float(np.average(response, weights=weight)), 0.0, 0.0)
+            return
+        columns = [np.ones_like(pressure), pressure]
+        if use_temperature and np.ptp(temperature) > 0:
+            columns.append(temperature)
+            self.mean_temperature[direction] = float(np.mean(temperature))
+        A = np.column_stack(columns) * np.sqrt(weight)[:, None]
+        coef = np.linalg.lstsq(A, response * np.sqrt(weight), rcond=None)[0]
+        self.coefficients[direction] = tuple(float(c) for c in coef) + (0.0,) * (3 - len(coef))
+
+    def mpa_per_pulse(self, pressure, direction, temperature=None):
+        """1パルスあたりの圧力変化（MPa）を推定
+
+        Args:
+            pressure (float): 現在の圧力（MPa）
+            direction (str): 'up'（加圧）または'down'（減圧）
+            temperature (float, optional): 現在の温度（K）
+        """
+        with self.lock:
+            coef = self.coefficients[direction]
+        if coef is None:
+            return self.default_mpa_per_pulse
+        c0, c1, c2 = coef
+        if c2 != 0.0 and temperature is None:
+            # 温度が不明な場合は学習時の平均温度を使う
+            temperature = self.mean_temperature[direction]
+        value = c0 + c1 * pressure + (c2 * temperature if c2 != 0.0 else 0.0)
+        # 外挿で極端な値にならないよう既定値の0.1〜10倍に制限
+        return min(max(value, 0.1 * self.default_mpa_per_pulse), 10 * self.default_mpa_per_pulse)
+
+    def pulses_for(self, delta_p, pressure, temperature=None):
+        """指定した圧力変化に必要なパルス数を推定
+
+        Args:
+            delta_p (float): 必要な圧力変化（MPa, 正: 加圧）
+            pressure (float): 現在の圧力（MPa）
+            temperature (float, optional): 現在の温度（K）
+
+        Returns:
+            int: パルス数（正: 加圧, 負: 減圧）
+        """
+        if delta_p == 0:
+            return 0
+        direction = 'up' if delta_p > 0 else 'down'
+        return int(round(delta_p / self.mpa_per_pulse(pressure, direction, temperature)))
@@ -0,0 +1,203 @@
+import threading
+import time
+from DTAmodule.trace import tracer
+
+class PressureRegulator:
+    """圧力の閉ループ制御スレッド
+
+    目標圧力との偏差からPID制御でパルス数を決め、PressureControlの
+    パルス送信スレッドに渡す。測定ループとは別スレッドで動くため、
+    圧力の補正中も温度の測定は止まらない。
+    """
+    def __init__(self, pressure_control, kp=200.0, ki=20.0, kd=0.0,
+                 deadband=0.1, interval=1.0, settle_time=1.0, max_pulses=1000, use_feedforward=True):
+        """
+        Args:
+            pressure_control (PressureControl): 圧力制御オブジェクト
+            kp (float): 比例ゲイン（パルス/MPa）
+            ki (float): 積分ゲイン（パルス/(MPa·s)）
+            kd (float): 微分ゲイン（パルス·s/MPa）
+            deadband (float): 不感帯（MPa）。偏差がこれ以下なら動かさない
+            interval (float): 制御周期（秒）
+            settle_time (float): パルス送信後、次の測定までの待ち時間（秒）
+            max_pulses (int): 1回に送るパルス数の上限
+            use_feedforward (bool): Trueの場合、比例項の代わりに学習モデルで
+                求めたパルス数（フィードフォワード）を使う
+        """
+        self.pressure_control = pressure_control
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.deadband = deadband
+        self.interval = interval
+        self.settle_time = settle_time
+        self.max_pulses = max_pulses
+        self.use_feedforward = use_feedforward
+
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.wakeup = threading.Event()
+
+        self.setpoint = None
+        self.integral = 0.0
+        self.last_error = None
+        self.last_time = None
+        self.last_move_end = None
+        self.last_move = None  # (送信パルス数, 送信前の圧力) モデル学習用
+        self.temperature = None
+        self.state = {
+            'setpoint': None,
+            'pressure': None,
+            'error': None,
+            'output': 0.0,
+            'pulses_issued': 0,
+            'pulses_sent': 0,
+            'in_band': False,
+            'updated_at': None
+        }
+
+    def set_target(self, setpoint, deadband=None):
+        """目標圧力を設定
+
+        Args:
+            setpoint (float): 目標圧力（MPa）
+            deadband (float, optional): 不感帯（MPa）
+        """
+        with self.lock:
+            if setpoint != self.setpoint:
+                # 目標が変わったら積分と微分の履歴をリセット
+                self.integral = 0.0
+                self.last_error = None
+            self.setpoint = setpoint
+            if deadband is not None:
+                self.deadband = deadband
+            self.state['setpoint'] = setpoint
+            if self.state['pressure'] is not None:
+                self.state['error'] = setpoint - self.state['pressure']
+                self.state['in_band'] = abs(self.state['error']) <= self.deadband
+        self.wakeup.set()
+
+    def update_temperature(self, temperature):
+        """現在の温度（K）を設定（学習モデルの温度依存に使う）"""
+        self.temperature = temperature
+
+    def get_state(self):
+        """現在の制御状態を取得
+
+        Returns:
+            dict: setpoint, pressure, error, output（PID出力, パルス）,
+                pulses_issued（累積指令パルス数）, pulses_sent（累積送信パルス数）,
+                in_band（不感帯内か）, updated_at（更新時刻, time.time()）
+        """
+        with self.lock:
+            return dict(self.state)
+
+    def start(self):
+        """制御スレッドを開始"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run_loop, name="pressure_regulator")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """制御スレッドを停止し、送信中のパルスを中止"""
+        self.running = False
+        self.wakeup.set()
+        self.pressure_control.pulse_engine.stop()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.pressure_control.pulse_engine.stop()
+
+    def compute_output(self, error, now, feedforward=None):
+        """PID出力を計算（パルス数, 正: 加圧, 負: 減圧）
+
+        出力が上限で飽和している間は、同じ向きの積分を止める（アンチワインドアップ）。
+        feedforwardを指定した場合は比例項の代わりに使う。
+        """
+        dt = 0.0 if self.last_time is None else now - self.last_time
+        derivative = 0.0
+        if self.last_error is not None and dt > 0:
+            derivative = (error - self.last_error) / dt
+
+        integral = self.integral + error * dt
+        proportional = self.kp * error if feedforward is None else feedforward
+        output = proportional + self.ki * integral + self.kd * derivative
+        saturated = abs(output) > self.max_pulses
+        if not (saturated and integral * error > 0):
+            self.integral = integral
+        output = max(-self.max_pulses, min(self.max_pulses, output))
+
+        self.last_error = error
+        self.last_time = now
+        return output
+
+    def step(self):
+        """制御を1回実行"""
+        with self.lock:
+            setpoint = self.setpoint
+        if setpoint is None or self.pressure_control.is_moving():
+            return
+        now = time.monotonic()
+        if self.last_move_end is not None and now - self.last_move_end < self.settle_time:
+            return
+
+        pressure = self.pressure_control.get_pressure()
+        if pressure is None:
+            return
+        if self.last_move is not None:
+            # 前回の移動による圧力変化を学習モデルに記録
+            sent, pressure_before = self.last_move
+            self.pressure_control.record_move(sent, pressure_before, pressure, self.temperature)
+            self.last_move = None
+
+        error = setpoint - pressure
+        in_band = abs(error) <= self.deadband
+        with self.lock:
+            if in_band:
+                # 不感帯内では動かさず、積分も止める
+                output = 0.0
+                self.last_error = error
+                self.last_time = now
+            else:
+                feedforward = None
+                if self.use_feedforward:
+                    feedforward = self.pressure_control.pulses_for_pressure_change(
+                        error, pressure, self.temperature)
+                output = self.compute_output(error, now, feedforward)
+            self.state.update({
+                'pressure': pressure,
+                'error': error,
+                'output': output,
+                'in_band': in_band,
+                'updated_at': time.time()
+            })
+        tracer.debug("圧力制御", pressure=pressure, error=error, output=output, in_band=in_band)
+
+        pulses = int(round(output))
+        if pulses == 0:
+            return
+        if pulses > 0:
+            move = self.pressure_control.increase_pressure(pulses, wait=False)
+        else:
+            move = self.pressure_control.decrease_pressure(-pulses, wait=False)
+        with self.lock:
+            self.state['pulses_issued'] += abs(pulses)
+        move.wait()
+        self.last_move_end = time.monotonic()
+        self.last_move = (move.sent if pulses > 0 else -move.sent, pressure)
+        with self.lock:
+            self.state['pulses_sent'] += move.sent
+
+    def _run_loop(self):
+        """制御スレッドのループ"""
+        while self.running:
+            try:
+                self.step()
+            except Exception as e:
+                tracer.error("圧力制御エラー: {}".format(e))
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
@@ -0,0 +1,189 @@
+import queue
+import threading
+import time
+from DTAmodule.trace import tracer
+
+def trapezoid_periods(pulses, period, start_period=None, ramp_pulses=0):
+    """台形加減速のパルス周期列を作成
+
+    最初と最後のramp_pulsesパルスで周期をstart_periodからperiodまで
+    直線的に変化させる。
+
+    Args:
+        pulses (int): パルス数
+        period (float): 定速時の周期（秒）
+        start_period (float, optional): 加速開始・減速終了時の周期（秒）
+        ramp_pulses (int): 加速（減速）に使うパルス数
+
+    Returns:
+        list: 各パルスの周期（秒）
+    """
+    if start_period is None or ramp_pulses <= 0:
+        return [period] * pulses
+    ramp = min(ramp_pulses, pulses // 2)
+    periods = []
+    for i in range(pulses):
+        # 両端からの距離で加減速の位置を決める
+        step = min(i, pulses - 1 - i)
+        if step < ramp:
+            periods.append(start_period + (period - start_period) * step / ramp)
+        else:
+            periods.append(period)
+    return periods
+
+class PulseMove:
+    """パルス送信1回分の状態"""
+    def __init__(self, line, pulses, periods):
+        self.line = line
+        self.requested = pulses
+        self.sent = 0
+        self.late_pulses = 0  # 予定時刻に間に合わなかったパルス数
+        self.periods = periods
+        self.cancelled = False
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+
+    def done(self):
+        """送信が終了したか（完了・中止を含む）"""
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """送信の終了を待つ
+
+        Returns:
+            bool: 期限内に終了した場合True
+        """
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        """送信を中止"""
+        self.cancelled = True
+
+class PulseEngine:
+    """ステッピングモーター用パルス送信スレッド
+
+    各パルスの立ち上がり時刻を単調時計上の絶対時刻で決め、その時刻まで待つ。
+    sleepの遅れが次のパルスに累積しないため、パルス間隔が揃う。
+    送信は専用スレッドで行うため、呼び出し側は送信完了を待たずに処理を続けられる。
+    """
+    def __init__(self, pulse_width=0.0005, pulse_delay=0.0005, spin_margin=0.0002):
+        """
+        Args:
+            pulse_width (float): パルスの幅（秒）
+            pulse_delay (float): パルス間の遅延（秒）
+            spin_margin (float): 目標時刻の直前にsleepせず待つ時間（秒）
+        """
+        self.pulse_width = pulse_width
+        self.pulse_delay = pulse_delay
+        self.spin_margin = spin_margin
+        self.current = None
+        self.moves = queue.Queue()
+        self.outstanding = 0  # 送信中・送信待ちの件数
+        self.lock = threading.Lock()
+        self.running = True
+        self.thread = threading.Thread(target=self._run_loop, name="pulse_engine")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def move(self, line, pulses, start_period=None, ramp_pulses=0):
+        """パルス送信を予約
+
+        Args:
+            line: 出力するGPIOライン
+            pulses (int): パルス数
+            start_period (float, optional): 加減速時の開始周期（秒）
+            ramp_pulses (int): 加減速に使うパルス数
+
+        Returns:
+            PulseMove: 送信状態（sent/requestedで進捗を確認できる）
+        """
+        period = self.pulse_width + self.pulse_delay
+        move = PulseMove(line, pulses, trapezoid_periods(pulses, period, start_period, ramp_pulses))
+        with self.lock:
+            self.outstanding += 1
+        self.moves.put(move)
+        return move
+
+    def is_busy(self):
+        """送信中または送信待ちのパルスがあるか"""
+        with self.lock:
+            return self.outstanding > 0
+
+    def stop(self):
+        """送信中と送信待ちのパルスをすべて中止"""
+        while True:
+            try:
+                move = self.moves.get_nowait()
+            except queue.Empty:
+                break
+            if move is None:
+                continue
+            move.cancel()
+            self._finish(move)
+        current = self.current
+        if current is not None:
+            current.cancel()
+            current.wait()
+
+    def shutdown(self):
+        """スレッドを終了"""
+        self.stop()
+        self.running = False
+        self.moves.put(None)
+        self.thread.join()
+
+    def _sleep_until(self, deadline):
+        """単調時計のdeadlineまで待つ"""
+        remaining = deadline - time.monotonic()
+        if remaining > self.spin_margin:
+            time.sleep(remaining - self.spin_margin)
+        while time.monotonic() < deadline:
+            pass
+
+    def _run_move(self, move):
+        """1回分のパルスを送信"""
+        move.started_at = time.monotonic()
+        deadline = move.started_at
+        try:
+            for period in move.periods:
+                if move.cancelled:
+                    break
+                self._sleep_until(deadline)
+                rise = time.monotonic()
+                move.line.set_value(1)
+                self._sleep_until(rise + self.pulse_width)
+                move.line.set_value(0)
+                move.sent += 1
+                # 遅れた場合もLOWの時間を最低pulse_delayの半分確保する（パルスを詰めて出さない）
+                deadline += period
+                earliest = time.monotonic() + self.pulse_delay / 2
+                if deadline < earliest:
+                    deadline = earliest
+                    move.late_pulses += 1
+        finally:
+            move.line.set_value(0)
+            move.finished_at = time.monotonic()
+
+    def _run_loop(self):
+        """送信スレッドのループ"""
+        while self.running:
+            move = self.moves.get()
+            if move is None:
+                break
+            self.current = move
+            try:
+                self._run_move(move)
+            except Exception as e:
+                tracer.error("パルス送信エラー: {}".format(e))
+            finally:
+                self.current = None
+                self._finish(move)
+
+    def _finish(self, move):
+        """送信終了を記録"""
+        with self.lock:
+            self.outstanding -= 1
+        tracer.debug("パルス送信完了", requested=move.requested, sent=move.sent,
+                     late_pulses=move.late_pulses, cancelled=move.cancelled)
+        move._done.set()
@@ -0,0 +1,228 @@
+import io
+import json
+import math
+import os
+import pandas as pd
+from DTAmodule.column_store import ColumnReader
+from DTAmodule.results_loader import load_results, store_matches
+from DTAmodule.trace import tracer
+
+DEFAULT_TIME_BUCKET = 600.0  # 秒
+
+def index_path(results_path):
+    """結果ファイルの索引のパス"""
+    return results_path + ".index"
+
+def columns_path(results_path):
+    """結果ファイルと同じ行を保存した列形式のデータのパス"""
+    return results_path + ".columns"
+
+class ResultsIndexWriter:
+    """結果ファイルの索引を追記するクラス
+
+    索引はJSONLで、1行目に列名などの設定、2行目以降に区切りの記録
+    （Run, Heat/Cool, time_bucket秒ごとの時間のいずれかが変わった行の
+    結果ファイル内の位置（バイト）と列形式のデータの行番号）を置く。
+    """
+    def __init__(self, path, columns, run_column='Run', segment_column='Heat or cool',
+                 time_column='time / s', time_bucket=DEFAULT_TIME_BUCKET):
+        """
+        Args:
+            path (str): 索引のファイル（既にある場合は追記する）
+            columns (list): 結果ファイルの1行の列名（値の順）
+            run_column (str): Runの列名
+            segment_column (str): Heat/Coolの列名
+            time_column (str): 時間の列名
+            time_bucket (float): 時間で区切る間隔（秒）
+        """
+        self.path = path
+        self.columns = list(columns)
+        self.run_index = self.columns.index(run_column)
+        self.segment_index = self.columns.index(segment_column)
+        self.time_index = self.columns.index(time_column)
+        self.time_bucket = time_bucket
+        self.last_key = None
+        header = {'columns': self.columns, 'run_column': run_column, 'segment_column': segment_column,
+                  'time_column': time_column, 'time_bucket': time_bucket}
+        if os.path.exists(path):
+            existing_header, markers = read_index(path)
+            if existing_header != header:
+                tracer.warning("索引の設定が異なるため作り直します: {}".format(path))
+                markers = []
+            self._rewrite(header, markers)
+        else:
+            self._rewrite(header, [])
+        self.file = open(path, 'a')
+
+    def _key(self, values):
+        time_value = float(values[self.time_index])
+        bucket = int(time_value // self.time_bucket) if math.isfinite(time_value) else None
+        return int(values[self.run_index]), str(values[self.segment_index]), bucket
+
+    def add(self, offset, row, values):
+        """1行分の位置を記録（区切りが変わった場合のみ索引に書く）
+
+        Args:
+            offset (int): 結果ファイル内の行の先頭の位置（バイト）
+            row (int): 列形式のデータの行番号（ない場合はNone）
+            values (tuple): 行の値
+        """
+        key = self._key(values)
+        if key == self.last_key:
+            return
+        self.last_key = key
+        self.file.write(json.dumps({
+            'offset': offset, 'row': row, 'run': key[0], 'segment': key[1],
+            'time': float(values[self.time_index])}) + "\n")
+
+    def flush(self):
+        self.file.flush()
+
+    def truncate(self, offset):
+        """結果ファイルのoffsetより後の区切りを消す（ジャーナルからの修復用）"""
+        self.file.close()
+        header, markers = read_index(self.path)
+        self._rewrite(header, [m for m in markers if m['offset'] < offset])
+        self.file = open(self.path, 'a')
+
+    def _rewrite(self, header, markers):
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w') as f:
+            f.write(json.dumps(header) + "\n")
+            for marker in markers:
+                f.write(json.dumps(marker) + "\n")
+        os.replace(tmp, self.path)
+        if markers:
+            last = markers[-1]
+            bucket = int(last['time'] // self.time_bucket) if math.isfinite(last['time']) else None
+            self.last_key = (last['run'], last['segment'], bucket)
+        else:
+            self.last_key = None
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+def read_index(path):
+    """索引を読む（途中まで書かれた最後の行は無視する）
+
+    Returns:
+        tuple: (設定, 区切りの記録のリスト)
+    """
+    with open(path) as f:
+        lines = f.read().split("\n")
+    header = json.loads(lines[0])
+    markers = []
+    for line in lines[1:]:
+        try:
+            markers.append(json.loads(line))
+        except ValueError:
+            break
+    return header, markers
+
+class ResultsIndex:
+    """結果ファイルの索引を読み、Runや時間の範囲の位置を求めるクラス"""
+    def __init__(self, results_path):
+        """
+        Args:
+            results_path (str): 結果ファイル（索引は results_path + '.index'）
+        """
+        self.results_path = results_path
+        header, markers = read_index(index_path(results_path))
+        self.columns = header['columns']
+        self.run_column = header['run_column']
+        self.segment_column = header['segment_column']
+        self.time_column = header['time_column']
+        self.time_bucket = header['time_bucket']
+        # 結果ファイルより後を指す記録（書き込み中に止まった場合）は使わない
+        size = os.path.getsize(results_path)
+        self.markers = [m for m in markers if m['offset'] < size]
+        self.size = size
+
+    def runs(self):
+        """索引にあるRunの番号（昇順）"""
+        return sorted({m['run'] for m in self.markers})
+
+    def _ranges(self, match):
+        """条件に合う区切りの連続した範囲 [(開始位置, 終了位置, 開始行, 終了行), ...]"""
+        ranges = []
+        for i, marker in enumerate(self.markers):
+            if not match(marker):
+                continue
+            following = self.markers[i + 1] if i + 1 < len(self.markers) else None
+            end = following['offset'] if following is not None else self.size
+            end_row = following['row'] if following is not None else None
+            if ranges and ranges[-1][1] == marker['offset']:
+                ranges[-1] = (ranges[-1][0], end, ranges[-1][2], end_row)
+            else:
+                ranges.append((marker['offset'], end, marker['row'], end_row))
+        return ranges
+
+    def run_ranges(self, k, segment=None):
+        """Run k（segmentを指定した場合はそのHeat/Coolのみ）の範囲"""
+        return self._ranges(lambda m: m['run'] == k and (segment is None or m['segment'] == segment))
+
+    def time_ranges(self, start, stop):
+        """時間 start〜stop（秒）を含む範囲（区切りの単位なので前後の行も含む）"""
+        first = math.floor(start / self.time_bucket) * self.time_bucket
+        return self._ranges(lambda m: first <= m['time'] < stop)
+
+def _read_slices(results_path, index, ranges):
+    """範囲の行だけを読む（列形式のデータが結果ファイルと同じ行数であればそちらを使う）"""
+    store = columns_path(results_path)
+    reader = ColumnReader(store) if os.path.isdir(store) and ranges else None
+    if reader is not None and store_matches(results_path, index.markers, reader.rows):
+        frames = [pd.DataFrame(reader.read(index.columns, start, stop))
+                  for _, _, start, stop in ranges]
+    else:
+        frames = []
+        with open(results_path, 'rb') as f:
+            for start, end, _, _ in ranges:
+                f.seek(start)
+                frames.append(pd.read_csv(io.BytesIO(f.read(end - start)), header=None,
+                                          names=index.columns))
+    if not frames:
+        return pd.DataFrame(columns=index.columns)
+    return pd.concat(frames, ignore_index=True)
+
+def load_run(results_path, k, segment=None):
+    """結果ファイルからRun kの行だけを読む
+
+    索引で位置を求めて該当する範囲だけを読むため、他のRunは解析しない。
+    索引がない場合（古い結果ファイル）はファイル全体を読んで値で絞り込む。
+
+    Args:
+        results_path (str): 結果ファイル
+        k (int): Runの番号
+        segment (str, optional): 'Heat'または'Cool'（省略時は両方）
+
+    Returns:
+        pandas.DataFrame: Run kの行
+    """
+    if os.path.exists(index_path(results_path)):
+        index = ResultsIndex(results_path)
+        frame = _read_slices(results_path, index, index.run_ranges(k, segment))
+        run_column, segment_column = index.run_column, index.segment_column
+    else:
+        frame = load_results(results_path).frame
+        run_column, segment_column = 'Run', 'Heat or cool'
+    # 索引の記録が欠けている場合に備えて値でも絞り込む
+    mask = frame[run_column] == k
+    if segment is not None:
+        mask &= frame[segment_column] == segment
+    return frame[mask].reset_index(drop=True)
+
+def load_time_range(results_path, start, stop):
+    """結果ファイルから時間 start〜stop（秒）の行だけを読む
+
+    Returns:
+        pandas.DataFrame: 該当する行
+    """
+    if os.path.exists(index_path(results_path)):
+        index = ResultsIndex(results_path)
+        frame = _read_slices(results_path, index, index.time_ranges(start, stop))
+        time_values = frame[index.time_column]
+    else:
+        frame = load_results(results_path).frame
+        time_values = frame['time / s']
+    return frame[(time_values >= start) & (time_values < stop)].reset_index(drop=True)
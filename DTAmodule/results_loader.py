@@ -0,0 +1,269 @@
+import collections
+import csv
+import io
+import json
+import os
+import threading
+import pandas as pd
+from DTAmodule.column_store import CATEGORY, ColumnReader
+from DTAmodule.trace import tracer
+
+# 結果ファイル（Results.csv）の列と型（値の順）
+RESULT_COLUMNS = [
+    ('set Temp. / K', 'f8'),
+    ('time / s', 'f8'),
+    ('dt of Kei2000/ microvolts', 'f8'),
+    ('dt of Kei2182A/ microvolts', 'f8'),
+    ('dt of Kei2000/K', 'f8'),
+    ('dt of Kei2182A/K', 'f8'),
+    ('Heat or cool', 'category'),
+    ('Run', 'i4'),
+    ('Pressure / MPa', 'f8'),
+    ('Status', 'category')
+]
+
+# ヘッダーを探す範囲（save_results_headerのメタデータを含む）
+HEADER_SCAN_LINES = 64
+
+class ResultsData:
+    """読み込んだ結果ファイル
+
+    Attributes:
+        path (str): 結果ファイル
+        frame (pandas.DataFrame): 読み込んだ列
+        metadata (dict): ヘッダーの前のメタデータ（'Sample Name'など）
+    """
+    def __init__(self, path, frame, metadata):
+        self.path = path
+        self.frame = frame
+        self.metadata = metadata
+        self.complete = False  # 全ての列を読み込んだ場合True
+
+    def __getitem__(self, name):
+        """列の値（numpy.ndarray）"""
+        return self.frame[name].to_numpy()
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def sample_name(self):
+        """サンプル名（メタデータにない場合はファイル名）"""
+        return self.metadata.get('Sample Name') or os.path.basename(self.path).replace('Results.csv', '')
+
+    @property
+    def nbytes(self):
+        return int(self.frame.memory_usage(deep=True).sum())
+
+def _is_number(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+def read_header(path):
+    """結果ファイルの先頭を読み、区切り文字・メタデータ・列名・データの開始位置を求める
+
+    データ行は最初の値が数値の行とし、その直前の行を列名、
+    それより前の「項目,値」の行をメタデータとする。
+
+    Returns:
+        dict: delimiter, metadata, columns（列名。ない場合はNone）, data_offset（バイト）
+    """
+    lines = []
+    offset = 0
+    with open(path, 'rb') as f:
+        for _ in range(HEADER_SCAN_LINES):
+            raw = f.readline()
+            if not raw:
+                break
+            text = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+            delimiter = '\t' if text.count('\t') > text.count(',') else ','
+            first = text.split(delimiter, 1)[0].strip()
+            if text and _is_number(first):
+                break
+            lines.append((text, delimiter))
+            offset += len(raw)
+
+    header, delimiter = lines[-1] if lines else (None, ',')
+    metadata = {}
+    for text, line_delimiter in lines[:-1]:
+        fields = next(csv.reader([text], delimiter=line_delimiter))
+        if fields and fields[0]:
+            metadata[fields[0].strip()] = line_delimiter.join(fields[1:]).strip()
+    columns = next(csv.reader([header], delimiter=delimiter)) if header else None
+    return {'delimiter': delimiter, 'metadata': metadata, 'columns': columns, 'data_offset': offset}
+
+def _read_index(path):
+    """索引（path + '.index'）に記録した列名と区切りの記録（ない場合は(None, [])）"""
+    try:
+        with open(path + ".index") as f:
+            lines = f.read().split("\n")
+        columns = json.loads(lines[0])['columns']
+    except (OSError, ValueError, KeyError):
+        return None, []
+    markers = []
+    for line in lines[1:]:
+        try:
+            markers.append(json.loads(line))
+        except ValueError:
+            break
+    return columns, markers
+
+def store_matches(path, markers, store_rows):
+    """列形式のデータの行数が結果ファイルの行数と一致するか
+
+    結果ファイルの行数は索引の最後の区切りの行番号に、その位置より後の行数を足して求める。
+    列形式のデータへの記録が途中で止まった場合（行番号のない区切りがある）はFalse。
+
+    Args:
+        path (str): 結果ファイル
+        markers (list): 索引の区切りの記録
+        store_rows (int): 列形式のデータの行数
+    """
+    if not markers or any(marker.get('row') is None for marker in markers):
+        return False
+    last = markers[-1]
+    with open(path, 'rb') as f:
+        f.seek(last['offset'])
+        tail = f.read()
+    lines = tail.count(b'\n') + (1 if tail and not tail.endswith(b'\n') else 0)
+    return last['row'] + lines == store_rows
+
+def _field_count(path, offset, delimiter):
+    """最初のデータ行の値の数"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        line = f.readline().decode('utf-8', errors='replace')
+    return len(line.rstrip('\r\n').split(delimiter)) if line.strip() else None
+
+def parse_results(path, columns=None):
+    """結果ファイルを1回だけ解析して読み込む（キャッシュしない）
+
+    列名の行がデータの値の数と合わない場合（古い形式のヘッダー）は、
+    索引に記録した列名かRESULT_COLUMNSを使う。列形式のデータ（path + '.columns'）が
+    結果ファイルの最初のデータ行から全ての行を記録している場合はテキストを解析せずにそちらを読む。
+
+    Args:
+        path (str): 結果ファイル
+        columns (list, optional): 読み込む列名（省略時は全て）
+
+    Returns:
+        ResultsData: 読み込んだ結果
+    """
+    header = read_header(path)
+    names = header['columns']
+    index_names, markers = _read_index(path)
+    count = _field_count(path, header['data_offset'], header['delimiter'])
+    if names is None or (count is not None and len(names) != count):
+        if index_names is not None and len(index_names) == count:
+            names = index_names
+        elif count == len(RESULT_COLUMNS) or names is None:
+            names = [name for name, _ in RESULT_COLUMNS]
+        else:
+            raise ValueError("{} の列名と値の数が合いません（{} / {}）".format(path, len(names), count))
+    usecols = [name for name in (columns or names) if name in names]
+
+    store = path + ".columns"
+    if markers and markers[0]['offset'] == header['data_offset'] and os.path.isdir(store):
+        reader = ColumnReader(store)
+        if all(name in reader for name in usecols) and store_matches(path, markers, reader.rows):
+            frame = pd.DataFrame(reader.read(usecols))
+            for column in reader.manifest['columns']:
+                if column['dtype'] == CATEGORY and column['name'] in usecols:
+                    frame[column['name']] = frame[column['name']].astype('category')
+            return ResultsData(path, frame, header['metadata'])
+
+    dtypes = {name: ('category' if dtype == 'category' else dtype)
+              for name, dtype in RESULT_COLUMNS if name in usecols}
+    with open(path, 'rb') as f:
+        f.seek(header['data_offset'])
+        data = f.read()
+    options = {'sep': header['delimiter'], 'header': None, 'names': names, 'usecols': usecols}
+    try:
+        frame = pd.read_csv(io.BytesIO(data), dtype=dtypes, **options)
+    except (ValueError, TypeError) as e:
+        # 欠損などで指定した型に変換できない場合は型を推定する
+        tracer.debug("型を指定した読み込みに失敗", path=path, error=str(e))
+        frame = pd.read_csv(io.BytesIO(data), **options)
+    return ResultsData(path, frame[usecols], header['metadata'])
+
+class ResultsCache:
+    """読み込んだ結果のLRUキャッシュ（パスと更新時刻で管理）
+
+    ファイルが更新されると別のキーになるため、古い内容は使われずに追い出される。
+    要求された列がキャッシュにない場合は、キャッシュ済みの列と合わせて読み直す。
+    """
+    def __init__(self, max_entries=8, max_bytes=256 * 1024 * 1024):
+        """
+        Args:
+            max_entries (int): 保持する結果の最大数
+            max_bytes (int): 保持するデータの合計の上限（バイト）
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()  # (実パス, 更新時刻, 大きさ) → ResultsData
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path, columns=None):
+        """結果ファイルを読み込む（キャッシュにあればそれを返す）
+
+        Args:
+            path (str): 結果ファイル
+            columns (list, optional): 必要な列名（省略時は全て）
+
+        Returns:
+            ResultsData: 読み込んだ結果（キャッシュと共有するため変更しないこと）
+        """
+        stat = os.stat(path)
+        key = (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is not None and (columns is None and cached.complete
+                                       or columns is not None and set(columns) <= set(cached.frame.columns)):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return cached
+        self.misses += 1
+        wanted = None
+        if columns is not None:
+            wanted = list(columns)
+            if cached is not None:
+                wanted += [name for name in cached.frame.columns if name not in wanted]
+        data = parse_results(path, wanted)
+        data.complete = columns is None
+        with self.lock:
+            # 同じファイルの古い内容は捨てる
+            for old in [k for k in self.entries if k[0] == key[0] and k != key]:
+                del self.entries[old]
+            self.entries[key] = data
+            self._evict()
+        return data
+
+    def _evict(self):
+        total = sum(entry.nbytes for entry in self.entries.values())
+        while len(self.entries) > self.max_entries or (total > self.max_bytes and len(self.entries) > 1):
+            _, entry = self.entries.popitem(last=False)
+            total -= entry.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+# プロセス全体で共有するキャッシュ
+results_cache = ResultsCache()
+
+def load_results(path, columns=None):
+    """結果ファイルを読み込む（results_cacheを使う）
+
+    Args:
+        path (str): 結果ファイル
+        columns (list, optional): 必要な列名（省略時は全て）
+
+    Returns:
+        ResultsData: 読み込んだ結果
+    """
+    return results_cache.load(path, columns)
@@ -0,0 +1,262 @@
+import atexit
+import os
+import queue
+import threading
+import time
+import weakref
+from DTAmodule.trace import tracer
+
+# 開いている書き込みスレッド（緊急停止や終了時にまとめて書き出す）
+_open_writers = weakref.WeakSet()
+
+class ResultsWriter:
+    """結果ファイルへの書き込みを別スレッドでまとめて行うクラス
+
+    測定ループはwrite()で値をキューに入れるだけで、整形と書き込みは
+    書き込みスレッドが行う。行はflush_rows行またはflush_interval秒ごとに
+    まとめて書き込む。ファイルシステムが遅くても測定ループは待たない
+    （キューが一杯の場合は行を捨てて数を記録する）。
+
+    journalを指定すると、各行を結果ファイルより先にジャーナルにも書き込み、
+    checkpoint_rows行ごととcheckpoint()でループの状態を記録する
+    （チェックポイントでは結果ファイルとジャーナルのディスクへの書き込みを待つ）。
+    columnsを指定すると、同じ行を列形式（ColumnWriter）にも追記する。
+    indexを指定すると、Runや時間の区切りの位置を索引（ResultsIndexWriter）に記録する。
+    """
+    def __init__(self, path, row_format, flush_rows=20, flush_interval=5.0,
+                 max_queue=10000, fsync=False, journal=None, checkpoint_rows=100, columns=None,
+                 index=None):
+        """
+        Args:
+            path (str): 結果ファイル（追記する）
+            row_format (str): 1行の書式（末尾の改行を含む）
+            flush_rows (int): まとめて書き込む行数
+            flush_interval (float): 書き込みの最大間隔（秒）
+            max_queue (int): キューに溜める最大行数
+            fsync (bool): Trueの場合はsync()とclose()でディスクへの書き込みを待つ
+            journal (Journal, optional): 行とチェックポイントを記録するジャーナル
+            checkpoint_rows (int): チェックポイントを記録する間隔（行数）
+            columns (ColumnWriter, optional): 同じ行を追記する列形式のデータ
+            index (ResultsIndexWriter, optional): 区切りの位置を記録する索引
+        """
+        self.path = path
+        self.row_format = row_format
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.journal = journal
+        self.columns = columns
+        self.index = index
+        self.checkpoint_rows = checkpoint_rows
+        self.rows_since_checkpoint = 0
+        self.journaled = 0  # まとめた行のうちジャーナルに書いた行数（再試行で重複させない）
+        self.batch_offset = None  # まとめた行を書き始めた位置（書き込みに失敗した場合も保持する）
+        self.batch_written = 0  # まとめた行のうち結果ファイルに書けたバイト数
+        self.last_state = None
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        # 書けたバイト数を正確に知るためバッファを使わない（書き込みはまとめて行う）
+        self.file = open(path, 'ab', buffering=0)
+        self.thread = threading.Thread(target=self._write_loop, name="results_writer")
+        self.thread.daemon = True
+        self.thread.start()
+        _open_writers.add(self)
+
+    @property
+    def depth(self):
+        """キューに溜まっている行数"""
+        return self.queue.qsize()
+
+    def write(self, values, state=None):
+        """1行分の値をキューに入れる（待たない）
+
+        Args:
+            values (tuple): row_formatに渡す値
+            state (dict, optional): この行を書いた時点のループの状態（ジャーナルに記録する）
+
+        Returns:
+            bool: キューに入れた場合True、キューが一杯で捨てた場合False
+        """
+        try:
+            self.queue.put_nowait(('row', (values, state)))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                tracer.warning("結果の書き込みが追いつきません（{}行を破棄）".format(self.dropped))
+            return False
+
+    def sync(self, timeout=None):
+        """キューの行を全て書き込むまで待つ（fsync=Trueの場合はディスクへの書き込みも待つ）
+
+        実験条件の区切りなど、測定ループの外で呼ぶ。
+
+        Args:
+            timeout (float, optional): 待つ時間の上限（秒）
+
+        Returns:
+            bool: 期限内に書き込みが終わった場合True
+        """
+        done = threading.Event()
+        self.queue.put(('sync', done))
+        return done.wait(timeout)
+
+    def checkpoint(self, state):
+        """ループの状態をジャーナルに記録する（待たない。ジャーナルがない場合は何もしない）
+
+        Args:
+            state (dict): 再開に必要なループの状態
+        """
+        if self.journal is not None:
+            self.queue.put(('checkpoint', state))
+
+    def close(self, timeout=10.0):
+        """残りの行を書き込み、スレッドを停止してファイルを閉じる"""
+        if self.thread is None:
+            return
+        self.queue.put(('stop', None))
+        self.thread.join(timeout=timeout)
+        self.thread = None
+        _open_writers.discard(self)
+
+    def _write_loop(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                kind, item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                kind, item = 'timeout', None
+
+            if kind == 'row':
+                values, state = item
+                try:
+                    batch.append((self.row_format.format(*values), values, state))
+                except Exception as e:
+                    tracer.error("結果の整形エラー: {}".format(e))
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.flush_rows:
+                    continue
+
+            if self._flush(batch, sync=kind in ('sync', 'stop')):
+                batch = []
+                deadline = None
+                if kind == 'checkpoint':
+                    self._checkpoint(item)
+                elif self.journal is not None and self.rows_since_checkpoint >= self.checkpoint_rows:
+                    self._checkpoint(self.last_state)
+            elif deadline is not None:
+                # 書き込みに失敗した行は次の間隔で再試行する
+                deadline = time.monotonic() + self.flush_interval
+            if kind == 'sync':
+                item.set()
+            elif kind == 'stop':
+                self.file.close()
+                if self.columns is not None:
+                    self.columns.close()
+                if self.index is not None:
+                    self.index.close()
+                if self.journal is not None:
+                    self.journal.close()
+                return
+
+    def _flush(self, batch, sync=False):
+        """まとめた行をファイルに書き込む
+
+        Returns:
+            bool: 書き込みに成功した場合True
+        """
+        try:
+            if batch:
+                if self.journal is not None:
+                    # ジャーナルを先に書き、結果ファイルにない行を再開時に復元できるようにする
+                    for _, values, state in batch[self.journaled:]:
+                        self.journal.append({'type': 'row', 'values': values, 'state': state})
+                        if state is not None:
+                            self.last_state = state
+                    self.journal.flush()
+                    self.rows_since_checkpoint += len(batch) - self.journaled
+                    self.journaled = len(batch)
+                if self.batch_offset is None:
+                    self.batch_offset = os.fstat(self.file.fileno()).st_size
+                offset = self.batch_offset
+                # 途中まで書けた場合は、再試行で残りのバイトだけを書く
+                data = "".join(line for line, _, _ in batch).encode('utf-8')
+                while self.batch_written < len(data):
+                    self.batch_written += self.file.write(data[self.batch_written:])
+                self.written += len(batch)
+                self.journaled = 0
+                self.batch_offset = None
+                self.batch_written = 0
+                row = self.columns.rows if self.columns is not None else None
+                if self.columns is not None and not self._append_columns(batch):
+                    row = None
+                if self.index is not None:
+                    self._add_index(batch, offset, row)
+            if sync and self.fsync:
+                os.fsync(self.file.fileno())
+                if self.columns is not None:
+                    self.columns.fsync()
+            return True
+        except Exception as e:
+            tracer.error("データ記録エラー: {}".format(e))
+            return False
+
+    def _append_columns(self, batch):
+        """列形式のデータに追記（失敗してもCSVの書き込みは続ける）
+
+        失敗した場合は以降の行を列形式のデータに記録しない（行が欠けたまま追記を続けると
+        結果ファイルと行が対応しなくなるため）。
+
+        Returns:
+            bool: 追記できた場合True
+        """
+        try:
+            self.columns.append([values for _, values, _ in batch])
+            return True
+        except Exception as e:
+            tracer.error("列形式のデータの記録エラー（以降は結果ファイルのみに記録します）: {}".format(e))
+            try:
+                self.columns.close()
+            except Exception:
+                pass
+            self.columns = None
+            return False
+
+    def _add_index(self, batch, offset, row):
+        """まとめた行の位置を索引に記録（失敗してもCSVの書き込みは続ける）"""
+        try:
+            for line, values, _ in batch:
+                self.index.add(offset, row, values)
+                offset += len(line.encode('utf-8'))
+                if row is not None:
+                    row += 1
+            self.index.flush()
+        except Exception as e:
+            tracer.error("索引の記録エラー: {}".format(e))
+
+    def _checkpoint(self, state):
+        """結果ファイルをディスクに書き込み、その大きさとループの状態をジャーナルに記録"""
+        if state is None:
+            return
+        try:
+            os.fsync(self.file.fileno())
+            fields = {'results_size': os.fstat(self.file.fileno()).st_size}
+            if self.columns is not None:
+                self.columns.fsync()
+                fields['column_rows'] = self.columns.rows
+            self.journal.checkpoint(state, **fields)
+            self.rows_since_checkpoint = 0
+            self.last_state = state
+        except Exception as e:
+            tracer.error("チェックポイントの記録エラー: {}".format(e))
+
+def close_all():
+    """開いている全ての書き込みスレッドを閉じる"""
+    for writer in list(_open_writers):
+        writer.close()
+
+atexit.register(close_all)
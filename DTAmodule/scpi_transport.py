@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+from collections import deque
+
+
+class ScpiTimeoutError(Exception):
+    """SCPI応答が期限内に得られなかった場合の例外"""
+    pass
+
+
+class ScpiTransport:
+    """SCPI機器用のシリアル通信クラス
+
+    固定時間の待機ではなく、終端文字を受信するまで期限付きで読み取る。
+    各往復（コマンド送信から応答受信まで）の所要時間を記録する。
+    """
+    # read/read_until 1回あたりの待ち時間（秒）
+    # 受信のたびにポートのタイムアウトを変更すると termios の再設定が走るため固定にし、
+    # 期限はtime.monotonic()で判定する
+    poll_interval = 0.1
+
+    def __init__(self, ser, terminator=b'\n', write_terminator='\n', timeout=2.0, history_size=100):
+        """
+        Args:
+            ser: オープン済みのシリアルポート（serial.Serial）
+            terminator (bytes): 応答の終端文字
+            write_terminator (str): コマンドの終端文字
+            timeout (float): 応答待ちの期限（秒）
+            history_size (int): 記録する往復時間の件数
+        """
+        self.ser = ser
+        self.terminator = terminator
+        self.write_terminator = write_terminator
+        self.timeout = timeout
+        self.last_round_trip = None
+        self.round_trips = deque(maxlen=history_size)
+        # ポートはpoll_intervalで開いておく（異なる場合はここで1回だけ変更する）
+        if self.ser.timeout != self.poll_interval:
+            self.ser.timeout = self.poll_interval
+
+    def discard_input(self):
+        """受信バッファに残っているデータを捨てる
+
+        期限切れの後に届いた応答が、次のクエリの応答として読まれないようにする。
+        """
+        self.ser.reset_input_buffer()
+
+    def write(self, command):
+        """コマンドを送信（応答は読まない）
+
+        Args:
+            command (str): 送信するコマンド
+        """
+        self.ser.write((command + self.write_terminator).encode())
+
+    def read_line(self, timeout=None):
+        """終端文字まで読み取る
+
+        Args:
+            timeout (float, optional): 期限（秒）。省略時は既定値
+
+        Returns:
+            bytes: 終端文字を除いた受信データ
+
+        Raises:
+            ScpiTimeoutError: 期限内に終端文字を受信できなかった場合
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+        buf = bytearray()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ScpiTimeoutError("応答がタイムアウトしました（受信済み: {!r}）".format(bytes(buf)))
+            buf += self.ser.read_until(self.terminator)
+            if buf.endswith(self.terminator):
+                return bytes(buf[:-len(self.terminator)])
+
+    def read_exact(self, size, timeout=None):
+        """指定バイト数を読み取る
+
+        Args:
+            size (int): 読み取るバイト数
+            timeout (float, optional): 期限（秒）。省略時は既定値
+
+        Returns:
+            bytes: 受信データ
+
+        Raises:
+            ScpiTimeoutError: 期限内に受信できなかった場合
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+        buf = bytearray()
+        while len(buf) < size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ScpiTimeoutError("応答がタイムアウトしました（{}/{} バイト受信）".format(len(buf), size))
+            buf += self.ser.read(size - len(buf))
+        return bytes(buf)
+
+    def query(self, command, timeout=None):
+        """コマンドを送信し、応答を1行読み取る
+
+        Args:
+            command (str): 送信するコマンド
+            timeout (float, optional): 期限（秒）。省略時は既定値
+
+        Returns:
+            str: 応答文字列（前後の空白を除去）
+
+        Raises:
+            ScpiTimeoutError: 期限内に応答がなかった場合
+        """
+        start = time.monotonic()
+        self.discard_input()
+        self.write(command)
+        response = self.read_line(timeout)
+        self._record_round_trip(time.monotonic() - start)
+        return response.decode().strip()
+
+    def query_block(self, command, itemsize, count=None, timeout=None):
+        """コマンドを送信し、IEEE 488.2形式のバイナリブロックを読み取る
+
+        '#<桁数><長さ><データ>'の確定長ブロックと、'#0<データ>'の
+        不定長ブロックに対応する。不定長の場合はcountから長さを求める。
+
+        Args:
+            command (str): 送信するコマンド
+            itemsize (int): 1要素のバイト数
+            count (int, optional): 要素数（不定長ブロックの場合は必須）
+            timeout (float, optional): 期限（秒）。省略時は既定値
+
+        Returns:
+            bytes: ブロックのデータ部
+
+        Raises:
+            ScpiTimeoutError: 期限内に応答がなかった場合
+            ValueError: ブロックの形式が不正な場合
+        """
+        start = time.monotonic()
+        self.discard_input()
+        self.write(command)
+        header = self.read_exact(2, timeout)
+        if header[:1] != b'#' or not header[1:2].isdigit():
+            raise ValueError("バイナリブロックのヘッダーが不正です: {!r}".format(header))
+        digits = int(header[1:2])
+        if digits > 0:
+            length = int(self.read_exact(digits, timeout))
+        elif count is not None:
+            length = count * itemsize
+        else:
+            raise ValueError("不定長ブロックには要素数の指定が必要です")
+        payload = self.read_exact(length, timeout)
+        # 終端文字を読み捨てる
+        self.read_line(timeout)
+        self._record_round_trip(time.monotonic() - start)
+        return payload
+
+    def _record_round_trip(self, elapsed):
+        """往復時間を記録"""
+        self.last_round_trip = elapsed
+        self.round_trips.append(elapsed)
+
+    def round_trip_stats(self):
+        """往復時間の統計を取得
+
+        Returns:
+            dict: count, last, mean, max（秒）。記録がない場合はcount=0のみ
+        """
+        if not self.round_trips:
+            return {'count': 0}
+        return {
+            'count': len(self.round_trips),
+            'last': self.last_round_trip,
+            'mean': sum(self.round_trips) / len(self.round_trips),
+            'max': max(self.round_trips)
+        }
+
+
+def is_query(command):
+    """応答を返すコマンド（クエリ）かどうかを判定"""
+    return command.rstrip().endswith('?')
@@ -0,0 +1,160 @@
+import math
+import random
+import threading
+import time
+from DTAmodule import calibration
+
+def temperature_to_microvolts(temp):
+    """温度（K）から熱電対電圧（µV）を求める（範囲外は範囲の端の電圧）"""
+    curve = calibration.get_curve('thermocouple')
+    if temp <= curve.ranges[0][0]:
+        return curve.domain[0]
+    if temp >= curve.ranges[-1][1]:
+        return curve.domain[1]
+    return float(curve.inverse(temp))
+
+class CellModel:
+    """高圧DTAセルの簡易モデル
+
+    炉（Chinoの制御対象）は設定値に一次遅れで追従し、試料は炉に一次遅れで追従する。
+    圧力はモーターのパルスと温度変化（熱膨張）で変化する。
+    speedを大きくすると、実時間より速くモデルの時間が進む。
+    """
+    def __init__(self, speed=1.0, initial_temperature=298.15, initial_pressure=0.1,
+                 furnace_tau=60.0, sample_tau=20.0, mpa_per_pulse=0.005,
+                 mpa_per_kelvin=0.02, transition_temperature=330.0, peak_height=5.0,
+                 peak_width=1.0, noise=True, seed=None):
+        """
+        Args:
+            speed (float): 時間の倍率
+            initial_temperature (float): 初期温度（K）
+            initial_pressure (float): 初期圧力（MPa）
+            furnace_tau (float): 炉の時定数（秒）
+            sample_tau (float): 試料の時定数（秒）
+            mpa_per_pulse (float): 1パルスあたりの圧力変化（MPa）
+            mpa_per_kelvin (float): 温度1Kあたりの圧力変化（MPa）
+            transition_temperature (float): 試料の転移温度（K）
+            peak_height (float): DTAピークの高さ（µV）
+            peak_width (float): DTAピークの幅（K）
+            noise (bool): 測定値に雑音を加えるか
+            seed (int, optional): 乱数の種
+        """
+        self.speed = speed
+        self.furnace_tau = furnace_tau
+        self.sample_tau = sample_tau
+        self.mpa_per_pulse = mpa_per_pulse
+        self.mpa_per_kelvin = mpa_per_kelvin
+        self.transition_temperature = transition_temperature
+        self.peak_height = peak_height
+        self.peak_width = peak_width
+        self.noise = noise
+        self.random = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.start_real = time.monotonic()
+        self.last_time = 0.0
+        self.sv = initial_temperature
+        self.furnace_temperature = initial_temperature
+        self.sample_temperature = initial_temperature
+        self.base_pressure = initial_pressure
+        self.reference_temperature = initial_temperature
+        self.pulses = 0
+        self.program = None  # (開始時刻, 開始温度, セグメントのリスト)
+
+    def now(self):
+        """モデルの時刻（秒）"""
+        return (time.monotonic() - self.start_real) * self.speed
+
+    def _program_sv(self, t):
+        """プログラム運転中の設定値"""
+        start_time, sv, segments = self.program
+        elapsed = t - start_time
+        for segment in segments:
+            duration = segment['minutes'] * 60.0
+            if elapsed < duration:
+                return sv + (segment['target'] - sv) * elapsed / duration
+            elapsed -= duration
+            sv = segment['target']
+        self.program = None
+        self.sv = sv
+        return sv
+
+    def _advance(self):
+        """現在時刻までモデルを進める（lockを取得して呼ぶこと）"""
+        t = self.now()
+        dt = t - self.last_time
+        if dt <= 0:
+            return
+        if self.program is not None:
+            self.sv = self._program_sv(t)
+        # 一次遅れの厳密解で更新
+        self.furnace_temperature += (self.sv - self.furnace_temperature) * (1 - math.exp(-dt / self.furnace_tau))
+        self.sample_temperature += (self.furnace_temperature - self.sample_temperature) * (1 - math.exp(-dt / self.sample_tau))
+        self.last_time = t
+
+    def _noise(self, sigma):
+        return self.random.gauss(0.0, sigma) if self.noise else 0.0
+
+    def set_sv(self, sv):
+        """設定値を変更（プログラム運転は終了する）"""
+        with self.lock:
+            self._advance()
+            self.program = None
+            self.sv = sv
+
+    def run_program(self, start_temperature, segments):
+        """昇降温プログラムを開始"""
+        with self.lock:
+            self._advance()
+            self.sv = start_temperature
+            self.program = (self.last_time, start_temperature, list(segments))
+
+    def stop_program(self):
+        """昇降温プログラムを停止（現在の設定値を保持）"""
+        with self.lock:
+            self._advance()
+            self.program = None
+
+    def pulse(self, direction):
+        """モーター1パルス分の圧力変化（direction: +1 加圧, -1 減圧）"""
+        with self.lock:
+            self.pulses += direction
+
+    def state(self):
+        """現在の状態を取得
+
+        Returns:
+            dict: time, sv, furnace_temperature, sample_temperature, pressure
+        """
+        with self.lock:
+            self._advance()
+            return {
+                'time': self.last_time,
+                'sv': self.sv,
+                'furnace_temperature': self.furnace_temperature,
+                'sample_temperature': self.sample_temperature,
+                'pressure': self._pressure()
+            }
+
+    def _pressure(self):
+        return (self.base_pressure + self.pulses * self.mpa_per_pulse
+                + (self.sample_temperature - self.reference_temperature) * self.mpa_per_kelvin)
+
+    def thermocouple_voltage(self):
+        """試料温度の熱電対電圧（V）"""
+        temp = self.state()['sample_temperature']
+        return (temperature_to_microvolts(temp) + self._noise(0.2)) * 1e-6
+
+    def dta_voltage(self):
+        """DTA信号（試料と基準の温度差の熱電対電圧, V）"""
+        state = self.state()
+        peak = self.peak_height * math.exp(
+            -((state['sample_temperature'] - self.transition_temperature) / self.peak_width) ** 2)
+        # 炉より試料が遅れる分の温度差も加える
+        lag = (state['sample_temperature'] - state['furnace_temperature']) * 0.1 / 0.017
+        return (peak + lag + self._noise(0.02)) * 1e-6
+
+    def pressure_voltage(self):
+        """圧力センサーの電圧（V）（圧力センサーの校正曲線の逆）"""
+        pressure = self.state()['pressure'] + self._noise(0.005)
+        return float(calibration.get_curve('pressure').inverse(pressure))
@@ -0,0 +1,61 @@
+"""gpiod（v1 API）の代替モジュール
+
+PressureControlが使う範囲（Chip, get_line, request, set_value, release）のみ実装する。
+install()でsys.modules['gpiod']を置き換え、モーター用ラインの立ち上がりを
+セルのモデルに伝える。
+"""
+import sys
+
+LINE_REQ_DIR_OUT = 3
+
+_rising_edge_handlers = {}  # ライン番号 → 立ち上がり時に呼ぶ関数
+
+class Line:
+    """GPIOライン"""
+    def __init__(self, offset):
+        self.offset = offset
+        self.value = 0
+        self.consumer = None
+
+    def request(self, consumer=None, type=None):
+        self.consumer = consumer
+
+    def set_value(self, value):
+        if value and not self.value:
+            handler = _rising_edge_handlers.get(self.offset)
+            if handler is not None:
+                handler()
+        self.value = value
+
+    def get_value(self):
+        return self.value
+
+    def release(self):
+        self.consumer = None
+
+class Chip:
+    """GPIOチップ"""
+    OPEN_BY_NAME = 2
+
+    def __init__(self, name, how=None):
+        self.name = name
+
+    def get_line(self, offset):
+        return Line(offset)
+
+    def close(self):
+        pass
+
+def install(cell, cw_pin=18, ccw_pin=17):
+    """gpiodをこのモジュールに置き換え、モーターのパルスをセルのモデルに接続
+
+    PressureControlをimportする前に呼ぶこと。
+
+    Args:
+        cell (CellModel): セルのモデル
+        cw_pin (int): 加圧（CW）のライン番号
+        ccw_pin (int): 減圧（CCW）のライン番号
+    """
+    _rising_edge_handlers[cw_pin] = lambda: cell.pulse(+1)
+    _rising_edge_handlers[ccw_pin] = lambda: cell.pulse(-1)
+    sys.modules['gpiod'] = sys.modules[__name__]
@@ -0,0 +1,244 @@
+import time
+import numpy as np
+from DTAmodule.chino_control import ChinoController, STX, ETX, PV_FIELD, SV_FIELD
+
+# シミュレーターのプログラム運転の項目番号（実機の番号ではない。
+# SimulatedRig.chino_program_itemsとしてChinoControllerに渡す）
+PROGRAM_ITEMS = {'start_sv': 20, 'segment_sv': 21, 'segment_time': 22, 'segment_count': 23, 'run': 24}
+
+class KeithleySim:
+    """Keithley 2000/2182AのSCPI応答を模擬するクラス"""
+    def __init__(self, read_voltage, model="MODEL 2000", serial_number="0000001", speed=1.0):
+        """
+        Args:
+            read_voltage (callable): 現在の電圧（V）を返す関数
+            model (str): *IDN?で返す機種名
+            serial_number (str): *IDN?で返すシリアル番号
+            speed (float): 時間の倍率（積分時間を短縮する）
+        """
+        self.read_voltage = read_voltage
+        self.model = model
+        self.serial_number = serial_number
+        self.speed = speed
+        self.reset()
+
+    def reset(self):
+        """*RST相当の初期化"""
+        self.settings = {
+            'FUNC': self._function_reply('VOLT:DC'),
+            'NPLC': 1.0,
+            'RANG': 10.0,
+            'RANG:AUTO': 1,
+            'INIT:CONT': 1
+        }
+        self.data_format = 'ASCII'
+        self.byte_order = 'SWAP'
+        self.elements = ['READ']
+        self.sample_count = 1
+        self.trace_points = 0
+        self.trace_feed = 'NONE'
+        self.trace_control = 'NEVER'
+        self.trace = []
+        self.busy_until = 0.0
+
+    def _function_reply(self, function):
+        """FUNC?の応答（2182Aは'VOLT:DC'を'VOLT'と応答する）"""
+        if '2182' in self.model and function.endswith(':DC'):
+            function = function[:-len(':DC')]
+        return '"{}"'.format(function)
+
+    def integration_time(self):
+        """1回の測定時間（秒, 50Hz電源）"""
+        return self.settings['NPLC'] / 50.0 / self.speed
+
+    def _format(self, values):
+        """測定値を現在の転送形式に変換"""
+        if self.data_format == 'ASCII':
+            return (",".join("{:+.8E}".format(v) for v in values)).encode() + b'\n'
+        dtype = {'SREAL': 'f4', 'DREAL': 'f8'}[self.data_format]
+        prefix = '<' if self.byte_order == 'SWAP' else '>'
+        return b'#0' + np.asarray(values, dtype=prefix + dtype).tobytes() + b'\n'
+
+    def _reading(self):
+        values = [self.read_voltage()]
+        if 'TST' in self.elements:
+            values.append(time.monotonic())
+        return values
+
+    def _run_burst(self):
+        """トリガーを受けてバッファに測定値を格納"""
+        self.trace = []
+        start = time.monotonic()
+        for i in range(self.sample_count):
+            self.trace.append((self.read_voltage(), i * self.integration_time()))
+        self.busy_until = start + self.sample_count * self.integration_time()
+
+    def handle(self, line):
+        """1行のコマンドを処理（';'で区切った複合コマンドの応答は';'で連結する）
+
+        Args:
+            line (bytes): 受信したコマンド（終端文字を除く）
+
+        Returns:
+            bytes: 応答（応答がない場合はNone）
+        """
+        replies = []
+        for command in line.decode(errors='replace').split(';'):
+            reply = self._handle_command(command.strip())
+            if reply:
+                replies.append(reply)
+        if not replies:
+            return None
+        if len(replies) == 1:
+            return replies[0]
+        return b';'.join(reply.rstrip(b'\n') for reply in replies) + b'\n'
+
+    def _handle_command(self, command):
+        """1つのコマンドを処理"""
+        if not command:
+            return None
+        upper = command.upper().lstrip(':')
+        if upper.startswith('SENS:'):
+            upper = upper[len('SENS:'):]
+        head, _, arg = upper.partition(' ')
+        arg = arg.strip()
+
+        if head == '*RST':
+            self.reset()
+        elif head == '*IDN?':
+            return "KEITHLEY INSTRUMENTS INC.,{},{},A19".format(self.model, self.serial_number).encode() + b'\n'
+        elif head == '*OPC?':
+            wait = self.busy_until - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            return b'1\n'
+        elif head in ('FETCH?', 'FETC?', 'READ?'):
+            time.sleep(self.integration_time())
+            return self._format(self._reading())
+        elif head == 'FUNC':
+            self.settings['FUNC'] = self._function_reply(arg.strip('\'"'))
+        elif head == 'FUNC?':
+            return self.settings['FUNC'].encode() + b'\n'
+        elif head.endswith(':NPLC'):
+            self.settings['NPLC'] = float(arg)
+        elif head.endswith(':NPLC?'):
+            return "{:+.6E}".format(self.settings['NPLC']).encode() + b'\n'
+        elif head.endswith(':RANG:AUTO'):
+            self.settings['RANG:AUTO'] = 1 if arg in ('ON', '1') else 0
+        elif head.endswith(':RANG:AUTO?'):
+            return str(self.settings['RANG:AUTO']).encode() + b'\n'
+        elif head.endswith(':RANG'):
+            self.settings['RANG'] = float(arg)
+            self.settings['RANG:AUTO'] = 0
+        elif head.endswith(':RANG?'):
+            return "{:+.6E}".format(self.settings['RANG']).encode() + b'\n'
+        elif head == 'INIT:CONT':
+            self.settings['INIT:CONT'] = 1 if arg in ('ON', '1') else 0
+        elif head == 'INIT:CONT?':
+            return str(self.settings['INIT:CONT']).encode() + b'\n'
+        elif head == 'INIT':
+            self._run_burst()
+        elif head == 'FORM:DATA':
+            short = arg.split(',')[0][:3]
+            self.data_format = {'ASC': 'ASCII', 'SRE': 'SREAL', 'DRE': 'DREAL'}[short]
+        elif head == 'FORM:DATA?':
+            return self.data_format[:3].encode() + b'\n'
+        elif head == 'FORM:ELEM?':
+            return ",".join(self.elements).encode() + b'\n'
+        elif head == 'SAMP:COUN?':
+            return str(self.sample_count).encode() + b'\n'
+        elif head == 'FORM:BORD':
+            self.byte_order = arg[:4]
+        elif head == 'FORM:ELEM':
+            self.elements = [e.strip()[:4] for e in arg.split(',')]
+        elif head == 'SAMP:COUN':
+            self.sample_count = int(arg)
+        elif head == 'TRAC:POIN':
+            self.trace_points = int(arg)
+        elif head in ('TRAC:CLE', 'TRAC:CLEAR'):
+            self.trace = []
+        elif head == 'TRAC:FEED':
+            self.trace_feed = arg
+        elif head == 'TRAC:FEED:CONT':
+            self.trace_control = arg
+        elif head == 'TRAC:DATA?':
+            values = []
+            for reading, stamp in self.trace:
+                values.append(reading)
+                if 'TST' in self.elements:
+                    values.append(stamp)
+            return self._format(values)
+        # TRIG:SOUR, TRIG:COUN, ABORなどは受け付けるだけ
+        return None
+
+class ChinoSim:
+    """Chino温度制御器の通信（STX/ETXフレーム）を模擬するクラス"""
+    def __init__(self, cell, program_items=PROGRAM_ITEMS):
+        """
+        Args:
+            cell (CellModel): セルのモデル
+            program_items (dict): プログラム運転の項目番号
+        """
+        self.cell = cell
+        self.program_items = program_items
+        self.checksum = ChinoController(port=None).calculate_checksum
+        self.program_start = None
+        self.program_segments = {}
+        self.program_count = 0
+
+    def _frame(self, text):
+        return STX + text.encode() + ETX + self.checksum(text).encode() + b'\r\n'
+
+    def _program(self):
+        return [self.program_segments.get(i, {'target': self.program_start, 'minutes': 0.0})
+                for i in range(1, self.program_count + 1)]
+
+    def _write(self, item, number, value):
+        """書き込みコマンドの処理"""
+        items = self.program_items
+        if item == 4:
+            self.cell.set_sv(float(value))
+        elif item == items['start_sv']:
+            self.program_start = float(value)
+        elif item == items['segment_sv']:
+            self.program_segments.setdefault(number, {'target': 0.0, 'minutes': 0.0})['target'] = float(value)
+        elif item == items['segment_time']:
+            self.program_segments.setdefault(number, {'target': 0.0, 'minutes': 0.0})['minutes'] = float(value)
+        elif item == items['segment_count']:
+            self.program_count = int(float(value))
+        elif item == items['run']:
+            if int(float(value)) == 1:
+                self.cell.run_program(self.program_start, self._program())
+            else:
+                self.cell.stop_program()
+
+    def handle(self, line):
+        """1フレームを処理
+
+        Args:
+            line (bytes): 受信したフレーム（LFを除く）
+
+        Returns:
+            bytes: 応答フレーム（フレームが不正な場合はNone）
+        """
+        stx = line.rfind(STX)
+        etx = line.rfind(ETX)
+        if stx < 0 or etx < stx:
+            return None
+        text = line[stx + 1:etx].decode(errors='replace')
+        if line[etx + 1:etx + 3].decode(errors='replace') != self.checksum(text):
+            return None
+        fields = [f.strip() for f in text.split(',')]
+        if fields[:2] == ['1', '1']:
+            state = self.cell.state()
+            reply = ['', '', '', '', '', '', '']
+            # 従来のc[14:23]の切り出しとも一致する桁位置
+            reply[0], reply[1], reply[2], reply[3] = ' 1', ' 1', '  0', ' 0'
+            reply[PV_FIELD] = "{:+9.2f}".format(state['furnace_temperature'])
+            reply[SV_FIELD] = "{:+9.2f}".format(state['sv'])
+            reply[6] = '0'
+            return self._frame(",".join(reply) + ",")
+        if fields[0] == '2' and len(fields) >= 4:
+            self._write(int(fields[1]), int(fields[2]), fields[3])
+            return self._frame(" 2,{:>2},0,".format(fields[1]))
+        return self._frame(" {},99,".format(fields[0]))
@@ -0,0 +1,81 @@
+import os
+import random
+import select
+import threading
+import time
+import tty
+from DTAmodule.trace import tracer
+
+class PtyDevice:
+    """擬似端末（pty）で機器の通信を模擬するクラス
+
+    スレーブ側のパス（port）をシリアルポートとして開くと、終端文字までの
+    受信データをhandlerに渡し、その戻り値を応答として返す。
+    """
+    def __init__(self, name, handler, terminator=b'\n', latency=0.0, jitter=0.0):
+        """
+        Args:
+            name (str): 機器名
+            handler (callable): 受信データ（bytes, 終端文字を除く）→ 応答（bytesまたはNone）
+            terminator (bytes): 受信データの終端文字
+            latency (float): 応答までの遅延（秒）
+            jitter (float): 遅延のばらつき（秒）
+        """
+        self.name = name
+        self.handler = handler
+        self.terminator = terminator
+        self.latency = latency
+        self.jitter = jitter
+        self.master_fd, self.slave_fd = os.openpty()
+        # エコーや改行変換をしないようスレーブ側をrawに設定
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """応答スレッドを開始"""
+        self.running = True
+        self.thread = threading.Thread(target=self._serve_loop, name="sim_{}".format(self.name))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """応答スレッドを停止してptyを閉じる"""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _serve_loop(self):
+        """受信データを処理するループ"""
+        buf = bytearray()
+        while self.running:
+            readable, _, _ = select.select([self.master_fd], [], [], 0.1)
+            if not readable:
+                continue
+            try:
+                buf += os.read(self.master_fd, 4096)
+            except OSError:
+                continue
+            while True:
+                index = buf.find(self.terminator)
+                if index < 0:
+                    break
+                line = bytes(buf[:index])
+                del buf[:index + len(self.terminator)]
+                try:
+                    reply = self.handler(line)
+                except Exception as e:
+                    tracer.error("シミュレーター({})エラー: {}".format(self.name, e))
+                    reply = None
+                if reply:
+                    delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+                    if delay > 0:
+                        time.sleep(delay)
+                    os.write(self.master_fd, reply)
@@ -0,0 +1,120 @@
+import argparse
+import os
+import time
+from DTAmodule.simulator.cell_model import CellModel
+from DTAmodule.simulator.instruments import KeithleySim, ChinoSim, PROGRAM_ITEMS
+from DTAmodule.simulator.pty_device import PtyDevice
+from DTAmodule.simulator import fake_gpiod
+
+# 機器名 → 実機での既定ポート名（link_dirにこの名前でリンクを作る）
+DEFAULT_PORT_NAMES = {
+    'k2000_pressure': 'ttyUSB0',
+    'chino': 'ttyUSB1',
+    'k2000_temperature': 'ttyUSB2',
+    'k2182a': 'ttyUSB3'
+}
+
+class SimulatedRig:
+    """測定装置一式のシミュレーター
+
+    Chino、Keithley 2000（温度・圧力）、2182Aをそれぞれptyで模擬し、
+    モーターのGPIOは代替gpiodでセルのモデルに接続する。
+    """
+    def __init__(self, speed=1.0, latency=0.02, jitter=0.01, noise=True, link_dir=None, seed=None):
+        """
+        Args:
+            speed (float): 時間の倍率（昇降温と積分時間が速く進む）
+            latency (float): 各機器の応答遅延（秒）
+            jitter (float): 応答遅延のばらつき（秒）
+            noise (bool): 測定値に雑音を加えるか
+            link_dir (str, optional): 実機と同じポート名のシンボリックリンクを作るディレクトリ
+            seed (int, optional): 乱数の種
+        """
+        self.cell = CellModel(speed=speed, noise=noise, seed=seed)
+        self.link_dir = link_dir
+        self.devices = {
+            'chino': PtyDevice('chino', ChinoSim(self.cell).handle, latency=latency, jitter=jitter),
+            'k2000_temperature': PtyDevice(
+                'k2000_temperature',
+                KeithleySim(self.cell.thermocouple_voltage, "MODEL 2000", "1000001", speed).handle,
+                latency=latency, jitter=jitter),
+            'k2000_pressure': PtyDevice(
+                'k2000_pressure',
+                KeithleySim(self.cell.pressure_voltage, "MODEL 2000", "1000002", speed).handle,
+                latency=latency, jitter=jitter),
+            'k2182a': PtyDevice(
+                'k2182a',
+                KeithleySim(self.cell.dta_voltage, "MODEL 2182A", "2000001", speed).handle,
+                latency=latency, jitter=jitter)
+        }
+        self.links = []
+
+    @property
+    def chino_program_items(self):
+        """模擬したChinoのプログラム運転の項目番号（ChinoControllerのprogram_items）"""
+        return PROGRAM_ITEMS
+
+    @property
+    def ports(self):
+        """機器名 → ポートのパス"""
+        if self.link_dir is not None:
+            return {name: os.path.join(self.link_dir, DEFAULT_PORT_NAMES[name]) for name in self.devices}
+        return {name: device.port for name, device in self.devices.items()}
+
+    def start(self):
+        """シミュレーターを開始し、gpiodを代替モジュールに置き換える"""
+        fake_gpiod.install(self.cell)
+        for device in self.devices.values():
+            device.start()
+        if self.link_dir is not None:
+            os.makedirs(self.link_dir, exist_ok=True)
+            for name, device in self.devices.items():
+                link = os.path.join(self.link_dir, DEFAULT_PORT_NAMES[name])
+                if os.path.lexists(link):
+                    os.remove(link)
+                os.symlink(device.port, link)
+                self.links.append(link)
+        return self
+
+    def stop(self):
+        """シミュレーターを停止"""
+        for device in self.devices.values():
+            device.stop()
+        for link in self.links:
+            try:
+                os.remove(link)
+            except OSError:
+                pass
+        self.links = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="DTA測定装置シミュレーター")
+    parser.add_argument("--speed", type=float, default=1.0, help="時間の倍率")
+    parser.add_argument("--latency", type=float, default=0.02, help="応答遅延（秒）")
+    parser.add_argument("--no-noise", action="store_true", help="雑音を加えない")
+    parser.add_argument("--link-dir", default=None, help="ポートのシンボリックリンクを作るディレクトリ")
+    args = parser.parse_args()
+
+    with SimulatedRig(speed=args.speed, latency=args.latency, noise=not args.no_noise,
+                      link_dir=args.link_dir) as rig:
+        print("シミュレーターを開始しました（Ctrl+Cで終了）")
+        for name, port in rig.ports.items():
+            print("{}: {}".format(name, port))
+        try:
+            while True:
+                time.sleep(5)
+                state = rig.cell.state()
+                print("SV {:.2f} K / 炉 {:.2f} K / 試料 {:.2f} K / 圧力 {:.3f} MPa".format(
+                    state['sv'], state['furnace_temperature'],
+                    state['sample_temperature'], state['pressure']))
+        except KeyboardInterrupt:
+            print("\nシミュレーターを終了します")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import threading
+import time
+from DTAmodule.trace import tracer
+
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'      # 読み取りに失敗（再接続はまだ行わない）
+STATUS_OFFLINE = 'offline'  # バックグラウンドで再接続中
+
+class DeviceSupervisor:
+    """機器の読み取りを監視し、切断時にバックグラウンドで再接続するクラス
+
+    読み取りがmax_failures回続けて失敗すると再接続中の状態になり、
+    再接続に成功するまで読み取りを行わずに直ちにNoneを返す。
+    再接続は間隔を倍にしながら（最大max_backoff秒）繰り返す。
+    """
+    def __init__(self, name, read, reconnect, max_failures=3, min_backoff=1.0, max_backoff=60.0):
+        """
+        Args:
+            name (str): 機器名
+            read (callable): 値を返す読み取り関数（失敗時はNoneまたは例外）
+            reconnect (callable): 再接続と再初期化を行い、成功した場合Trueを返す関数
+            max_failures (int): 再接続を始めるまでの連続失敗回数
+            min_backoff (float): 最初の再接続までの待ち時間（秒）
+            max_backoff (float): 再接続の間隔の上限（秒）
+        """
+        self.name = name
+        self.read_function = read
+        self.reconnect_function = reconnect
+        self.max_failures = max_failures
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.offline = False
+        self.failures = 0
+        self.last_error = None
+        self.reconnects = 0
+
+    @property
+    def status(self):
+        """現在の状態（STATUS_OK, STATUS_ERROR, STATUS_OFFLINE）"""
+        if self.offline:
+            return STATUS_OFFLINE
+        return STATUS_ERROR if self.failures else STATUS_OK
+
+    @property
+    def online(self):
+        return not self.offline
+
+    def read(self):
+        """値を読み取る（再接続中は待たずにNoneを返す）
+
+        Returns:
+            読み取り関数の戻り値
+            None: 読み取りに失敗した場合、または再接続中の場合
+        """
+        if self.offline:
+            return None
+        try:
+            value = self.read_function()
+        except Exception as e:
+            self.last_error = str(e)
+            value = None
+        if value is None:
+            self.failures += 1
+            if self.failures >= self.max_failures:
+                self._start_reconnect()
+        else:
+            self.failures = 0
+        return value
+
+    def _start_reconnect(self):
+        """再接続スレッドを開始"""
+        with self.lock:
+            if self.offline or self.stop_event.is_set():
+                return
+            self.offline = True
+            tracer.warning("{}の読み取りが{}回失敗しました。再接続します".format(self.name, self.failures))
+            self.thread = threading.Thread(target=self._reconnect_loop,
+                                           name="reconnect_{}".format(self.name))
+            self.thread.daemon = True
+            self.thread.start()
+
+    def _reconnect_loop(self):
+        """再接続に成功するまで間隔を延ばしながら繰り返す"""
+        backoff = self.min_backoff
+        while not self.stop_event.wait(backoff):
+            try:
+                connected = self.reconnect_function()
+            except Exception as e:
+                self.last_error = str(e)
+                connected = False
+            if connected:
+                with self.lock:
+                    self.failures = 0
+                    self.reconnects += 1
+                    self.offline = False
+                tracer.info("{}に再接続しました".format(self.name))
+                return
+            tracer.warning("{}の再接続に失敗しました（{:.0f}秒後に再試行）".format(
+                self.name, min(backoff * 2, self.max_backoff)))
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def stop(self):
+        """再接続を停止"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5.0)
+
+def sample_status(sample, supervisors):
+    """サンプリング結果の状態を1つの文字列にまとめる
+
+    Args:
+        sample (dict): ConcurrentSampler.sample()の戻り値
+        supervisors (dict): 機器名 → DeviceSupervisor
+
+    Returns:
+        str: 全て取得できた場合は'ok'、それ以外は'機器名=状態'を'|'で連結した文字列
+    """
+    flags = []
+    for name, value in sample['values'].items():
+        if value is not None:
+            continue
+        supervisor = supervisors.get(name)
+        if supervisor is not None and supervisor.offline:
+            flags.append("{}={}".format(name, STATUS_OFFLINE))
+        elif sample['errors'].get(name) == "タイムアウト":
+            flags.append("{}=timeout".format(name))
+        else:
+            flags.append("{}={}".format(name, STATUS_ERROR))
+    return "|".join(flags) if flags else STATUS_OK
@@ -0,0 +1,144 @@
+import atexit
+import collections
+import json
+import os
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR', OFF: 'OFF'}
+
+DEFAULT_TRACE_FILE = os.path.join(os.path.expanduser("~"), ".dta", "trace.jsonl")
+
+def _noop(*args, **kwargs):
+    pass
+
+def parse_level(level):
+    """'debug'などの名前または数値をレベルに変換"""
+    if isinstance(level, int):
+        return level
+    for value, name in LEVEL_NAMES.items():
+        if name == str(level).upper():
+            return value
+    raise ValueError("未対応のレベルです: {}".format(level))
+
+class Tracer:
+    """レベル付きのトレース
+
+    INFO以上のメッセージはこれまでのprintと同じように画面に表示する。
+    DEBUGを有効にすると、全ての記録をリングバッファに溜めて
+    バックグラウンドのスレッドでJSONLファイルに書き出す。
+    無効なレベルのメソッドは何もしない関数に置き換えるため、
+    呼び出し側の負荷はほぼない（引数の計算が重い場合はdebug_enabledを確認する）。
+    """
+    def __init__(self, level=INFO, path=None, buffer_size=10000, flush_interval=1.0):
+        """
+        Args:
+            level (int or str): 記録するレベル
+            path (str, optional): DEBUG時の書き出し先。省略時はDEFAULT_TRACE_FILE
+            buffer_size (int): リングバッファの大きさ（あふれた記録は古い順に捨てる）
+            flush_interval (float): 書き出しの間隔（秒）
+        """
+        self.path = path
+        self.buffer = collections.deque(maxlen=buffer_size)
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.set_level(level)
+
+    def set_level(self, level):
+        """記録するレベルを変更"""
+        self.level = parse_level(level)
+        self.debug_enabled = self.level <= DEBUG
+        self.debug = self._debug if self.level <= DEBUG else _noop
+        self.info = self._info if self.level <= INFO else _noop
+        self.warning = self._warning if self.level <= WARNING else _noop
+        self.error = self._error if self.level <= ERROR else _noop
+        if self.debug_enabled:
+            self._start_flusher()
+
+    def configure(self, level=None, path=None):
+        """レベルと書き出し先を設定（環境変数DTA_TRACE, DTA_TRACE_FILEが既定値）"""
+        if path is not None or os.environ.get("DTA_TRACE_FILE"):
+            self.path = os.path.abspath(path or os.environ["DTA_TRACE_FILE"])
+        self.set_level(level or os.environ.get("DTA_TRACE", "INFO"))
+
+    def _record(self, level, message, fields):
+        if not self.debug_enabled:
+            return
+        record = {
+            't': time.time(),
+            'level': LEVEL_NAMES[level],
+            'thread': threading.current_thread().name,
+            'msg': message
+        }
+        record.update(fields)
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(record)
+
+    def _debug(self, message, **fields):
+        self._record(DEBUG, message, fields)
+
+    def _info(self, message, **fields):
+        print(message)
+        self._record(INFO, message, fields)
+
+    def _warning(self, message, **fields):
+        print(message)
+        self._record(WARNING, message, fields)
+
+    def _error(self, message, **fields):
+        print(message)
+        self._record(ERROR, message, fields)
+
+    def _start_flusher(self):
+        """書き出しスレッドを開始"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._flush_loop, name="trace_flush")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _flush_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """バッファの記録をファイルに書き出す"""
+        with self.lock:
+            records = []
+            while self.buffer:
+                records.append(self.buffer.popleft())
+            if not records:
+                return
+            path = self.path or DEFAULT_TRACE_FILE
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "a") as f:
+                    f.write("".join(json.dumps(record, ensure_ascii=False, default=str) + "\n"
+                                    for record in records))
+            except Exception as e:
+                print("トレースの書き出しエラー: {}".format(e))
+
+    def close(self):
+        """書き出しスレッドを停止し、残りの記録を書き出す"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5.0)
+            self.thread = None
+        self.flush()
+
+# プロセス全体で共有するトレース
+tracer = Tracer()
+
+atexit.register(tracer.close)
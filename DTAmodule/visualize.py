@@ -3,8 +3,12 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import os
+from DTAmodule.results_loader import load_results
 
 class DTAVisualizer:
+    # グラフに使う列（1回の読み込みで全てのグラフの列を読む）
+    plot_columns = ['set Temp. / K', 'time / s', 'dt of Kei2182A/K', 'Pressure / MPa']
+
     def __init__(self, save_dir="Experiment_result/plots"):
         """DTAデータの可視化クラス
         
@@ -15,12 +19,24 @@ class DTAVisualizer:
         os.makedirs(save_dir, exist_ok=True)
         
         # グラフのスタイル設定
-        plt.style.use('seaborn')
+        # matplotlib 3.6以降はseabornのスタイル名が変わった
+        plt.style.use('seaborn-v0_8' if 'seaborn-v0_8' in plt.style.available else 'seaborn')
         self.colors = plt.cm.tab10.colors
         
         # メモリ使用量を抑えるための設定
         plt.rcParams['figure.max_open_warning'] = 10  # 同時に開く図の最大数を制限
         plt.rcParams['figure.dpi'] = 150  # DPIを下げてメモリ使用量を削減
+
+    def load(self, data_file):
+        """データの読み込み（同じファイルは解析済みの結果を再利用する）
+
+        Args:
+            data_file (str): データファイルのパス
+
+        Returns:
+            ResultsData: 読み込んだ結果（frameとmetadata）
+        """
+        return load_results(data_file, self.plot_columns)
     
     def plot_dta_curve(self, data_file, save_name=None):
         """DTA曲線をプロット
@@ -30,7 +46,8 @@ class DTAVisualizer:
             save_name (str, optional): 保存するファイル名
         """
         # データの読み込み（必要な列のみ）
-        df = pd.read_csv(data_file, sep='\t', usecols=['set Temp. / K', 'time / s', 'dt of Kei2182A/K', 'Sample Name'])
+        data = self.load(data_file)
+        df = data.frame
         
         # プロットの作成
         fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(8, 10), sharex=True)
@@ -51,8 +68,7 @@ class DTAVisualizer:
         ax2.grid(True)
         
         # タイトルの設定
-        sample_name = df['Sample Name'].iloc[0]
-        plt.suptitle('DTA Curve - {}'.format(sample_name))
+        plt.suptitle('DTA Curve - {}'.format(data.sample_name))
         
         # グラフの保存
         if save_name is None:
@@ -68,7 +84,8 @@ class DTAVisualizer:
             save_name (str, optional): 保存するファイル名
         """
         # データの読み込み（必要な列のみ）
-        df = pd.read_csv(data_file, sep='\t', usecols=['set Temp. / K', 'time / s', 'pressure', 'Sample Name'])
+        data = self.load(data_file)
+        df = data.frame
         
         # プロットの作成
         fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(8, 10), sharex=True)
@@ -81,7 +98,7 @@ class DTAVisualizer:
         ax1.grid(True)
         
         # 圧力プロット
-        ax2.plot(df['time / s'], df['pressure'], 
+        ax2.plot(df['time / s'], df['Pressure / MPa'], 
                 label='Pressure', color=self.colors[2])
         ax2.set_xlabel('Time (s)')
         ax2.set_ylabel('Pressure (MPa)')
@@ -89,8 +106,7 @@ class DTAVisualizer:
         ax2.grid(True)
         
         # タイトルの設定
-        sample_name = df['Sample Name'].iloc[0]
-        plt.suptitle('Pressure-Temperature Profile - {}'.format(sample_name))
+        plt.suptitle('Pressure-Temperature Profile - {}'.format(data.sample_name))
         
         # グラフの保存
         if save_name is None:
@@ -106,7 +122,8 @@ class DTAVisualizer:
             save_name (str, optional): 保存するファイル名
         """
         # データの読み込み（必要な列のみ）
-        df = pd.read_csv(data_file, sep='\t', usecols=['set Temp. / K', 'pressure', 'dt of Kei2182A/K', 'time / s', 'Sample Name'])
+        data = self.load(data_file)
+        df = data.frame
         
         # データのサンプリング（メモリ使用量削減のため）
         if len(df) > 1000:
@@ -118,7 +135,7 @@ class DTAVisualizer:
         
         # データのプロット
         scatter = ax.scatter(df['set Temp. / K'], 
-                           df['pressure'],
+                           df['Pressure / MPa'],
                            df['dt of Kei2182A/K'],
                            c=df['time / s'],
                            cmap='viridis',
@@ -133,8 +150,7 @@ class DTAVisualizer:
         plt.colorbar(scatter, label='Time (s)')
         
         # タイトルの設定
-        sample_name = df['Sample Name'].iloc[0]
-        plt.title('3D DTA Plot - {}'.format(sample_name))
+        plt.title('3D DTA Plot - {}'.format(data.sample_name))
         
         # グラフの保存
         if save_name is None:
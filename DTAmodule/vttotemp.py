@@ -7,62 +7,233 @@ Original file is located at
     https://colab.research.google.com/drive/17oomPAhIrtTtKWMWu0zGtUMeQFjhXkpZ
 """
 
-#DTA関数
-#-9500<Vt<-8025
-def Region1(Vt):
-  T=2215.71556+.7279584164*Vt+8.6987279178*10**(-5)*Vt**2+3.628145299*10**(-9)*Vt**3
-  return T
-
-#-8025<Vt<-6200
-def Region2(Vt):
-  T=351.9516207+.05462261832*Vt+5.836711682*10**(-6)*Vt**2+3.652376504*10**(-10)*Vt**3
-  return T
-
-#-6200<Vt<-3950
-def Region3(Vt):
-  T=277.3823785+.02011218159*Vt+4.949648236*10**(-7)*Vt**2+8.859387968*10**(-11)*Vt**3
-  return T
-
-#-3950<Vt<-1360
-def Region4(Vt):
-  T=273.5617264+0.01765379968*Vt+7.137919542*10**(-9)*Vt**2+6.116704187*10**(-11)*Vt**3
-  return T
-
-#-1360<Vt<1640
-def Region5(Vt):
-  T=273.1534526+.01705349031*Vt-2.797508035*10**(-7)*Vt**2+1.501272037*10**(-11)*Vt**3
-  return T
-
-#1640<Vt<4840
-def Region6(Vt):
-  T=273.1973681+.01699032605*Vt-2.448421881*10**(-7)*Vt**2+7.25590263*10**(-12)*Vt**3
-  return T
-
-#4840<Vt<8400
-def Region6(Vt):
-  T=273.5651668+.01676422623*Vt-1.976262268*10**(-7)*Vt**2+3.906447737*10**(-12)*Vt**3
-  return T
-
-def Region7(Vt):
-  T=273.5651668+.01676422623*Vt-1.976262268*10**(-7)*Vt**2+3.906447737*10**(-12)*Vt**3
-  return T
+import numpy as np
 
+from DTAmodule import calibration
+
+# 区間ごとの3次式（Region1〜Region7）の係数はcalibrations/dta_thermocouple-v1.jsonにある
+CURVE = calibration.registry.get('dta_thermocouple', 1)
+
+# 各区間の多項式の係数（定数項, 1次, 2次, 3次）
+COEFFICIENTS = CURVE.coefficients
+# 区間の境界（µV）。全ての変換で境界上の値は上側の区間に含める
+# （[下端, 上端)、VT_MAXのみ最後の区間。区間の選び方はCURVE.segments）
+BREAKPOINTS = CURVE.breakpoints
+VT_MIN, VT_MAX = CURVE.domain
+
+#-9500<=Vt<-8025, -8025<=Vt<-6200, -6200<=Vt<-3950, -3950<=Vt<-1360,
+#-1360<=Vt<1640, 1640<=Vt<4840, 4840<=Vt<=8400
 def VtToTemp(Vt):
-  if (Vt>=-9500 and Vt<-8025):
-    return Region1(Vt)
-  elif (Vt>=-8025 and Vt<=-6200):
-    return Region2(Vt)
-  elif (Vt>=-6200 and Vt<=-3950):
-     return Region3(Vt)
-  elif (Vt>=-3950 and Vt<=-1360):
-     return Region4(Vt)
-  elif Vt>=-1360 and Vt<=1640:
-     return Region5(Vt)
-  elif Vt>=1640 and Vt<=4840:
-     return Region6(Vt)
-  elif Vt>=4840 and Vt<=8400:
-     return Region7(Vt)
-    
+  """熱電対電圧（µV）を温度（K）に変換
+
+  Args:
+      Vt (float): 電圧値（µV）
+
+  Returns:
+      float: 温度値（K）。範囲外とNaNはNaN
+  """
+  return CURVE(Vt)
+
+def VtToTempArray(Vt):
+  """熱電対電圧（µV）の配列を温度（K）に一括変換
+
+  np.searchsortedで区間を選び、全区間をHorner法で一度に計算する（CURVE.evaluate）。
+  範囲外（-9500〜8400µV以外）とNaNはNaNになる。区間の選び方はVtToTempと同じ。
+
+  Args:
+      Vt (array_like): 電圧値（µV）
+
+  Returns:
+      numpy.ndarray: 温度値（K）。スカラーを渡した場合は0次元配列
+  """
+  return CURVE.evaluate(Vt)
+
+def _segment_polynomial(segment, v):
+  """区間segmentの多項式の値（Horner法）"""
+  c = COEFFICIENTS[segment]
+  return ((c[..., 3]*v + c[..., 2])*v + c[..., 1])*v + c[..., 0]
+
+class VtToTempTable:
+  """区間ごとの線形補間表による高速なVtToTemp
+
+  格子の間隔を区間の境界の公約数（5µV）の約数にして、どの補間区間も
+  多項式の区間をまたがないようにする。各補間区間の傾きと切片は
+  その区間を含む多項式から求めるため、境界での多項式の段差（最大72mK）を
+  補間でならすことはない。
+  境界上の値の扱いはVtToTempと同じ（上側の区間）。
+
+  線形補間の誤差は h**2/8 * max|T''| 以下で、T''は各区間で1次式なので
+  補間区間の両端で最大になる。error_boundはこの値の全区間での最大値。
+  """
+  def __init__(self, max_error=1e-4):
+    """
+    Args:
+        max_error (float): 許容する最大誤差（K）。これを満たす最も粗い格子を選ぶ
+    """
+    divisor = 1
+    while True:
+      step = 5.0 / divisor
+      bound = self._error_bound(step)
+      if bound <= max_error:
+        break
+      divisor += 1
+    self.step = step
+    self.error_bound = bound
+    self.count = int(round((VT_MAX - VT_MIN) / step))
+    self.nodes = VT_MIN + step*np.arange(self.count + 1)
+    left = self.nodes[:-1]
+    segment = self._segments(left)
+    start = _segment_polynomial(segment, left)
+    end = _segment_polynomial(segment, self.nodes[1:])
+    self.intercepts = start
+    self.slopes = (end - start) / step
+    # 1点用の変換関数（NumPyのスカラー演算や属性参照を避けて高速にする）
+    self.lookup = self._make_lookup()
+
+  @staticmethod
+  def _segments(v):
+    """多項式の区間番号（境界上の値は上側）"""
+    return CURVE.segments(v)
+
+  @classmethod
+  def _error_bound(cls, step):
+    """間隔stepの線形補間の誤差の上限（K）"""
+    nodes = VT_MIN + step*np.arange(int(round((VT_MAX - VT_MIN) / step)) + 1)
+    segment = cls._segments(nodes[:-1])
+    c = COEFFICIENTS[segment]
+    second = np.maximum(np.abs(2*c[:, 2] + 6*c[:, 3]*nodes[:-1]),
+                        np.abs(2*c[:, 2] + 6*c[:, 3]*nodes[1:]))
+    return float(np.max(second)) * step**2 / 8
+
+  def _make_lookup(self):
+    """1点用の変換関数を作成"""
+    intercepts = self.intercepts.tolist()
+    slopes = self.slopes.tolist()
+    nodes = self.nodes.tolist()
+    count = self.count
+    step = self.step
+    nan = float('nan')
+
+    def lookup(Vt):
+      """1点を変換
+
+      Args:
+          Vt (float): 電圧値（µV）
+
+      Returns:
+          float: 温度値（K）。範囲外とNaNはNaN
+      """
+      # 格子点の電圧では割り算の結果が正確に整数になる
+      x = (Vt - VT_MIN) / step
+      if not 0 <= x <= count:
+        return nan
+      i = int(x)
+      if i == x:
+        # 格子点のすぐ下の値は丸めで整数になることがあるため区間を確認
+        if i == count or Vt < nodes[i]:
+          i -= 1
+      return intercepts[i] + slopes[i] * (Vt - nodes[i])
+
+    return lookup
+
+  def __call__(self, Vt):
+    return self.lookup(Vt)
+
+  def evaluate(self, Vt):
+    """配列を一括変換
+
+    Args:
+        Vt (array_like): 電圧値（µV）
+
+    Returns:
+        numpy.ndarray: 温度値（K）。範囲外とNaNはNaN
+    """
+    v = np.asarray(Vt, dtype=np.float64)
+    valid = (v >= VT_MIN) & (v <= VT_MAX)
+    v_valid = np.where(valid, v, VT_MIN)
+    i = np.clip(np.floor((v_valid - VT_MIN) / self.step).astype(np.int64), 0, self.count - 1)
+    # 格子点付近の丸めで隣の補間区間を選ばないよう補正
+    i -= v_valid < self.nodes[i]
+    i += (i + 1 < self.count) & (v_valid >= self.nodes[np.minimum(i + 1, self.count)])
+    T = self.intercepts[i] + self.slopes[i] * (v - self.nodes[i])
+    return np.where(valid, T, np.nan)
+
+  def certify(self, points_per_step=16):
+    """多項式（VtToTempArray）との差を密に評価し、error_bound以内であることを確認
+
+    境界の上下の値も評価する。
+
+    Args:
+        points_per_step (int): 格子1区間あたりの評価点数
+
+    Returns:
+        float: 評価した点での最大誤差（K）
+
+    Raises:
+        AssertionError: 誤差がerror_boundを超えた場合
+    """
+    v = np.linspace(VT_MIN, VT_MAX, self.count*points_per_step + 1)
+    v = np.concatenate([v, BREAKPOINTS, np.nextafter(BREAKPOINTS, -np.inf)])
+    exact = VtToTempArray(v)
+    error = float(np.max(np.abs(self.evaluate(v) - exact)))
+    # 丸め誤差の分だけ余裕を持たせる
+    assert error <= self.error_bound + 1e-9, \
+      "補間誤差 {} K が上限 {} K を超えました".format(error, self.error_bound)
+    return error
+
+# 既定の補間表（作成は数ms）
+default_table = VtToTempTable()
+
+# 補間表による1点用のVtToTemp（誤差0.1mK以下、範囲外はNaN）
+VtToTempFast = default_table.lookup
+
+def get_converter(method='polynomial'):
+  """1点用の変換関数を取得
+
+  Args:
+      method (str): 'polynomial'（多項式）または'table'（補間表）
+
+  Returns:
+      callable: 電圧値（µV）→ 温度値（K）。範囲外はNaN
+  """
+  if method == 'polynomial':
+    return lambda Vt: float(VtToTempArray(Vt))
+  if method == 'table':
+    return VtToTempFast
+  raise ValueError("未対応の変換方法です: {}".format(method))
+
+# 区間の端（µV）と、各区間の多項式による両端の温度（K）
+SEGMENT_EDGES = CURVE.edges
+SEGMENT_TEMPERATURES = CURVE.ranges
+
+def TempToVtArray(T, iterations=3):
+  """温度（K）の配列を熱電対電圧（µV）に一括変換（VtToTempの逆関数）
+
+  区間の境界では多項式に段差（最大72mK）があり、同じ温度になる電圧が
+  2つある場合がある。その場合は低い方の電圧を返すため、
+  「電圧が閾値を超えたら温度も上限を超えている可能性がある」という
+  安全側の判定に使える（計算はCURVE.inverse）。
+
+  Args:
+      T (array_like): 温度値（K）
+      iterations (int): Newton法の反復回数
+
+  Returns:
+      numpy.ndarray: 電圧値（µV）。範囲外とNaNはNaN
+  """
+  return CURVE.inverse(T, iterations)
+
+def TempToVt(T):
+  """温度（K）を熱電対電圧（µV）に変換（VtToTempの逆関数）
+
+  Args:
+      T (float): 温度値（K）
+
+  Returns:
+      float: 電圧値（µV）。範囲外はNaN
+  """
+  return float(TempToVtArray(T))
+
 # import Keigetpv
 # import time
 # while True:
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+from DTAmodule import vttotemp
+
+def benchmark(func, values, repeat=3):
+    """1点あたりの処理時間（µs）を測定（最速の回を採用）"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(values)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(values) * 1e6
+
+def main():
+    """VtToTempの各実装の速度と補間表の誤差を確認"""
+    rng = np.random.default_rng(0)
+    values = rng.uniform(vttotemp.VT_MIN, vttotemp.VT_MAX, 200000)
+    scalar_values = values[:20000].tolist()
+
+    start = time.perf_counter()
+    table = vttotemp.VtToTempTable()
+    build_time = time.perf_counter() - start
+    print("補間表: 間隔 {} µV, {}区間, 作成 {:.1f} ms".format(
+        table.step, table.count, build_time * 1000))
+    print("誤差の上限: {:.3e} K, 評価した最大誤差: {:.3e} K".format(
+        table.error_bound, table.certify()))
+
+    print("\n1点ずつ（µs/点）")
+    print("  多項式 VtToTemp:      {:.3f}".format(
+        benchmark(lambda v: [vttotemp.VtToTemp(x) for x in v], scalar_values)))
+    print("  補間表 VtToTempFast:  {:.3f}".format(
+        benchmark(lambda v: [vttotemp.VtToTempFast(x) for x in v], scalar_values)))
+
+    print("\n配列（µs/点）")
+    print("  多項式 VtToTempArray: {:.4f}".format(benchmark(vttotemp.VtToTempArray, values)))
+    print("  補間表 evaluate:      {:.4f}".format(benchmark(table.evaluate, values)))
+
+    # 逆変換: 温度 → 電圧 → 温度が一致するか確認
+    # （区間の境目で電圧が逆戻りする範囲は低い方の電圧を返すため、電圧 → 温度 → 電圧は一致しない）
+    t_min = vttotemp.SEGMENT_TEMPERATURES[0][0]
+    t_max = vttotemp.SEGMENT_TEMPERATURES[-1][1]
+    temps = rng.uniform(t_min, t_max, 200000)
+    round_trip = vttotemp.VtToTempArray(vttotemp.TempToVtArray(temps))
+    print("\n逆変換 TempToVtArray: {:.4f} µs/点, 往復の最大誤差 {:.3e} K".format(
+        benchmark(vttotemp.TempToVtArray, temps), np.max(np.abs(round_trip - temps))))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# test/から実行してもDTAmoduleを読み込めるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 実機（シリアルポートとKeigetpv）が必要なスクリプトはpytestでは実行しない
+collect_ignore = ["test_devices.py"]
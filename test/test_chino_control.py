@@ -0,0 +1,45 @@
+import time
+from DTAmodule.chino_control import ChinoController
+
+class RecordingChino(ChinoController):
+    """書き込んだ設定値を記録する（シリアルポートを使わない）"""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.written = []
+
+    def transact(self, command, timeout=None):
+        self.written.append(command.split(",")[3])
+        return []
+
+def test_unchanged_value_is_not_written():
+    chino = RecordingChino(min_write_interval=0.0)
+    assert chino.set_temperature(300.0) is True
+    assert chino.set_temperature(300.01) is False
+    assert chino.written == ["300.0"]
+
+def test_value_within_interval_is_written_later():
+    """間隔内の値は捨てずに、間隔が空いた時点で書き込む"""
+    chino = RecordingChino(min_write_interval=0.05)
+    chino.set_temperature(300.0)
+    assert chino.set_temperature(300.5) is False
+    assert chino.written == ["300.0"]
+    time.sleep(0.2)
+    assert chino.written == ["300.0", "300.5"]
+    assert chino.pending_sv is None
+
+def test_only_latest_pending_value_is_written():
+    chino = RecordingChino(min_write_interval=0.05)
+    chino.set_temperature(300.0)
+    chino.set_temperature(300.3)
+    chino.set_temperature(300.6)
+    time.sleep(0.2)
+    assert chino.written == ["300.0", "300.6"]
+
+def test_forced_write_cancels_pending_value():
+    """強制の書き込み（緊急停止）の後に保留していた値で上書きしない"""
+    chino = RecordingChino(min_write_interval=0.05)
+    chino.set_temperature(350.0)
+    chino.set_temperature(351.0)
+    chino.set_temperature(298.0, force=True)
+    time.sleep(0.2)
+    assert chino.written == ["350.0", "298.0"]
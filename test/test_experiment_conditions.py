@@ -0,0 +1,27 @@
+import pytest
+from DTAmodule.experiment_conditions import ExperimentConditions
+
+HEADER = "Sample Name,Experimenter,Start Temperature,End Temperature,Heating Rate,Wait Time,Pressure,Pressure Tolerance\n"
+
+def test_parse_experiment_conditions(tmp_path, monkeypatch):
+    """行番号を添字とし、向きは温度から、待機は秒、変化率はK/sで返す"""
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "ExpCond_1.csv"
+    path.write_text(HEADER + "S,me,300,310,2,1,10,5\nS,me,310,300,2,0.5,20,5\n")
+    Tsv, Tf, rate, wait, dt, pressure, tolerance, timeExp = \
+        ExperimentConditions().parse_experiment_conditions(str(path))
+    assert Tsv[1:] == [300.0, 310.0]
+    assert Tf[1:] == [310.0, 300.0]
+    assert rate[1:] == [2.0, -2.0]
+    assert wait[1:] == [60.0, 30.0]
+    assert dt[1:] == pytest.approx([2.0 / 60, -2.0 / 60])
+    assert pressure[1:] == [10.0, 20.0]
+    assert tolerance[1:] == [5.0, 5.0]
+    assert timeExp == pytest.approx(5 + 1 + 5 + 0.5)
+
+def test_zero_rate_raises(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "ExpCond_1.csv"
+    path.write_text(HEADER + "S,me,300,310,0,1,10,5\n")
+    with pytest.raises(ValueError):
+        ExperimentConditions().parse_experiment_conditions(str(path))
@@ -0,0 +1,77 @@
+import os
+from DTAmodule.column_store import ColumnWriter
+from DTAmodule.journal import Journal, recover, recover_results, resume_state
+from DTAmodule.results_index import ResultsIndexWriter, load_run
+from DTAmodule.results_loader import RESULT_COLUMNS, parse_results
+from DTAmodule.results_writer import ResultsWriter
+
+ROW_FORMAT = ",".join("{}" for _ in RESULT_COLUMNS) + "\n"
+NAMES = [name for name, _ in RESULT_COLUMNS]
+
+def row(i):
+    return (300.0 + i, float(i), 1.0, 2.0, 0.1, 0.2, 'Heat' if i < 50 else 'Cool', 1 + i // 50, 0.5, 'OK')
+
+def state(i):
+    return {'k': 1 + i // 50, 'Tsvtemp': 300.0 + i, 't0': 0.0, 't4': None}
+
+def write_results(directory, rows):
+    """ジャーナルと列形式のデータ・索引を使って結果ファイルを書く"""
+    path = os.path.join(str(directory), "Results.csv")
+    with open(path, 'w') as f:
+        f.write(",".join(NAMES) + "\n")
+    writer = ResultsWriter(path, ROW_FORMAT, flush_rows=7,
+                           journal=Journal(path + ".journal", truncate=True), checkpoint_rows=20,
+                           columns=ColumnWriter(path + ".columns", RESULT_COLUMNS),
+                           index=ResultsIndexWriter(path + ".index", NAMES, time_bucket=30))
+    for i in range(rows):
+        writer.write(row(i), state=state(i))
+    writer.close()
+    return path
+
+def open_outputs(path):
+    return ColumnWriter(path + ".columns", RESULT_COLUMNS), ResultsIndexWriter(path + ".index", NAMES, time_bucket=30)
+
+def snapshot(path):
+    files = {}
+    for name in [path, path + ".journal", path + ".index"] + [
+            os.path.join(path + ".columns", f) for f in os.listdir(path + ".columns")]:
+        with open(name, 'rb') as f:
+            files[name] = f.read()
+    return files
+
+def test_torn_tail_is_recovered(tmp_path):
+    """途中で止まった結果ファイルとジャーナルから全ての行を復元する"""
+    path = write_results(tmp_path, 95)
+    with open(path, 'r+b') as f:
+        # 最後のチェックポイントの後の行が途中で切れた状態にする
+        f.truncate(os.path.getsize(path) - 50)
+    with open(path + ".journal", 'ab') as f:
+        f.write(b"\x10\x00\x00")
+
+    resumed = recover_results(path + ".journal", path, ROW_FORMAT, *open_outputs(path))
+    assert resumed == state(94)
+    data = parse_results(path)
+    assert len(data) == 95
+    assert list(data['time / s']) == [float(i) for i in range(95)]
+    assert len(load_run(path, 2)) == 45
+    # 壊れた末尾は切り捨てられている
+    checkpoint, rows = recover(path + ".journal")
+    assert checkpoint is not None and 0 < len(rows) < 20
+
+def test_resume_state_does_not_modify_files(tmp_path):
+    """再開の確認に使うresume_stateはファイルを変更しない"""
+    path = write_results(tmp_path, 60)
+    with open(path, 'ab') as f:
+        f.write(b"301.0,1.0,")
+    with open(path + ".journal", 'ab') as f:
+        f.write(b"\x10\x00")
+    before = snapshot(path)
+    assert resume_state(path + ".journal") == state(59)
+    assert snapshot(path) == before
+
+def test_no_checkpoint(tmp_path):
+    path = str(tmp_path / "Results.csv")
+    open(path, 'w').close()
+    Journal(path + ".journal", truncate=True).close()
+    assert resume_state(path + ".journal") is None
+    assert recover_results(path + ".journal", path, ROW_FORMAT) is None
@@ -0,0 +1,32 @@
+import pytest
+from DTAmodule.keithley_control import (Keithley2000Temperature, Keithley2182A, apply_settings,
+                                        normalize_setting, query_settings)
+from DTAmodule.simulator.instruments import KeithleySim
+
+def test_normalize_setting_forms():
+    """引用符、大文字小文字、短縮形と省略できるノードの違いを無視する"""
+    assert normalize_setting("'VOLT:DC'") == normalize_setting('"VOLT:DC"')
+    assert normalize_setting("'VOLT:DC'") == normalize_setting('"VOLT"')
+    assert normalize_setting("'VOLT:DC'") == normalize_setting('"voltage:dc"')
+    assert normalize_setting("ASC") == normalize_setting("ASCII")
+    assert normalize_setting("ON") == normalize_setting("1")
+    assert normalize_setting("1") == normalize_setting("+1.000000E+00")
+    assert normalize_setting("'VOLT:DC'") != normalize_setting('"VOLT:AC"')
+    assert normalize_setting("'VOLT:DC'") != normalize_setting('"TEMP"')
+
+@pytest.mark.parametrize("device, model, function", [
+    (Keithley2000Temperature, "MODEL 2000", '"VOLT:DC"'),
+    (Keithley2182A, "MODEL 2182A", '"VOLT"'),
+])
+def test_configured_instrument_needs_no_changes(device, model, function):
+    """設定済みの機器（シミュレーターの実際の応答）には何も送らない"""
+    sim = KeithleySim(lambda: 0.0, model)
+
+    def send_command(command):
+        reply = sim.handle(command.encode())
+        return reply.decode().strip() if reply else None
+
+    apply_settings(send_command, device.settings, reset=True, reset_wait=0.0)
+    assert send_command("SENS:FUNC?") == function
+    assert query_settings(send_command, device.settings) == []
+    assert apply_settings(send_command, device.settings, reset_wait=0.0) == []
@@ -0,0 +1,91 @@
+import os
+import pandas as pd
+import pytest
+from DTAmodule.results_loader import RESULT_COLUMNS, ResultsCache, parse_results, read_header
+
+ROW_FORMAT = ",".join("{}" for _ in RESULT_COLUMNS) + "\n"
+NAMES = [name for name, _ in RESULT_COLUMNS]
+
+def write_file(path, rows=100, header=None, metadata=True):
+    with open(path, 'w') as f:
+        if metadata:
+            f.write("ID,7\nSample Name,quartz\nCalibration,thermocouple=dta_thermocouple@1\n")
+        f.write(",".join(header or NAMES) + "\n")
+        for i in range(rows):
+            f.write(ROW_FORMAT.format(300.0 + i, float(i), 1.0, 2.0, 0.1, 0.2,
+                                      'Heat' if i % 2 else 'Cool', 1, 0.5, 'OK'))
+
+def test_header_and_metadata(tmp_path):
+    path = str(tmp_path / "Results.csv")
+    write_file(path)
+    header = read_header(path)
+    assert header['delimiter'] == ','
+    assert header['columns'] == NAMES
+    assert header['metadata']['Sample Name'] == 'quartz'
+    data = parse_results(path)
+    assert data.sample_name == 'quartz'
+    assert len(data) == 100
+    assert data.frame['Heat or cool'].dtype == 'category'
+    assert data.frame['Run'].dtype == 'int32'
+
+def test_column_projection(tmp_path):
+    path = str(tmp_path / "Results.csv")
+    write_file(path)
+    data = parse_results(path, ['time / s', 'Pressure / MPa'])
+    assert list(data.frame.columns) == ['time / s', 'Pressure / MPa']
+
+def test_mismatched_header_falls_back_to_schema(tmp_path):
+    """値の数と合わない古いヘッダーはRESULT_COLUMNSで読む"""
+    path = str(tmp_path / "Results.csv")
+    write_file(path, header=["c{}".format(i) for i in range(12)], metadata=False)
+    data = parse_results(path, ['Pressure / MPa'])
+    assert len(data) == 100
+    assert (data['Pressure / MPa'] == 0.5).all()
+
+def test_tab_separated(tmp_path):
+    path = str(tmp_path / "Results.csv")
+    frame = pd.DataFrame({'set Temp. / K': [300.0, 301.0], 'time / s': [0.0, 1.5]})
+    frame.to_csv(path, sep='\t', index=False)
+    data = parse_results(path)
+    assert list(data['time / s']) == [0.0, 1.5]
+
+def test_cache_hits_and_invalidation(tmp_path):
+    path = str(tmp_path / "Results.csv")
+    write_file(path)
+    cache = ResultsCache()
+    first = cache.load(path, ['time / s', 'Pressure / MPa'])
+    assert cache.load(path, ['time / s']) is first
+    assert cache.load(path, ['Pressure / MPa']) is first
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    # 足りない列は既存の列と合わせて読み直す
+    widened = cache.load(path, ['Run'])
+    assert set(widened.frame.columns) == {'time / s', 'Pressure / MPa', 'Run'}
+    assert cache.misses == 2
+
+    # 更新されたファイルは読み直し、古い内容は捨てる
+    write_file(path, rows=120)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert len(cache.load(path, ['time / s'])) == 120
+    assert len(cache.entries) == 1
+
+def test_cache_bounds(tmp_path):
+    cache = ResultsCache(max_entries=2)
+    paths = []
+    for i in range(3):
+        paths.append(str(tmp_path / "{}Results.csv".format(i)))
+        write_file(paths[-1])
+        cache.load(paths[-1])
+    assert len(cache.entries) == 2
+    assert os.path.realpath(paths[0]) not in [key[0] for key in cache.entries]
+
+    small = ResultsCache(max_bytes=1)
+    small.load(paths[0])
+    small.load(paths[1])
+    # 上限を超えても最新の1件は残す
+    assert len(small.entries) == 1
+
+def test_missing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ResultsCache().load(str(tmp_path / "none.csv"))
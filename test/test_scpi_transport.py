@@ -0,0 +1,57 @@
+import pytest
+from DTAmodule.scpi_transport import ScpiTransport, ScpiTimeoutError
+
+class FakeSerial:
+    """コマンドごとの応答を返すシリアルポート（delayedのコマンドは期限切れの後に届く）"""
+    def __init__(self, replies, delayed=()):
+        self.timeout = ScpiTransport.poll_interval
+        self.replies = replies
+        self.delayed = set(delayed)
+        self.buffer = bytearray()
+        self.late = []
+
+    def write(self, data):
+        command = data.decode().strip()
+        if command in self.delayed:
+            self.late.append(self.replies[command])
+        else:
+            self.buffer += self.replies[command]
+
+    def deliver_late(self):
+        """遅れた応答が届く"""
+        for reply in self.late:
+            self.buffer += reply
+        self.late = []
+
+    def read_until(self, terminator):
+        index = self.buffer.find(terminator)
+        end = len(self.buffer) if index < 0 else index + len(terminator)
+        data = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        return data
+
+    def read(self, size):
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def reset_input_buffer(self):
+        self.buffer.clear()
+
+def test_late_reply_is_not_returned_for_next_query():
+    """期限切れの後に届いた応答は次のクエリの応答にならない"""
+    ser = FakeSerial({"MEAS1?": b"1.0\n", "MEAS2?": b"2.0\n"}, delayed={"MEAS1?"})
+    transport = ScpiTransport(ser, timeout=0.05)
+    with pytest.raises(ScpiTimeoutError):
+        transport.query("MEAS1?")
+    ser.deliver_late()
+    assert transport.query("MEAS2?") == "2.0"
+
+def test_late_reply_is_not_read_as_block_header():
+    """期限切れの後に届いた応答がバイナリブロックの前に残っていても読み捨てる"""
+    ser = FakeSerial({"MEAS1?": b"1.0\n", "TRAC:DATA?": b"#14abcd\n"}, delayed={"MEAS1?"})
+    transport = ScpiTransport(ser, timeout=0.05)
+    with pytest.raises(ScpiTimeoutError):
+        transport.query("MEAS1?")
+    ser.deliver_late()
+    assert transport.query_block("TRAC:DATA?", 1) == b"abcd"
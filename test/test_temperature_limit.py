@@ -0,0 +1,84 @@
+import ast
+import os
+import numpy as np
+import pytest
+from DTAmodule import vttotemp
+from DTAmodule.calibration import CalibrationError
+from DTAmodule.emergency_handler import (temperature_limit_microvolts, resolve_temperature_limit,
+                                         TemperatureInterlock, MAX_TEMPERATURE)
+
+DTAMAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "DTAmain.py")
+
+def dtamain_setting(name):
+    """DTAmain.pyの設定値（モジュールの最上位での代入）を読む（DTAmainは機器に接続するためimportしない）"""
+    with open(DTAMAIN, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+                isinstance(target, ast.Name) and target.id == name for target in node.targets):
+            return ast.literal_eval(node.value)
+    raise KeyError(name)
+
+def test_round_trip():
+    """温度 → 電圧 → 温度が一致する"""
+    temps = np.linspace(vttotemp.SEGMENT_TEMPERATURES[0][0], vttotemp.SEGMENT_TEMPERATURES[-1][1], 5001)
+    assert np.max(np.abs(vttotemp.VtToTempArray(vttotemp.TempToVtArray(temps)) - temps)) < 1e-9
+    assert vttotemp.VtToTemp(vttotemp.TempToVt(350.0)) == pytest.approx(350.0, abs=1e-9)
+
+def test_inverse_returns_lower_voltage_in_overlap():
+    """境界の段差で同じ温度になる電圧が2つある場合は低い方を返す"""
+    for k in range(len(vttotemp.BREAKPOINTS)):
+        below = vttotemp.SEGMENT_TEMPERATURES[k][1]
+        above = vttotemp.SEGMENT_TEMPERATURES[k + 1][0]
+        if below <= above:
+            continue
+        T = (below + above) / 2
+        assert vttotemp.TempToVt(T) < vttotemp.BREAKPOINTS[k]
+
+def test_limit_is_safe_side():
+    """閾値の電圧では温度が上限以下で、閾値を超えた電圧では上限以上になりうる"""
+    threshold = temperature_limit_microvolts(380.0)
+    assert vttotemp.VtToTemp(threshold) == pytest.approx(380.0, abs=1e-9)
+    assert vttotemp.VtToTemp(threshold + 1.0) > 380.0
+
+def test_limit_outside_calibration_raises():
+    """上限が校正範囲の外にある場合は範囲の端に置き換えずに例外にする"""
+    with pytest.raises(CalibrationError):
+        temperature_limit_microvolts(440.0)
+    with pytest.raises(CalibrationError):
+        temperature_limit_microvolts(10.0)
+
+def test_default_limit_is_inside_calibration():
+    """既定の設定（MAX_TEMPERATUREと既定の熱電対）で開始時の上限の計算が通る"""
+    threshold = resolve_temperature_limit("default", dtamain_setting("TEMPERATURE_LIMIT_MICROVOLTS"))
+    assert np.isfinite(threshold)
+    assert vttotemp.VtToTemp(threshold) == pytest.approx(MAX_TEMPERATURE, abs=1e-9)
+
+def test_limit_in_microvolts_is_used_as_is():
+    """電圧で指定した上限は校正曲線で変換しない"""
+    assert resolve_temperature_limit("default", 12345.0) == 12345.0
+
+def test_interlock_trips_on_thermocouple():
+    interlock = TemperatureInterlock(1000.0, limit=400.0, max_missing=30.0)
+    assert interlock.check(999.0, now=0.0) is None
+    assert interlock.check(1001.0, now=1.0) is not None
+
+def test_interlock_uses_controller_pv_while_sensor_missing():
+    """熱電対の欠測中は制御器のPVを上限と比較する"""
+    interlock = TemperatureInterlock(1000.0, limit=400.0, max_missing=30.0)
+    assert interlock.check(float('nan'), 390.0, now=0.0) is None
+    assert interlock.check(float('nan'), 401.0, now=1.0) is not None
+
+def test_interlock_trips_when_sensor_missing_too_long():
+    """欠測がmax_missing秒を超えたら（制御器のPVが上限以下でも）停止する"""
+    interlock = TemperatureInterlock(1000.0, limit=400.0, max_missing=30.0)
+    assert interlock.check(float('nan'), 300.0, now=0.0) is None
+    assert interlock.check(float('nan'), None, now=20.0) is None
+    assert interlock.check(float('nan'), 300.0, now=31.0) is not None
+
+def test_interlock_resets_when_sensor_returns():
+    interlock = TemperatureInterlock(1000.0, limit=400.0, max_missing=30.0)
+    interlock.check(float('nan'), now=0.0)
+    assert interlock.check(500.0, now=25.0) is None
+    assert interlock.check(float('nan'), now=40.0) is None
+    assert interlock.check(float('nan'), now=71.0) is not None
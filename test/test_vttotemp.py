@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from DTAmodule import vttotemp
+
+# 境界の上下と範囲の両端
+EDGE_VALUES = np.concatenate([vttotemp.BREAKPOINTS,
+                              np.nextafter(vttotemp.BREAKPOINTS, -np.inf),
+                              np.nextafter(vttotemp.BREAKPOINTS, np.inf),
+                              [vttotemp.VT_MIN, vttotemp.VT_MAX]])
+
+def reference(values):
+    """1点用のVtToTempで変換（比較の基準）"""
+    return np.array([vttotemp.VtToTemp(float(v)) for v in values])
+
+def test_boundaries_use_upper_segment():
+    """境界上の値は上側の区間の多項式で変換する"""
+    for k, edge in enumerate(vttotemp.BREAKPOINTS):
+        c = vttotemp.COEFFICIENTS[k + 1]
+        expected = c[0] + c[1]*edge + c[2]*edge**2 + c[3]*edge**3
+        assert vttotemp.VtToTemp(edge) == pytest.approx(expected, abs=1e-9)
+
+@pytest.mark.parametrize("method", ['polynomial', 'table'])
+def test_converters_agree_at_boundaries(method):
+    """全ての変換が境界で同じ区間を選ぶ"""
+    convert = vttotemp.get_converter(method)
+    expected = reference(EDGE_VALUES)
+    actual = np.array([convert(float(v)) for v in EDGE_VALUES])
+    assert np.max(np.abs(actual - expected)) <= vttotemp.default_table.error_bound + 1e-9
+
+def test_table_certificate():
+    """補間表の誤差が上限（0.1mK）以内で、評価した誤差が上限を超えない"""
+    table = vttotemp.VtToTempTable(max_error=1e-4)
+    assert table.error_bound <= 1e-4
+    assert table.certify() <= table.error_bound + 1e-9
+
+def test_table_against_scalar_reference():
+    """補間表（1点用と配列）と1点用の多項式の差がerror_bound以内"""
+    table = vttotemp.default_table
+    rng = np.random.default_rng(0)
+    values = np.concatenate([rng.uniform(vttotemp.VT_MIN, vttotemp.VT_MAX, 20000), EDGE_VALUES])
+    expected = reference(values)
+    assert np.max(np.abs(table.evaluate(values) - expected)) <= table.error_bound + 1e-9
+    assert np.max(np.abs(np.array([table(float(v)) for v in values]) - expected)) <= table.error_bound + 1e-9
+
+def test_out_of_range_is_nan():
+    for convert in (vttotemp.VtToTemp, vttotemp.VtToTempFast):
+        assert np.isnan(convert(vttotemp.VT_MIN - 1))
+        assert np.isnan(convert(vttotemp.VT_MAX + 1))
+        assert np.isnan(convert(float('nan')))
+
+def test_array_matches_scalar():
+    """VtToTempArrayと1点用のVtToTempが一致する（範囲外とNaNはNaN）"""
+    rng = np.random.default_rng(1)
+    values = np.concatenate([rng.uniform(vttotemp.VT_MIN - 500, vttotemp.VT_MAX + 500, 20000),
+                             EDGE_VALUES, [np.nan]])
+    np.testing.assert_array_equal(vttotemp.VtToTempArray(values), reference(values))
+
+def test_array_keeps_shape():
+    values = np.linspace(-1000, 1000, 12).reshape(3, 4)
+    assert vttotemp.VtToTempArray(values).shape == (3, 4)
+    assert vttotemp.VtToTempArray(0.0).shape == ()